@@ -0,0 +1,10 @@
+"""
+Benchmark suite for airspeed velocity (asv) on synthetic GC-IMS data.
+
+    pip install asv
+    asv run                           # benchmark the current commit
+    asv continuous master HEAD        # compare against master
+    asv run --bench SpectrumIOSuite   # run a single suite
+
+See benchmarks.synthetic for the data generator.
+"""
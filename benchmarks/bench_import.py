@@ -0,0 +1,35 @@
+"""
+Import time benchmarks. Every benchmark runs in a fresh interpreter.
+"""
+import subprocess
+import sys
+
+# Optional heavy dependencies that must not be loaded by `import ims`.
+HEAVY_MODULES = [
+    "matplotlib",
+    "seaborn",
+    "pandas",
+    "skimage",
+    "findpeaks",
+    "dtwalign",
+    "pywt",
+    "sklearn",
+]
+
+
+class ImportSuite:
+    def timeraw_import_ims(self):
+        return "import ims"
+
+    def timeraw_import_ims_models(self):
+        return "import ims; ims.PLS_DA"
+
+    def track_heavy_modules_loaded(self):
+        code = (
+            "import sys, ims; "
+            f"print(sum(m in sys.modules for m in {HEAVY_MODULES!r}))"
+        )
+        out = subprocess.check_output([sys.executable, "-c", code])
+        return int(out)
+
+    track_heavy_modules_loaded.unit = "modules"
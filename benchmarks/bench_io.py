@@ -0,0 +1,108 @@
+"""
+Benchmarks for reading and writing spectra and datasets.
+Records run time (time_*) and peak memory (peakmem_*) per operation.
+"""
+import os
+import shutil
+import tempfile
+import ims
+from .synthetic import write_dataset, write_mea
+
+SIZES = [(500, 600), (2000, 1500), (4082, 3150)]
+
+
+class SpectrumIOSuite:
+    params = [SIZES]
+    param_names = ["shape"]
+
+    def setup(self, shape):
+        self.tmpdir = tempfile.mkdtemp()
+        self.mea = os.path.join(self.tmpdir, "sample.mea")
+        write_mea(self.mea, *shape)
+        self.spectrum = ims.Spectrum.read_mea(self.mea)
+        self.spectrum.to_hdf5(self.tmpdir)
+        self.hdf5 = os.path.join(self.tmpdir, "sample.hdf5")
+        self.outdir = tempfile.mkdtemp()
+
+    def teardown(self, shape):
+        shutil.rmtree(self.tmpdir)
+        shutil.rmtree(self.outdir)
+
+    def time_read_mea(self, shape):
+        ims.Spectrum.read_mea(self.mea)
+
+    def peakmem_read_mea(self, shape):
+        ims.Spectrum.read_mea(self.mea)
+
+    def time_read_hdf5(self, shape):
+        ims.Spectrum.read_hdf5(self.hdf5)
+
+    def peakmem_read_hdf5(self, shape):
+        ims.Spectrum.read_hdf5(self.hdf5)
+
+    def _window(self):
+        # a quarter of the retention time and a third of the drift time
+        ret_time = self.spectrum.ret_time
+        drift_time = self.spectrum.drift_time
+        rt_range = (ret_time[len(ret_time) // 4], ret_time[len(ret_time) // 2])
+        dt_range = (drift_time[len(drift_time) // 3], drift_time[2 * len(drift_time) // 3])
+        return rt_range, dt_range
+
+    def time_read_mea_window(self, shape):
+        ims.Spectrum.read_mea(self.mea, *self._window())
+
+    def time_read_hdf5_window(self, shape):
+        ims.Spectrum.read_hdf5(self.hdf5, *self._window())
+
+    def time_to_hdf5(self, shape):
+        path = os.path.join(self.outdir, "sample.hdf5")
+        if os.path.exists(path):
+            os.remove(path)
+        self.spectrum.to_hdf5(self.outdir)
+
+
+class DatasetIOSuite:
+    params = [[4, 16]]
+    param_names = ["n_spectra"]
+    timeout = 300
+
+    def setup(self, n_spectra):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, "data")
+        write_dataset(
+            self.root,
+            n_labels=2,
+            n_samples=n_spectra // 4,
+            n_replicates=2,
+            n_ret_time=1000,
+            n_drift_time=1500,
+        )
+        ims.Dataset.read_mea(self.root, subfolders=True).to_hdf5("data", self.tmpdir)
+        self.hdf5 = os.path.join(self.tmpdir, "data.hdf5")
+
+    def teardown(self, n_spectra):
+        shutil.rmtree(self.tmpdir)
+
+    def time_read_mea(self, n_spectra):
+        ims.Dataset.read_mea(self.root, subfolders=True)
+
+    def peakmem_read_mea(self, n_spectra):
+        ims.Dataset.read_mea(self.root, subfolders=True)
+
+    def time_read_hdf5(self, n_spectra):
+        ims.Dataset.read_hdf5(self.hdf5)
+
+    def peakmem_read_hdf5(self, n_spectra):
+        ims.Dataset.read_hdf5(self.hdf5)
+
+    def time_read_hdf5_parallel(self, n_spectra):
+        ims.Dataset.read_hdf5(self.hdf5, n_jobs=4)
+
+    def time_scan(self, n_spectra):
+        ims.Dataset.scan(self.root, subfolders=True)
+
+    def time_convert(self, n_spectra):
+        path = os.path.join(self.tmpdir, "store.hdf5")
+        if os.path.exists(path):
+            os.remove(path)
+        ims.store.convert(self.root, path, subfolders=True, n_jobs=2)
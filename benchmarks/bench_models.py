@@ -0,0 +1,41 @@
+"""
+Benchmarks for fitting the multivariate models on synthetic datasets.
+Records run time (time_*) and peak memory (peakmem_*) per operation.
+"""
+import shutil
+import tempfile
+import ims
+from .synthetic import write_dataset
+
+
+class ModelSuite:
+    params = [[8, 32]]
+    param_names = ["n_spectra"]
+    timeout = 300
+
+    def setup(self, n_spectra):
+        tmpdir = tempfile.mkdtemp()
+        write_dataset(
+            tmpdir,
+            n_labels=2,
+            n_samples=n_spectra // 4,
+            n_replicates=2,
+            n_ret_time=1000,
+            n_drift_time=1500,
+        )
+        self.dataset = ims.Dataset.read_mea(tmpdir, subfolders=True)
+        shutil.rmtree(tmpdir)
+        self.dataset.binning(2)
+        self.X, self.y = self.dataset.get_xy()
+
+    def time_pca_fit(self, n_spectra):
+        ims.PCA_Model(self.dataset, n_components=4).fit(self.X)
+
+    def peakmem_pca_fit(self, n_spectra):
+        ims.PCA_Model(self.dataset, n_components=4).fit(self.X)
+
+    def time_pls_da_fit(self, n_spectra):
+        ims.PLS_DA(self.dataset, n_components=2).fit(self.X, self.y)
+
+    def peakmem_pls_da_fit(self, n_spectra):
+        ims.PLS_DA(self.dataset, n_components=2).fit(self.X, self.y)
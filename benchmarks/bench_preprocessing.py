@@ -0,0 +1,133 @@
+"""
+Benchmarks for preprocessing steps on synthetic spectra.
+Records run time (time_*) and peak memory (peakmem_*) per operation.
+"""
+import os
+import shutil
+import tempfile
+import ims
+from .synthetic import write_dataset, write_mea
+
+SIZES = [(500, 600), (2000, 1500)]
+
+
+class SpectrumPreprocessingSuite:
+    params = [SIZES]
+    param_names = ["shape"]
+    timeout = 300
+
+    def setup(self, shape):
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, "sample.mea")
+        write_mea(path, *shape)
+        self.spectrum = ims.Spectrum.read_mea(path)
+        shutil.rmtree(self.tmpdir)
+
+    def time_asymcorr(self, shape):
+        self.spectrum.copy().asymcorr(niter=5)
+
+    def peakmem_asymcorr(self, shape):
+        self.spectrum.copy().asymcorr(niter=5)
+
+    def time_tophat(self, shape):
+        self.spectrum.copy().tophat(15)
+
+    def peakmem_tophat(self, shape):
+        self.spectrum.copy().tophat(15)
+
+    def time_tophat_decomposed(self, shape):
+        self.spectrum.copy().tophat(15, method="decomposed")
+
+    def time_tophat_rectangle(self, shape):
+        self.spectrum.copy().tophat(15, method="rectangle")
+
+    def time_savgol(self, shape):
+        self.spectrum.copy().savgol(11, 2)
+
+    def peakmem_savgol(self, shape):
+        self.spectrum.copy().savgol(11, 2)
+
+    def time_binning(self, shape):
+        self.spectrum.copy().binning(2)
+
+    def peakmem_binning(self, shape):
+        self.spectrum.copy().binning(2)
+
+    def time_wavecompr(self, shape):
+        self.spectrum.copy().wavecompr("both")
+
+    def time_wavelet_denoise(self, shape):
+        self.spectrum.copy().wavelet_denoise()
+
+    def time_find_peaks(self, shape):
+        self.spectrum.copy().find_peaks(verbose=0)
+
+    def peakmem_find_peaks(self, shape):
+        self.spectrum.copy().find_peaks(verbose=0)
+
+
+class DatasetPreprocessingSuite:
+    params = [[8, 32]]
+    param_names = ["n_spectra"]
+    timeout = 600
+
+    def setup(self, n_spectra):
+        tmpdir = tempfile.mkdtemp()
+        write_dataset(
+            tmpdir,
+            n_labels=2,
+            n_samples=n_spectra // 4,
+            n_replicates=2,
+            n_ret_time=1000,
+            n_drift_time=1500,
+        )
+        self.dataset = ims.Dataset.read_mea(tmpdir, subfolders=True)
+        shutil.rmtree(tmpdir)
+
+    def time_align_ret_time(self, n_spectra):
+        self.dataset.copy().align_ret_time(features="tic", window=100)
+
+    def peakmem_align_ret_time(self, n_spectra):
+        self.dataset.copy().align_ret_time(features="tic", window=100)
+
+    def time_interp_riprel(self, n_spectra):
+        self.dataset.copy().interp_riprel()
+
+    def peakmem_interp_riprel(self, n_spectra):
+        self.dataset.copy().interp_riprel()
+
+    def time_mean(self, n_spectra):
+        self.dataset.copy().mean()
+
+    def peakmem_mean(self, n_spectra):
+        self.dataset.copy().mean()
+
+    def time_scaling(self, n_spectra):
+        self.dataset.copy().scaling("auto")
+
+    def peakmem_scaling(self, n_spectra):
+        self.dataset.copy().scaling("auto")
+
+    def time_get_xy(self, n_spectra):
+        self.dataset.get_xy()
+
+    def peakmem_get_xy(self, n_spectra):
+        self.dataset.get_xy()
+
+    def time_wavecompr(self, n_spectra):
+        self.dataset.copy().wavecompr("both")
+
+    def peakmem_wavecompr(self, n_spectra):
+        self.dataset.copy().wavecompr("both")
+
+    def time_wavelet_denoise(self, n_spectra):
+        self.dataset.copy().wavelet_denoise()
+
+    def peakmem_wavelet_denoise(self, n_spectra):
+        self.dataset.copy().wavelet_denoise()
+
+    def time_savgol(self, n_spectra):
+        self.dataset.copy().savgol(11, 2)
+
+    def time_savgol_threads(self, n_spectra):
+        self.dataset.copy().savgol(11, 2, n_jobs=4)
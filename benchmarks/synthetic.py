@@ -0,0 +1,139 @@
+"""
+Synthetic GC-IMS data for benchmarks.
+
+Generates mea files with the binary layout of G.A.S Dortmund instruments:
+a windows-1252 encoded text header with one "key = value [unit]" line per
+attribute, a NUL byte and the intensity matrix as 16 bit integers.
+Spectra contain a reactant ion peak (RIP) with tailing that is depleted
+when analytes elute, a set of two dimensional gaussian analyte peaks
+and gaussian noise.
+"""
+import os
+import numpy as np
+
+
+def synthetic_values(n_ret_time=4082, n_drift_time=3150, n_peaks=30, seed=0):
+    """
+    Simulates a GC-IMS intensity matrix.
+
+    Parameters
+    ----------
+    n_ret_time : int, optional
+        Number of spectra along the retention time, by default 4082.
+
+    n_drift_time : int, optional
+        Number of data points per spectrum, by default 3150.
+
+    n_peaks : int, optional
+        Number of analyte peaks, by default 30.
+
+    seed : int, optional
+        Seed of the random number generator, by default 0.
+
+    Returns
+    -------
+    numpy.ndarray of shape (n_ret_time, n_drift_time)
+        int16 intensity values.
+    """
+    rng = np.random.default_rng(seed)
+    rt = np.arange(n_ret_time)[:, None]
+    dt = np.arange(n_drift_time)[None, :]
+
+    rip_pos = 0.25 * n_drift_time
+    rip_width = 0.005 * n_drift_time
+    rip = np.exp(-0.5 * ((dt - rip_pos) / rip_width) ** 2)
+    tailing = np.exp(-np.clip(dt - rip_pos, 0, None) / (0.05 * n_drift_time))
+    tailing[dt < rip_pos] = 0
+
+    peaks = np.zeros((n_ret_time, n_drift_time))
+    for _ in range(n_peaks):
+        center_rt = rng.uniform(0.05, 0.95) * n_ret_time
+        center_dt = rng.uniform(0.3, 0.8) * n_drift_time
+        width_rt = rng.uniform(0.002, 0.01) * n_ret_time
+        width_dt = rng.uniform(0.002, 0.004) * n_drift_time
+        height = rng.uniform(50, 1500)
+        # compute only the window around the peak
+        r0 = int(max(center_rt - 5 * width_rt, 0))
+        r1 = int(min(center_rt + 5 * width_rt, n_ret_time))
+        peaks[r0:r1] += height * np.exp(
+            -0.5
+            * (
+                ((rt[r0:r1] - center_rt) / width_rt) ** 2
+                + ((dt - center_dt) / width_dt) ** 2
+            )
+        )
+
+    # analytes consume reactant ions
+    depletion = 1 - 0.5 * peaks.sum(axis=1, keepdims=True) / (peaks.sum(axis=1).max() + 1)
+    values = 2500 * rip * depletion + 150 * tailing + peaks
+    values += rng.normal(0, 8, values.shape)
+    return np.clip(values, -32768, 32767).astype(np.int16)
+
+
+def write_mea(path, n_ret_time=4082, n_drift_time=3150, n_peaks=30, seed=0):
+    """
+    Writes a synthetic mea file.
+
+    Parameters
+    ----------
+    path : str
+        File path.
+
+    n_ret_time, n_drift_time, n_peaks, seed :
+        See synthetic_values.
+    """
+    values = synthetic_values(n_ret_time, n_drift_time, n_peaks, seed)
+    header = [
+        f"Chunks count = {n_ret_time}",
+        "Chunk averages = 31",
+        f"Chunk sample count = {n_drift_time}",
+        "Chunk sample rate = 150 [kHz]",
+        "Chunk trigger repetition = 21 [ms]",
+        'Timestamp = "2021-06-01T12:00:00"',
+    ]
+    header = "\n".join(header) + "\n"
+    with open(path, "wb") as f:
+        f.write(header.encode("windows-1252"))
+        f.write(b"\0")
+        f.write(values.tobytes())
+
+
+def write_dataset(
+    root,
+    n_labels=2,
+    n_samples=3,
+    n_replicates=2,
+    n_ret_time=4082,
+    n_drift_time=3150,
+    n_peaks=30,
+):
+    """
+    Writes synthetic mea files in the label/sample/file folder structure
+    expected by ims.Dataset.read_mea with subfolders=True.
+
+    Parameters
+    ----------
+    root : str
+        Directory to create.
+
+    n_labels : int, optional
+        Number of label folders, by default 2.
+
+    n_samples : int, optional
+        Number of sample folders per label, by default 3.
+
+    n_replicates : int, optional
+        Number of files per sample, by default 2.
+
+    n_ret_time, n_drift_time, n_peaks :
+        See synthetic_values.
+    """
+    seed = 0
+    for label in range(n_labels):
+        for sample in range(n_samples):
+            folder = os.path.join(root, f"label{label}", f"sample{label}_{sample}")
+            os.makedirs(folder, exist_ok=True)
+            for replicate in range(n_replicates):
+                path = os.path.join(folder, f"sample{label}_{sample}_{replicate}.mea")
+                write_mea(path, n_ret_time, n_drift_time, n_peaks, seed)
+                seed += 1
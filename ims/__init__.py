@@ -18,10 +18,37 @@ __version__ = "0.1.6"
 __author__ = "Competency Center for Chemometrics Mannheim"
 __credits__ = "Competency Center for Chemometrics Mannheim"
 
+import importlib
+
 from ims.gcims import Spectrum
 from ims.dataset import Dataset
-from ims.pca import PCA_Model
-from ims.plsr import PLSR
-from ims.plsda import PLS_DA
-from ims.hca import HCA
+from ims.alignment import RetTimeAlignment
+from ims.scaler import Scaler
+from ims.catalog import Catalog
+from ims.shared import SharedDataset
+from ims.utils import set_dtype, get_dtype
 import ims.utils
+import ims.profiling
+import ims.store
+
+# The model classes depend on scikit-learn, matplotlib and seaborn
+# and LazyDataset on the optional dask package.
+# They are imported on first attribute access to keep `import ims` fast.
+_lazy_attributes = {
+    "PCA_Model": "ims.pca",
+    "PLSR": "ims.plsr",
+    "PLS_DA": "ims.plsda",
+    "HCA": "ims.hca",
+    "LazyDataset": "ims.lazy",
+}
+
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        module = importlib.import_module(_lazy_attributes[name])
+        return getattr(module, name)
+    raise AttributeError(f"module 'ims' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_lazy_attributes))
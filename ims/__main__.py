@@ -0,0 +1,4 @@
+import sys
+from ims.cli import main
+
+sys.exit(main())
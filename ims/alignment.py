@@ -0,0 +1,357 @@
+import json
+import numbers
+import h5py
+import numpy as np
+from joblib import Parallel, delayed
+from ims.gcims import Spectrum
+from ims.profiling import profiled
+
+
+def alignment_features(values, features=None):
+    """
+    Reduces an intensity matrix to the representation used
+    to compute the distances for dynamic time warping.
+    The retention time dimension is always kept.
+
+    Parameters
+    ----------
+    values : numpy.ndarray of shape (n_ret_time, n_drift_time)
+        Intensity matrix.
+
+    features : str or int, optional
+        "tic" sums each row to the total ion chromatogram.
+        An integer sums the drift time into this number of windows.
+        If None the full rows are used,
+        by default None.
+
+    Returns
+    -------
+    numpy.ndarray
+        Of shape (n_ret_time,) for "tic",
+        (n_ret_time, features) for an integer
+        or the unchanged values.
+
+    Raises
+    ------
+    ValueError
+        If features is not supported.
+    """
+    if features is None:
+        return values
+
+    if isinstance(features, str) and features == "tic":
+        return values.sum(axis=1)
+
+    if isinstance(features, numbers.Integral):
+        edges = np.linspace(0, values.shape[1], int(features) + 1).astype(int)[:-1]
+        return np.add.reduceat(values, edges, axis=1)
+
+    raise ValueError("features must be None, 'tic' or an integer!")
+
+
+def warping_path(query, reference, window=None):
+    """
+    Dynamic time warping of query onto reference.
+
+    With a window only the Sakoe-Chiba band of the distance and
+    cumulative cost matrices is computed and stored,
+    so memory grows with n_ret_time * window
+    instead of n_ret_time ** 2.
+    The path is the same as the one of dtwalign
+    with the symmetric2 step pattern.
+
+    Parameters
+    ----------
+    query : numpy.ndarray of shape (n_ret_time,) or (n_ret_time, n_features)
+        Features of the spectrum to align.
+
+    reference : numpy.ndarray of shape (n_ret_time,) or (n_ret_time, n_features)
+        Features of the reference spectrum.
+
+    window : int, optional
+        Size of the Sakoe-Chiba band in rows.
+        Restricts the warping to rows that are at most window rows apart.
+        If None the warping is unconstrained and uses the full matrices,
+        by default None.
+
+    Returns
+    -------
+    numpy.ndarray of shape (n_ret_time_reference,)
+        Row indices of the query for every reference row.
+
+    Raises
+    ------
+    ValueError
+        If the lengths of query and reference differ by more than window.
+    """
+    if window is None:
+        from dtwalign import dtw
+
+        return dtw(query, reference).get_warping_path(target="query")
+
+    query = query.reshape(len(query), -1)
+    reference = reference.reshape(len(reference), -1)
+    n_query, n_reference = len(query), len(reference)
+    if abs(n_query - n_reference) > window:
+        raise ValueError(
+            "Lengths of query and reference differ by more than window!"
+            )
+
+    # band column k holds reference row i + k - window of query row i
+    width = 2 * window + 1
+    rows = np.arange(n_query)
+    cost = np.full((n_query, width), np.inf)
+    for k in range(width):
+        cols = rows + k - window
+        valid = (cols >= 0) & (cols < n_reference)
+        diff = query[valid] - reference[cols[valid]]
+        cost[valid, k] = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+    # symmetric2 steps, the horizontal step runs sequentially
+    # to get the exact same sums and ties as dtwalign
+    cumsum = np.full((n_query, width), np.inf)
+    previous = np.full(width + 1, np.inf)
+    for i in range(n_query):
+        start = max(0, window - i)
+        stop = min(width, n_reference + window - i)
+        row_cost = cost[i, start:stop]
+        if i == 0:
+            row = np.full(stop - start, np.inf)
+            row[0] = row_cost[0]
+        else:
+            row = np.minimum(
+                previous[start + 1:stop + 1] + row_cost,
+                previous[start:stop] + 2 * row_cost
+                )
+        row = row.tolist()
+        row_cost = row_cost.tolist()
+        for k in range(1, len(row)):
+            left = row[k - 1] + row_cost[k]
+            if left < row[k]:
+                row[k] = left
+        cumsum[i, start:stop] = row
+        previous[:width] = cumsum[i]
+
+    def _cumsum(i, j):
+        if i < 0 or j < 0 or abs(j - i) > window:
+            return np.inf
+        return cumsum[i, j - i + window]
+
+    steps = ((-1, 0), (-1, -1), (0, -1))
+    i, j = n_query - 1, n_reference - 1
+    path = [(i, j)]
+    while i > 0 or j > 0:
+        candidates = [_cumsum(i + di, j + dj) for di, dj in steps]
+        di, dj = steps[int(np.argmin(candidates))]
+        i, j = i + di, j + dj
+        path.append((i, j))
+    path = np.array(path[::-1])
+
+    # same interpolation as dtwalign's get_warping_path(target="query")
+    from scipy.interpolate import interp1d
+
+    query_rows, reference_rows = path[:, 0], path[:, 1]
+    warping_index = interp1d(reference_rows, query_rows, kind="linear")(
+        np.arange(reference_rows.min(), reference_rows.max() + 1)
+        ).astype(np.int64)
+    warping_index[0] = query_rows.min()
+    return warping_index
+
+
+class RetTimeAlignment:
+    """
+    Reusable retention time alignment based on dynamic time warping.
+    Stores the reference retention time and the precomputed reference
+    features so that new spectra or datasets can be aligned to the
+    same reference without recomputing it.
+    The fitted alignment can be saved to and loaded from hdf5 files.
+
+    Parameters
+    ----------
+    features : str or int, optional
+        "tic" aligns the total ion chromatograms.
+        An integer sums the drift time into this number of windows.
+        If None the full spectra are used,
+        by default None.
+
+    window : int, optional
+        Size of the Sakoe-Chiba band in retention time rows.
+        Only the band of the cost matrices is stored.
+        If None the warping is unconstrained,
+        by default None.
+
+    n_jobs : int, optional
+        Number of parallel worker processes used to transform datasets.
+        -1 uses all processors, by default 1.
+
+    Attributes
+    ----------
+    reference_ret_time : numpy.ndarray of shape (n_ret_time,)
+        Retention time coordinate of the reference.
+        Aligned spectra get this coordinate.
+
+    reference_features : numpy.ndarray
+        Reduced representation of the reference intensity values.
+
+    Example
+    -------
+    >>> import ims
+    >>> ds = ims.Dataset.read_mea("IMS_data")
+    >>> alignment = ims.RetTimeAlignment(features="tic", window=100)
+    >>> alignment.fit_transform(ds)
+    >>> alignment.save("alignment.hdf5")
+    >>> alignment = ims.RetTimeAlignment.load("alignment.hdf5")
+    >>> sample = ims.Spectrum.read_mea("sample.mea")
+    >>> alignment.transform(sample)
+    """
+
+    def __init__(self, features=None, window=None, n_jobs=1):
+        self.features = features
+        self.window = window
+        self.n_jobs = n_jobs
+
+    @profiled
+    def fit(self, dataset, reference="mean"):
+        """
+        Calculates the reference features.
+
+        Parameters
+        ----------
+        dataset : ims.Dataset
+            Needed to calculate the mean or to select the reference by index.
+
+        reference : str, int or Spectrum, optional
+            If "mean" is used, calculates the mean from all samples in dataset.
+            An integer is used to index the dataset and select a Spectrum.
+            If a Spectrum is given, uses this external sample as reference,
+            by default "mean".
+
+        Returns
+        -------
+        RetTimeAlignment
+            Fitted alignment.
+        """
+        if isinstance(reference, str) and reference == "mean":
+            reference_ret_time = np.mean(
+                np.vstack([sample.ret_time for sample in dataset]),
+                axis=0
+                )
+            reference_values = sum(sample.values for sample in dataset) / len(dataset)
+
+        elif isinstance(reference, numbers.Integral):
+            reference_ret_time = dataset[int(reference)].ret_time
+            reference_values = dataset[int(reference)].values
+
+        elif isinstance(reference, Spectrum):
+            reference_ret_time = reference.ret_time
+            reference_values = reference.values
+
+        else:
+            raise ValueError("reference must be 'mean', an integer or a Spectrum!")
+
+        self.reference_ret_time = np.array(reference_ret_time)
+        self.reference_features = alignment_features(reference_values, self.features)
+        return self
+
+    @profiled
+    def transform(self, data):
+        """
+        Aligns a spectrum or all spectra of a dataset to the reference.
+        Works inplace.
+
+        Parameters
+        ----------
+        data : ims.Spectrum or ims.Dataset
+            Spectra to align.
+
+        Returns
+        -------
+        ims.Spectrum or ims.Dataset
+            With aligned retention time.
+        """
+        spectra = [data] if isinstance(data, Spectrum) else data.data
+        n_jobs = 1 if len(spectra) == 1 else self.n_jobs
+
+        paths = Parallel(n_jobs=n_jobs)(
+            delayed(warping_path)(
+                alignment_features(spectrum.values, self.features),
+                self.reference_features,
+                self.window,
+            )
+            for spectrum in spectra
+        )
+
+        for spectrum, path in zip(spectra, paths):
+            spectrum.values = spectrum.values[path, :]
+            spectrum.ret_time = self.reference_ret_time
+        return data
+
+    def fit_transform(self, dataset, reference="mean"):
+        """
+        Fits the alignment and aligns the dataset.
+
+        Parameters
+        ----------
+        dataset : ims.Dataset
+            Spectra to align.
+
+        reference : str, int or Spectrum, optional
+            See fit method, by default "mean".
+
+        Returns
+        -------
+        ims.Dataset
+            With aligned retention time.
+        """
+        return self.fit(dataset, reference).transform(dataset)
+
+    def save(self, path):
+        """
+        Saves the fitted alignment as hdf5 file.
+
+        Parameters
+        ----------
+        path : str
+            Absolute or relative file path.
+        """
+        with h5py.File(path, "w") as f:
+            f.create_dataset("reference_ret_time", data=self.reference_ret_time)
+            f.create_dataset("reference_features", data=self.reference_features)
+            f.attrs["features"] = json.dumps(_json_value(self.features))
+            f.attrs["window"] = json.dumps(_json_value(self.window))
+
+    @classmethod
+    def load(cls, path, n_jobs=1):
+        """
+        Loads an alignment saved with the save method.
+
+        Parameters
+        ----------
+        path : str
+            Absolute or relative file path.
+
+        n_jobs : int, optional
+            Number of parallel worker processes used to transform datasets,
+            by default 1.
+
+        Returns
+        -------
+        RetTimeAlignment
+            Fitted alignment.
+        """
+        with h5py.File(path, "r") as f:
+            alignment = cls(
+                json.loads(f.attrs["features"]),
+                json.loads(f.attrs["window"]),
+                n_jobs,
+            )
+            alignment.reference_ret_time = np.array(f["reference_ret_time"])
+            alignment.reference_features = np.array(f["reference_features"])
+        return alignment
+
+
+def _json_value(value):
+    """Converts numpy integers, which json can not serialize, to int."""
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    return value
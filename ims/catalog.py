@@ -0,0 +1,495 @@
+import os
+import json
+import sqlite3
+import hashlib
+from datetime import datetime
+import h5py
+import numpy as np
+from joblib import Parallel, delayed
+from ims.gcims import Spectrum
+from ims.dataset import Dataset
+from ims.utils import get_dtype
+
+
+HEADER_COLUMNS = [
+    "chunks_count",
+    "chunk_averages",
+    "chunk_sample_count",
+    "chunk_sample_rate",
+    "chunk_trigger_repetition",
+]
+
+
+class Catalog:
+    """
+    Persistent SQLite index of mea files with metadata from the file headers,
+    labels and sample names from the folder structure, checksums and the
+    location of preprocessed spectra in hdf5 stores.
+
+    Queries by label, sample, recording time or instrument settings
+    run against the index instead of the file system and the results
+    are loaded as ims.Dataset.
+
+    Parameters
+    ----------
+    path : str
+        Database file. Created if it does not exist.
+
+    Example
+    -------
+    >>> import ims
+    >>> catalog = ims.Catalog("archive.sqlite")
+    >>> catalog.update("IMS_data", subfolders=True)
+    >>> table = catalog.query(
+    ...     label="GroupA",
+    ...     start="2021-01-01",
+    ...     end="2021-06-30",
+    ...     chunk_sample_count=3150,
+    ... )
+    >>> ds = catalog.to_dataset(table)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                file TEXT,
+                sample TEXT,
+                label TEXT,
+                name TEXT,
+                timestamp TEXT,
+                chunks_count INTEGER,
+                chunk_averages INTEGER,
+                chunk_sample_count INTEGER,
+                chunk_sample_rate INTEGER,
+                chunk_trigger_repetition INTEGER,
+                file_size INTEGER,
+                mtime REAL,
+                checksum TEXT
+            );
+            CREATE INDEX IF NOT EXISTS files_label ON files (label);
+            CREATE INDEX IF NOT EXISTS files_sample ON files (sample);
+            CREATE INDEX IF NOT EXISTS files_timestamp ON files (timestamp);
+            CREATE TABLE IF NOT EXISTS stores (
+                path TEXT,
+                store TEXT,
+                key TEXT,
+                preprocessing TEXT,
+                PRIMARY KEY (path, store)
+            );
+            """
+        )
+        self.connection.commit()
+
+    def __repr__(self):
+        return f"Catalog: {self.path}, {len(self)} Files"
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Closes the database connection."""
+        self.connection.close()
+
+    @staticmethod
+    def checksum(path, block_size=2**20):
+        """
+        SHA-256 checksum of a file.
+
+        Parameters
+        ----------
+        path : str
+            Absolute or relative file path.
+
+        block_size : int, optional
+            Number of bytes hashed at once, by default 1 MiB.
+
+        Returns
+        -------
+        str
+            Hex digest.
+        """
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def update(self, path, subfolders=False, checksums=True, n_jobs=8):
+        """
+        Adds new and changed mea files in the directory to the catalog.
+        Files with unchanged size and modification time are skipped.
+        Catalogued files in the scanned folders that no longer exist
+        are removed together with their store locations.
+
+        Parameters
+        ----------
+        path : str
+            Directory with mea files. See ims.Dataset.read_mea
+            for the expected folder structure if subfolders is True.
+
+        subfolders : bool, optional
+            Uses subdirectory names as labels and sample names,
+            by default False.
+
+        checksums : bool, optional
+            Computes SHA-256 checksums. Reads every new file completely,
+            by default True.
+
+        n_jobs : int, optional
+            Number of threads reading files in parallel,
+            by default 8.
+
+        Returns
+        -------
+        int
+            Number of added or updated files.
+        """
+        paths, _, files, samples, labels = Dataset._measurements(path, subfolders)
+        if not subfolders:
+            samples = [None] * len(paths)
+            labels = [None] * len(paths)
+
+        known = dict(
+            (row[0], (row[1], row[2]))
+            for row in self.connection.execute("SELECT path, file_size, mtime FROM files")
+        )
+
+        tasks = []
+        for filepath, file, sample, label in zip(paths, files, samples, labels):
+            filepath = os.path.abspath(filepath)
+            stat = os.stat(filepath)
+            if known.get(filepath) == (stat.st_size, stat.st_mtime):
+                continue
+            tasks.append((filepath, file, sample, label, stat.st_mtime))
+
+        rows = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(self._row)(*task, checksums) for task in tasks
+        )
+
+        # only folders at the depth of the scan are checked for removed files
+        root = os.path.abspath(path)
+        depth = 3 if subfolders else 1
+        seen = set(os.path.abspath(filepath) for filepath in paths)
+        removed = []
+        for filepath in known:
+            relpath = os.path.relpath(filepath, root)
+            if (
+                filepath not in seen
+                and not relpath.startswith(os.pardir)
+                and len(relpath.split(os.sep)) == depth
+            ):
+                removed.append((filepath,))
+
+        self.connection.executemany("DELETE FROM files WHERE path = ?", removed)
+        self.connection.executemany("DELETE FROM stores WHERE path = ?", removed)
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO files VALUES ({', '.join(['?'] * 14)})", rows
+        )
+        self.connection.commit()
+        return len(rows)
+
+    @staticmethod
+    def _row(path, file, sample, label, mtime, checksums):
+        header = Spectrum.read_mea_header(path)
+        return (
+            path,
+            file,
+            sample,
+            label,
+            header["name"],
+            datetime.strftime(header["timestamp"], "%Y-%m-%dT%H:%M:%S"),
+            *[header[i] for i in HEADER_COLUMNS],
+            header["file_size"],
+            mtime,
+            Catalog.checksum(path) if checksums else None,
+        )
+
+    def register_store(self, store, source=None):
+        """
+        Records where the preprocessed spectra of catalogued files are stored.
+        Stores created with ims.store.convert list the path of every file
+        relative to the converted directory, these are matched to the
+        catalogued paths. For other stores, for example written by
+        ims.Dataset.to_hdf5, file name, sample and label must match.
+        Entries that match no or several catalogued files are not linked.
+
+        Parameters
+        ----------
+        store : str
+            hdf5 file written by ims.store.convert or ims.Dataset.to_hdf5.
+
+        source : str, optional
+            Directory the store was converted from. If None relative
+            paths are matched to the end of the catalogued paths,
+            by default None.
+
+        Returns
+        -------
+        int
+            Number of linked files.
+
+        Example
+        -------
+        >>> import ims
+        >>> catalog = ims.Catalog("archive.sqlite")
+        >>> catalog.update("IMS_data", subfolders=True)
+        >>> ims.store.convert("IMS_data", "IMS_data.hdf5", subfolders=True)
+        >>> catalog.register_store("IMS_data.hdf5", source="IMS_data")
+        """
+        store = os.path.abspath(store)
+        with h5py.File(store, "r") as f:
+            grp = f["dataset"]
+            keys = Dataset._hdf5_keys(f)
+            files = [i.decode() for i in grp["files"]]
+            n = len(keys)
+            samples = [i.decode() for i in grp["samples"]] or [""] * n
+            labels = [i.decode() for i in grp["labels"]] or [""] * n
+            if "paths" in grp:
+                relpaths = [i.decode() for i in grp["paths"]]
+            else:
+                relpaths = [""] * n
+            preprocessing = json.dumps([i.decode() for i in grp["preprocessing"]])
+
+        rows = []
+        for key, file, sample, label, relpath in zip(
+            keys, files, samples, labels, relpaths
+        ):
+            candidates = self.connection.execute(
+                "SELECT path, sample, label FROM files WHERE file = ?", (file,)
+            ).fetchall()
+            if relpath:
+                relpath = os.path.normpath(relpath)
+                if source is not None:
+                    target = os.path.abspath(os.path.join(source, relpath))
+                    paths = [i[0] for i in candidates if i[0] == target]
+                else:
+                    paths = [
+                        i[0] for i in candidates if i[0].endswith(os.sep + relpath)
+                    ]
+            else:
+                paths = [
+                    i[0]
+                    for i in candidates
+                    if (not sample or i[1] == sample) and (not label or i[2] == label)
+                ]
+            if len(paths) == 1:
+                rows.append((paths[0], store, key, preprocessing))
+
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO stores VALUES (?, ?, ?, ?)", rows
+        )
+        self.connection.commit()
+        return len(rows)
+
+    def query(self, label=None, sample=None, start=None, end=None, **attributes):
+        """
+        Selects catalogued files.
+        All given conditions must be met.
+
+        Parameters
+        ----------
+        label : str or list, optional
+            One or more labels, by default None.
+
+        sample : str or list, optional
+            One or more sample names, by default None.
+
+        start : str or datetime, optional
+            Earliest recording time, for example "2021-01-31",
+            by default None.
+
+        end : str or datetime, optional
+            Latest recording time, by default None.
+
+        **attributes : optional
+            Header attributes that must match exactly,
+            for example chunk_sample_count=3150.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Matching files with metadata and the
+            latest registered hdf5 store, if any.
+
+        Raises
+        ------
+        ValueError
+            If an attribute is not a header attribute.
+        """
+        import pandas as pd
+
+        conditions = []
+        parameters = []
+        for column, value in (("label", label), ("sample", sample)):
+            if value is None:
+                continue
+            value = [value] if isinstance(value, str) else list(value)
+            conditions.append(f"f.{column} IN ({', '.join(['?'] * len(value))})")
+            parameters.extend(value)
+
+        for op, value in ((">=", start), ("<=", end)):
+            if value is None:
+                continue
+            if isinstance(value, datetime):
+                value = datetime.strftime(value, "%Y-%m-%dT%H:%M:%S")
+            elif op == "<=" and len(value) == 10:
+                # a date without time includes the whole day
+                value = value + "T23:59:59"
+            conditions.append(f"f.timestamp {op} ?")
+            parameters.append(value)
+
+        for column, value in attributes.items():
+            if column not in HEADER_COLUMNS:
+                raise ValueError(f"{column} is not a header attribute!")
+            conditions.append(f"f.{column} = ?")
+            parameters.append(value)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"""
+            SELECT f.*, s.store, s.key
+            FROM files f
+            LEFT JOIN stores s ON s.rowid = (
+                SELECT MAX(rowid) FROM stores WHERE stores.path = f.path
+            )
+            {where}
+            ORDER BY f.timestamp, f.path
+        """
+        return pd.read_sql_query(sql, self.connection, params=parameters)
+
+    def to_dataset(self, table=None, preprocessed=False, name=None, lazy=False, **query):
+        """
+        Loads the selected files as ims.Dataset.
+        Only the selected files are read.
+
+        With lazy=True returns an ims.LazyDataset instead. Only the
+        coordinates are read immediately, from the catalogued headers
+        or the stores, and values are read when they are computed.
+        This requires the optional dask package and spectra of equal shape.
+
+        Parameters
+        ----------
+        table : pandas.DataFrame, optional
+            Result of the query method. If None the query
+            keyword arguments are used to select files,
+            by default None.
+
+        preprocessed : bool, optional
+            Reads the spectra from the registered hdf5 stores instead
+            of the mea files. Files without store are read from the
+            mea files, by default False.
+
+        name : str, optional
+            Name of the dataset, by default the catalog file name.
+
+        lazy : bool, optional
+            Returns an ims.LazyDataset, by default False.
+
+        **query : optional
+            Keyword arguments for the query method.
+
+        Returns
+        -------
+        Dataset or LazyDataset
+
+        Raises
+        ------
+        ValueError
+            If lazy is True and the spectra do not all have the same shape.
+
+        Example
+        -------
+        >>> import ims
+        >>> catalog = ims.Catalog("archive.sqlite")
+        >>> ds = catalog.to_dataset(label="GroupA", lazy=True)
+        >>> X, y = ds.binning(4).get_xy()
+        """
+        if table is None:
+            table = self.query(**query)
+        if name is None:
+            name = os.path.split(self.path)[1].split(".")[0]
+        if lazy:
+            return self._to_lazy_dataset(table, preprocessed, name)
+
+        data = []
+        handles = {}
+        try:
+            for _, row in table.iterrows():
+                if preprocessed and isinstance(row["store"], str):
+                    if row["store"] not in handles:
+                        handles[row["store"]] = h5py.File(row["store"], "r")
+                    f = handles[row["store"]]
+                    data.append(Spectrum._from_hdf5_group(f[row["key"]]))
+                else:
+                    data.append(Spectrum.read_mea(row["path"]))
+        finally:
+            for f in handles.values():
+                f.close()
+
+        return Dataset(
+            data,
+            name,
+            list(table["file"]),
+            list(table["sample"]),
+            list(table["label"]),
+        )
+
+    @staticmethod
+    def _to_lazy_dataset(table, preprocessed, name):
+        """LazyDataset with delayed reads of the selected files."""
+        from dask import delayed
+        from ims.lazy import LazyDataset, _read_hdf5, _read_mea, _stack
+
+        dtype = get_dtype()
+        everything = slice(None)
+        ret_time, drift_time, names, times, tasks = [], [], [], [], []
+        handles = {}
+        try:
+            for _, row in table.iterrows():
+                if preprocessed and isinstance(row["store"], str):
+                    if row["store"] not in handles:
+                        handles[row["store"]] = h5py.File(row["store"], "r")
+                    grp = handles[row["store"]][row["key"]]
+                    ret_time.append(np.array(grp["ret_time"]))
+                    drift_time.append(np.array(grp["drift_time"]))
+                    names.append(str(grp.attrs["name"]))
+                    times.append(datetime.fromisoformat(grp.attrs["time"]))
+                    task = delayed(_read_hdf5)(
+                        row["store"], row["key"], everything, everything, dtype
+                    )
+                else:
+                    axes = Spectrum._mea_axes(row)
+                    ret_time.append(axes[0])
+                    drift_time.append(axes[1])
+                    names.append(row["name"])
+                    times.append(datetime.fromisoformat(row["timestamp"]))
+                    task = delayed(_read_mea)(row["path"], everything, everything, dtype)
+                tasks.append(task)
+        finally:
+            for f in handles.values():
+                f.close()
+
+        shapes = set((len(i), len(j)) for i, j in zip(ret_time, drift_time))
+        if len(shapes) > 1:
+            raise ValueError("All spectra must have the same shape!")
+        shape = shapes.pop() if shapes else (0, 0)
+        return LazyDataset(
+            _stack(tasks, shape, dtype),
+            np.stack(ret_time) if ret_time else np.empty((0, shape[0])),
+            np.stack(drift_time) if drift_time else np.empty((0, shape[1])),
+            name,
+            list(table["file"]),
+            list(table["sample"]),
+            list(table["label"]),
+            names,
+            times,
+        )
@@ -0,0 +1,364 @@
+"""
+Command line interface for batch processing of GC-IMS measurements.
+
+Reads every file in the input directories, applies the preprocessing steps
+of a pipeline specification, optionally detects peaks and predicts with a
+fitted model, and writes the results to an output directory:
+
+* spectra/<input>/<folders>/<file>.hdf5: preprocessed spectra
+  (ims.Spectrum.read_hdf5)
+* peaks/<input>/<folders>/<file>.csv: peak tables if peak detection
+  is enabled
+* manifest.jsonl: one record per processed file with status and prediction
+
+Outputs mirror the folders of the input files below the input directory,
+so equally named files in different folders do not overwrite each other.
+
+Completed files are listed in the manifest and skipped when the
+same command is run again, so interrupted jobs can be resumed.
+
+Pipeline specifications are JSON or YAML (requires PyYAML) files:
+
+.. code-block:: json
+
+    {
+        "reader": "mea",
+        "subfolders": true,
+        "preprocessing": [
+            {"step": "tophat", "size": 15, "method": "decomposed"},
+            {"step": "binning", "n": 2}
+        ],
+        "peaks": {"denoise": "fastnl", "window": 30},
+        "model": "pls_da.pkl"
+    }
+
+Each preprocessing step names an ims.Spectrum method, the other keys are
+passed as keyword arguments. The model is a pickled fitted estimator with
+a predict method, for example ims.PLS_DA or a scikit-learn pipeline.
+
+The convert command migrates a folder of measurements into a single
+chunked and compressed hdf5 store without loading it into memory
+(see ims.store.convert). It can be resumed the same way.
+--compression and --chunk-rows set the storage layout of the values.
+
+Example
+-------
+ims run pipeline.json IMS_data -o IMS_data_processed --jobs 8
+ims convert IMS_data IMS_data.hdf5 --subfolders --jobs 8
+ims convert IMS_data IMS_data.hdf5 --compression lzf --chunk-rows 64
+"""
+import os
+import sys
+import json
+import pickle
+import argparse
+import traceback
+import h5py
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ims.gcims import Spectrum
+from ims.dataset import Dataset
+from ims.store import convert
+
+
+READERS = {
+    "mea": Spectrum.read_mea,
+    "zip": Spectrum.read_zip,
+    "csv": Spectrum.read_csv,
+    "hdf5": Spectrum.read_hdf5,
+}
+
+# fitted models are loaded once per worker process
+_models = {}
+
+
+def load_pipeline(path):
+    """
+    Reads a pipeline specification from a JSON or YAML file.
+
+    Parameters
+    ----------
+    path : str
+        Absolute or relative file path.
+
+    Returns
+    -------
+    dict
+        Pipeline specification.
+
+    Raises
+    ------
+    ValueError
+        If the specification contains unknown readers or steps.
+    """
+    with open(path, "r") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    spec.setdefault("reader", "mea")
+    spec.setdefault("subfolders", False)
+    spec.setdefault("preprocessing", [])
+
+    if spec["reader"] not in READERS:
+        raise ValueError(f"{spec['reader']} is not a supported reader!")
+
+    for step in spec["preprocessing"]:
+        if not hasattr(Spectrum, step.get("step", "")):
+            raise ValueError(f"{step.get('step')} is not an ims.Spectrum method!")
+
+    return spec
+
+
+def _load_model(path):
+    if path not in _models:
+        with open(path, "rb") as f:
+            _models[path] = pickle.load(f)
+    return _models[path]
+
+
+def process_file(path, spec, output, folder=""):
+    """
+    Runs the pipeline on a single file and writes the results.
+
+    Parameters
+    ----------
+    path : str
+        Measurement file.
+
+    spec : dict
+        Pipeline specification from load_pipeline.
+
+    output : str
+        Output directory.
+
+    folder : str, optional
+        Relative folder of the results in the spectra and peaks
+        directories, by default "".
+
+    Returns
+    -------
+    dict
+        Name, prediction and hdf5 file of the processed spectrum.
+    """
+    spectrum = READERS[spec["reader"]](path)
+
+    for step in spec["preprocessing"]:
+        kwargs = {key: value for key, value in step.items() if key != "step"}
+        getattr(spectrum, step["step"])(**kwargs)
+
+    # the spectrum name ends at the first dot, a.1.mea and a.2.mea
+    # would share it, so outputs are named after the whole file name
+    stem = os.path.splitext(os.path.basename(path))[0]
+    spectra = os.path.join(output, "spectra", folder)
+    os.makedirs(spectra, exist_ok=True)
+    hdf5_path = os.path.join(spectra, f"{stem}.hdf5")
+    # overwrites output left over from an interrupted run of the same file
+    with h5py.File(hdf5_path, "w") as f:
+        spectrum._to_hdf5_group(f)
+
+    if "peaks" in spec:
+        peaks = os.path.join(output, "peaks", folder)
+        os.makedirs(peaks, exist_ok=True)
+        spectrum.find_peaks(**spec["peaks"])
+        spectrum.peak_table.to_csv(os.path.join(peaks, f"{stem}.csv"))
+
+    record = {
+        "name": spectrum.name,
+        "prediction": None,
+        "output": os.path.relpath(hdf5_path, output),
+    }
+    if "model" in spec:
+        model = _load_model(spec["model"])
+        X = spectrum._dense_values().reshape(1, -1)
+        prediction = model.predict(X)[0]
+        record["prediction"] = prediction.item() if hasattr(prediction, "item") else prediction
+
+    return record
+
+
+def _completed(manifest):
+    if not os.path.exists(manifest):
+        return set()
+    done = set()
+    with open(manifest, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["status"] == "ok":
+                done.add(record["path"])
+    return done
+
+
+def run(pipeline, inputs, output, jobs=1, resume=True):
+    """
+    Processes all files in the input directories.
+
+    Parameters
+    ----------
+    pipeline : str
+        Path to the pipeline specification.
+
+    inputs : list of str
+        Input directories.
+
+    output : str
+        Output directory, created if it does not exist.
+
+    jobs : int, optional
+        Number of worker processes, by default 1.
+
+    resume : bool, optional
+        Skips files that are marked as completed in the manifest,
+        by default True.
+
+    Returns
+    -------
+    int
+        Number of failed files.
+    """
+    spec = load_pipeline(pipeline)
+    if "model" in spec:
+        spec["model"] = os.path.abspath(spec["model"])
+
+    os.makedirs(os.path.join(output, "spectra"), exist_ok=True)
+    if "peaks" in spec:
+        os.makedirs(os.path.join(output, "peaks"), exist_ok=True)
+
+    manifest = os.path.join(output, "manifest.jsonl")
+    if not resume and os.path.exists(manifest):
+        os.remove(manifest)
+    done = _completed(manifest)
+
+    tasks = []
+    for directory in inputs:
+        paths, _, _, samples, labels = Dataset._measurements(directory, spec["subfolders"])
+        if not spec["subfolders"]:
+            samples = [None] * len(paths)
+            labels = [None] * len(paths)
+        # results mirror the path below the parent of the input directory
+        parent = os.path.dirname(os.path.abspath(directory))
+        for path, sample, label in zip(paths, samples, labels):
+            if path not in done:
+                folder = os.path.dirname(os.path.relpath(os.path.abspath(path), parent))
+                tasks.append((path, sample, label, folder))
+
+    n_total = len(tasks)
+    n_failed = 0
+    print(f"{len(done)} files already processed, {n_total} to go", file=sys.stderr)
+
+    with open(manifest, "a") as log:
+        executor = ProcessPoolExecutor(jobs) if jobs > 1 else None
+        if executor is None:
+            results = (
+                (task, _try_process(task[0], spec, output, task[3])) for task in tasks
+            )
+        else:
+            futures = {
+                executor.submit(_try_process, task[0], spec, output, task[3]): task
+                for task in tasks
+            }
+            results = ((futures[i], i.result()) for i in as_completed(futures))
+
+        for i, ((path, sample, label, _), result) in enumerate(results, start=1):
+            record = {"path": path, "sample": sample, "label": label, **result}
+            log.write(json.dumps(record) + "\n")
+            log.flush()
+            if record["status"] != "ok":
+                n_failed += 1
+            print(
+                f"[{i}/{n_total}] {os.path.basename(path)}: {record['status']}",
+                file=sys.stderr,
+            )
+
+        if executor is not None:
+            executor.shutdown()
+
+    return n_failed
+
+
+def _try_process(path, spec, output, folder=""):
+    try:
+        result = process_file(path, spec, output, folder)
+        result["status"] = "ok"
+    except Exception:
+        result = {"status": "failed", "error": traceback.format_exc()}
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="ims",
+        description="Batch processing of GC-IMS measurements.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser(
+        "run", help="Run a pipeline specification on measurement directories."
+    )
+    run_parser.add_argument("pipeline", help="Pipeline specification (JSON or YAML).")
+    run_parser.add_argument("inputs", nargs="+", help="Input directories.")
+    run_parser.add_argument("-o", "--output", required=True, help="Output directory.")
+    run_parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="Number of worker processes."
+    )
+    run_parser.add_argument(
+        "--no-resume",
+        dest="resume",
+        action="store_false",
+        help="Process all files again instead of skipping completed ones.",
+    )
+
+    convert_parser = commands.add_parser(
+        "convert", help="Convert a folder of measurements into a hdf5 store."
+    )
+    convert_parser.add_argument("source", help="Input directory.")
+    convert_parser.add_argument("store", help="hdf5 store, created if it does not exist.")
+    convert_parser.add_argument(
+        "--subfolders",
+        action="store_true",
+        help="Use subdirectory names as labels and sample names.",
+    )
+    convert_parser.add_argument(
+        "--format",
+        dest="file_format",
+        default="mea",
+        choices=["mea", "zip", "csv"],
+        help="Input file format.",
+    )
+    convert_parser.add_argument(
+        "-j", "--jobs", type=int, default=8, help="Number of worker processes."
+    )
+    convert_parser.add_argument(
+        "--batch-size", type=int, default=32, help="Files read before writing."
+    )
+    convert_parser.add_argument(
+        "--compression",
+        default="gzip",
+        help="h5py compression filter of the values, 'none' disables it.",
+    )
+    convert_parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=32,
+        help="Retention time rows per chunk, 0 stores the values contiguously.",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "convert":
+        n = convert(
+            args.source,
+            args.store,
+            args.subfolders,
+            args.file_format,
+            args.jobs,
+            args.batch_size,
+            None if args.compression.lower() == "none" else args.compression,
+            args.chunk_rows or None,
+        )
+        print(f"{n} files converted", file=sys.stderr)
+        return 0
+
+    n_failed = run(args.pipeline, args.inputs, args.output, args.jobs, args.resume)
+    return 1 if n_failed else 0
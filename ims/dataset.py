@@ -5,17 +5,21 @@ from glob import glob
 from copy import deepcopy
 from datetime import datetime
 import h5py
-import matplotlib.pyplot as plt
-from scipy.interpolate import interp1d
-from dtwalign import dtw
-from sklearn.utils import resample
-from sklearn.model_selection import (
-    ShuffleSplit,
-    KFold,
-    StratifiedKFold,
-    LeaveOneOut,
-    StratifiedShuffleSplit,
+from scipy import sparse
+from joblib import Parallel, delayed, cpu_count
+from ims.utils import (
+    get_dtype,
+    interp_weights,
+    savgol,
+    wavelet_approximation,
+    wavelet_denoise,
+    _as_list,
+    _cast,
+    _with_dtype,
 )
+from ims.alignment import RetTimeAlignment
+from ims.scaler import Scaler
+from ims.profiling import profiled
 
 
 class Dataset:
@@ -53,10 +57,23 @@ class Dataset:
     preprocessing : list
         Keeps track of applied preprocessing steps.
 
+    profile : list
+        Records of wall time, CPU time, peak memory and shapes
+        per method call while ims.profiling is enabled.
+        The step key links a record to its preprocessing entry.
+
     weights : numpy.ndarray of shape (n_samples, n_features)
         Stores the weights from scaling when the method is called.
         Needed to correct the loadings in PCA automatically.
 
+    scaler : ims.Scaler
+        Fitted scaler from the scaling method.
+        Applies the training weights to test data.
+
+    alignment : ims.RetTimeAlignment
+        Fitted retention time alignment from the align_ret_time method.
+        Aligns new spectra to the same reference.
+
     train_index : list
         Keeps the indices from train_test_split method.
         Used for plot annotations in PLS_DA and PLSR classes.
@@ -80,6 +97,7 @@ class Dataset:
         self.samples = samples
         self.labels = labels
         self.preprocessing = []
+        self.profile = []
 
     def __repr__(self):
         return f"Dataset: {self.name}, {len(self)} Spectra"
@@ -212,7 +230,8 @@ class Dataset:
         return (paths, name, files, samples, labels)
 
     @classmethod
-    def read_mea(cls, path, subfolders=False):
+    @profiled
+    def read_mea(cls, path, subfolders=False, rt_range=None, dt_range=None):
         """
         Reads all mea files from G.A.S Dortmund instruments in the
         given directory and combines them into a dataset.
@@ -243,6 +262,15 @@ class Dataset:
             Uses subdirectory names as labels,
             by default False.
 
+        rt_range : tuple, optional
+            Start and stop value on the retention time coordinate.
+            Only this window is read from the files. See ims.Spectrum.read_mea,
+            by default None.
+
+        dt_range : tuple, optional
+            Start and stop value on the drift time coordinate in ms,
+            by default None.
+
         Returns
         -------
         Dataset
@@ -253,12 +281,14 @@ class Dataset:
         >>> ds = ims.Dataset.read_mea("IMS_data", subfolders=True)
         >>> print(ds)
         Dataset: IMS_data, 58 Spectra
+        >>> ds = ims.Dataset.read_mea("IMS_data", rt_range=(80, 500), dt_range=(7.5, 12))
         """
         paths, name, files, samples, labels = Dataset._measurements(path, subfolders)
-        data = [Spectrum.read_mea(i) for i in paths]
+        data = [Spectrum.read_mea(i, rt_range, dt_range) for i in paths]
         return cls(data, name, files, samples, labels)
 
     @classmethod
+    @profiled
     def read_zip(cls, path, subfolders=False):
         """
         Reads zipped csv and json files from G.A.S Dortmund mea2zip converting tool.
@@ -302,6 +332,7 @@ class Dataset:
         return cls(data, name, files, samples, labels)
 
     @classmethod
+    @profiled
     def read_csv(cls, path, subfolders=False):
         """
         Reads generic csv files. The first row must be
@@ -346,8 +377,58 @@ class Dataset:
         data = [Spectrum.read_csv(i) for i in paths]
         return cls(data, name, files, samples, labels)
 
+    @staticmethod
+    def scan(path, subfolders=False, n_jobs=8):
+        """
+        Reads only the headers of all mea files in the given directory.
+        Returns the metadata as table without loading any intensity values,
+        which makes it possible to catalogue large archives quickly.
+        See ims.Dataset.read_mea for the expected folder structure
+        if subfolders is True.
+
+        Parameters
+        ----------
+        path : str
+            Absolute or relative file path.
+
+        subfolders : bool, optional
+            Uses subdirectory names as labels and sample names,
+            by default False.
+
+        n_jobs : int, optional
+            Number of threads reading headers in parallel,
+            by default 8.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per file with path, file, sample and label columns
+            and the attributes from ims.Spectrum.read_mea_header.
+
+        Example
+        -------
+        >>> import ims
+        >>> table = ims.Dataset.scan("IMS_data", subfolders=True)
+        >>> table.groupby("label")["chunks_count"].describe()
+        """
+        import pandas as pd
+
+        paths, _, files, samples, labels = Dataset._measurements(path, subfolders)
+        headers = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(Spectrum.read_mea_header)(i) for i in paths
+        )
+
+        table = pd.DataFrame(headers)
+        table.insert(0, "path", paths)
+        table.insert(1, "file", files)
+        if subfolders:
+            table.insert(2, "sample", samples)
+            table.insert(3, "label", labels)
+        return table
+
     @classmethod
-    def read_hdf5(cls, path):
+    @profiled
+    def read_hdf5(cls, path, rt_range=None, dt_range=None, n_jobs=1):
         """
         Reads hdf5 files exported by the Dataset.to_hdf5 method.
         Convenient way to store preprocessed spectra.
@@ -355,21 +436,46 @@ class Dataset:
         requires more time.
         Preferred to csv because of faster read and write speeds.
 
+        With n_jobs > 1 the spectra are split into contiguous partitions
+        that are read by worker processes, each with its own read-only
+        file handle. Dense spectra of equal shape are written into a
+        shared memory mapped array instead of being sent back.
+        Speeds up compressed stores, see ims.store.
+
         Parameters
         ----------
         path : str
             Absolute or relative file path.
 
+        rt_range : tuple, optional
+            Start and stop value on the retention time coordinate.
+            Only this window is read with a hyperslab selection,
+            by default None.
+
+        dt_range : tuple, optional
+            Start and stop value on the stored drift time coordinate,
+            by default None.
+
+        n_jobs : int, optional
+            Number of worker processes. -1 uses all processors,
+            by default 1.
+
         Returns
         -------
         Dataset
 
+        Raises
+        ------
+        ValueError
+            If the file does not list the spectrum groups and their
+            order can not be derived from the file names.
+
         Example
         -------
         >>> import ims
         >>> sample = ims.Dataset.read_mea("IMS_data")
         >>> sample.to_hdf5("IMS_data_hdf5")
-        >>> sample = ims.Dataset.read_hdf5("IMS_data_hdf5")
+        >>> sample = ims.Dataset.read_hdf5("IMS_data_hdf5.hdf5", n_jobs=8)
         """
         with h5py.File(path, "r") as f:
             labels = [i.decode() for i in f["dataset"]["labels"]]
@@ -377,32 +483,167 @@ class Dataset:
             files = [i.decode() for i in f["dataset"]["files"]]
             preprocessing = [i.decode() for i in f["dataset"]["preprocessing"]]
 
-            data = []
-            for key in f.keys():
-                if key == "dataset":
-                    continue
-                values = np.array(f[key]["values"])
-                ret_time = np.array(f[key]["ret_time"])
-                drift_time = np.array(f[key]["drift_time"])
-                name = str(f[key].attrs["name"])
-                time = datetime.strptime(f[key].attrs["time"], "%Y-%m-%dT%H:%M:%S")
-                drift_time_label = str(f[key].attrs["drift_time_label"])
-                spectrum = Spectrum(name, values, ret_time, drift_time, time)
-                spectrum._drift_time_label = drift_time_label
-                data.append(spectrum)
-
-            name = os.path.split("Test.hdf5")[1]
-            name = name.split(".")[0]
+            keys = Dataset._hdf5_keys(f)
+
+            if n_jobs == 1:
+                data = Dataset._read_hdf5_groups(f, keys, rt_range, dt_range)
+            else:
+                shape = Dataset._hdf5_shape(f, keys, rt_range, dt_range)
+
+        if n_jobs != 1:
+            n_partitions = cpu_count() if n_jobs < 0 else n_jobs
+            partitions = np.array_split(np.arange(len(keys)), max(n_partitions, 1))
+            partitions = [partition for partition in partitions if len(partition) > 0]
+            if shape is None:
+                results = Parallel(n_jobs=n_jobs)(
+                    delayed(_with_dtype)(
+                        get_dtype(),
+                        Dataset._read_hdf5_groups,
+                        path,
+                        [keys[i] for i in partition],
+                        rt_range,
+                        dt_range,
+                    )
+                    for partition in partitions
+                )
+                data = [spectrum for result in results for spectrum in result]
+            else:
+                data = Dataset._read_hdf5_shared(
+                    path, keys, partitions, shape, rt_range, dt_range, n_jobs
+                )
+
+        name = os.path.split(path)[1]
+        name = name.split(".")[0]
 
         dataset = cls(data, name, files, samples, labels)
         dataset.preprocessing = preprocessing
         return dataset
 
-    def to_hdf5(self, name=None, path=None):
+    @staticmethod
+    def _hdf5_keys(f):
+        """
+        Spectrum group names of a hdf5 file in the order of the metadata.
+        Older files do not store them, h5py lists groups alphabetically,
+        so they are matched to the stored file names or taken from the
+        creation order if the file tracks it.
+        Raises ValueError if the order can not be determined.
+        """
+        grp = f["dataset"]
+        if "keys" in grp:
+            return [i.decode() for i in grp["keys"]]
+
+        groups = [key for key in f.keys() if key != "dataset"]
+        files = [i.decode() for i in grp["files"]] if "files" in grp else []
+        keys = []
+        for file in files:
+            # spectra are named after the file with or without extension
+            for key in (file, file.split(".")[0], os.path.splitext(file)[0]):
+                if key in groups and key not in keys:
+                    keys.append(key)
+                    break
+        if files and len(keys) == len(files) == len(groups):
+            return keys
+
+        # iteration follows the creation order when it is tracked
+        if f["/"].id.get_create_plist().get_link_creation_order():
+            return groups
+        raise ValueError(
+            f"Order of the spectra in {f.filename} can not be determined!"
+        )
+
+    @staticmethod
+    def _hdf5_shape(f, keys, rt_range=None, dt_range=None):
+        """
+        Shape (n_spectra, n_ret_time, n_drift_time) of the values
+        that are read from the spectrum groups.
+        None if any spectrum is sparse or the shapes differ.
+        """
+        shapes = set()
+        for key in keys:
+            grp = f[key]
+            if isinstance(grp["values"], h5py.Group):
+                return None
+            n_rows, n_cols = grp["values"].shape
+            if rt_range is not None:
+                rows = Spectrum._window(np.array(grp["ret_time"]), rt_range)
+                n_rows = len(range(*rows.indices(n_rows)))
+            if dt_range is not None:
+                cols = Spectrum._window(np.array(grp["drift_time"]), dt_range)
+                n_cols = len(range(*cols.indices(n_cols)))
+            shapes.add((n_rows, n_cols))
+
+        if len(shapes) != 1:
+            return None
+        shape = (len(keys), *shapes.pop())
+        return shape if np.prod(shape) > 0 else None
+
+    @staticmethod
+    def _read_hdf5_shared(path, keys, partitions, shape, rt_range, dt_range, n_jobs):
+        """
+        Reads the partitions in worker processes that write the values
+        into a preallocated memory mapped array, only the coordinates
+        and attributes are sent back.
+        """
+        # imported here because ims.shared builds on this module
+        from ims.shared import _temp_file, _remove
+
+        filename = _temp_file()
+        try:
+            values = np.memmap(filename, get_dtype(), "w+", shape=shape)
+            results = Parallel(n_jobs=n_jobs)(
+                delayed(Dataset._read_hdf5_groups)(
+                    path,
+                    [keys[i] for i in partition],
+                    rt_range,
+                    dt_range,
+                    values[partition[0] : partition[-1] + 1],
+                )
+                for partition in partitions
+            )
+            data = [spectrum for result in results for spectrum in result]
+            for i, spectrum in enumerate(data):
+                spectrum.values = np.array(values[i])
+            del values
+        finally:
+            _remove(filename)
+        return data
+
+    @staticmethod
+    def _read_hdf5_groups(f, keys, rt_range=None, dt_range=None, out=None):
+        """
+        Reads the spectrum groups with the given keys.
+        f is an open file or a path, which worker processes
+        open with their own read-only handle.
+        If out is given, the values are written into it
+        and the returned spectra have none.
+        """
+        if not isinstance(f, h5py.File):
+            with h5py.File(f, "r") as handle:
+                return Dataset._read_hdf5_groups(
+                    handle, keys, rt_range, dt_range, out
+                )
+        if out is None:
+            return [
+                Spectrum._from_hdf5_group(f[key], rt_range, dt_range) for key in keys
+            ]
+
+        data = []
+        for key, values in zip(keys, out):
+            spectrum = Spectrum._from_hdf5_group(f[key], rt_range, dt_range, values)
+            spectrum.values = None
+            data.append(spectrum)
+        out.flush()
+        return data
+
+    @profiled
+    def to_hdf5(self, name=None, path=None, mode="w-"):
         """
         Exports the dataset as hdf5 file.
         It contains one group per spectrum and one with labels etc.
+        Sparse spectra are stored in compressed sparse row format.
         Use ims.Dataset.read_hdf5 to read the file and construct a dataset.
+        To add spectra to an existing file use mode "a".
+        See ims.store for more ways to update large files.
 
         Parameters
         ----------
@@ -415,34 +656,288 @@ class Dataset:
             Path to save the file. If not set uses the current working
             directory, by default None.
 
+        mode : str, optional
+            "w-" fails if the file exists, "w" overwrites it and
+            "a" appends the spectra to it, by default "w-".
+
         Example
         -------
         >>> import ims
         >>> ds = ims.Dataset.read_mea("IMS_data")
         >>> ds.to_hdf5()
         >>> ds = ims.Dataset.read_hdf5("IMS_data.hdf5")
+        >>> new = ims.Dataset.read_mea("IMS_data_today")
+        >>> new.to_hdf5("IMS_data", mode="a")
         """
+        if mode not in ("w-", "w", "a"):
+            raise ValueError(f"{mode} is not a supported mode!")
+
         if name is None:
             name = self.name
 
         if path is None:
             path = os.getcwd()
 
-        with h5py.File(f"{path}/{name}.hdf5", "w-") as f:
+        if mode == "a":
+            # imported here because ims.store builds on this module
+            from ims.store import append
+
+            append(f"{path}/{name}.hdf5", self, compression=None, chunk_rows=None)
+            return
+
+        with h5py.File(f"{path}/{name}.hdf5", mode) as f:
             data = f.create_group("dataset")
             data.create_dataset("labels", data=self.labels)
             data.create_dataset("samples", data=self.samples)
             data.create_dataset("files", data=self.files)
             data.create_dataset("preprocessing", data=self.preprocessing)
+            data.create_dataset("keys", data=[sample.name for sample in self])
 
             for sample in self:
                 grp = f.create_group(sample.name)
-                grp.attrs["name"] = sample.name
-                grp.create_dataset("values", data=sample.values)
-                grp.create_dataset("ret_time", data=sample.ret_time)
-                grp.create_dataset("drift_time", data=sample.drift_time)
-                grp.attrs["time"] = datetime.strftime(sample.time, "%Y-%m-%dT%H:%M:%S")
-                grp.attrs["drift_time_label"] = sample._drift_time_label
+                sample._to_hdf5_group(grp)
+
+    @profiled
+    def to_zarr(self, path, chunk_rows=256, cname="zstd", clevel=5):
+        """
+        Exports the dataset as zarr store for concurrent and cloud storage.
+        Intensity values are stored as one array of shape
+        (n_spectra, n_ret_time, n_drift_time) in Blosc compressed chunks
+        of one spectrum and chunk_rows retention time rows.
+        Coordinates, labels, samples, file names and timestamps are
+        stored alongside. Requires the optional zarr package.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the zarr store. Overwritten if it exists.
+
+        chunk_rows : int, optional
+            Number of retention time rows per chunk, by default 256.
+
+        cname : str, optional
+            Blosc compressor, for example "zstd", "lz4" or "blosclz",
+            by default "zstd".
+
+        clevel : int, optional
+            Compression level from 0 to 9, by default 5.
+
+        Raises
+        ------
+        ValueError
+            If the spectra do not all have the same shape.
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data")
+        >>> ds.to_zarr("IMS_data.zarr")
+        >>> ds = ims.Dataset.read_zarr("IMS_data.zarr", rt_range=(80, 500))
+        """
+        import zarr
+        from zarr.codecs import BloscCodec
+
+        shapes = set(spectrum.shape for spectrum in self)
+        if len(shapes) > 1:
+            raise ValueError("All spectra must have the same shape!")
+        n_ret_time, n_drift_time = shapes.pop() if shapes else (0, 0)
+        n = len(self)
+
+        root = zarr.open_group(path, mode="w")
+        compressors = BloscCodec(cname=cname, clevel=clevel, shuffle="shuffle")
+        values = root.create_array(
+            "values",
+            shape=(n, n_ret_time, n_drift_time),
+            dtype=get_dtype(),
+            chunks=(1, max(min(chunk_rows, n_ret_time), 1), max(n_drift_time, 1)),
+            compressors=compressors,
+        )
+        ret_time = root.create_array(
+            "ret_time", shape=(n, n_ret_time), dtype=float, compressors=compressors
+        )
+        drift_time = root.create_array(
+            "drift_time", shape=(n, n_drift_time), dtype=float, compressors=compressors
+        )
+
+        for i, spectrum in enumerate(self):
+            values[i] = spectrum._dense_values()
+            ret_time[i] = spectrum.ret_time
+            drift_time[i] = spectrum.drift_time
+
+        root.attrs.update(
+            {
+                "name": self.name,
+                "files": _as_list(self.files),
+                "samples": _as_list(self.samples),
+                "labels": _as_list(self.labels),
+                "preprocessing": list(self.preprocessing),
+                "names": [spectrum.name for spectrum in self],
+                "times": [
+                    datetime.strftime(spectrum.time, "%Y-%m-%dT%H:%M:%S")
+                    for spectrum in self
+                ],
+                "drift_time_labels": [spectrum._drift_time_label for spectrum in self],
+            }
+        )
+
+    @classmethod
+    @profiled
+    def read_zarr(cls, path, rt_range=None, dt_range=None):
+        """
+        Reads zarr stores exported by the Dataset.to_zarr method.
+        Optionally reads only a retention and drift time window,
+        which only decompresses the chunks inside the window.
+        Requires the optional zarr package.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the zarr store.
+
+        rt_range : tuple, optional
+            Start and stop value on the retention time coordinate.
+            A stop of None reads to the end, by default None.
+
+        dt_range : tuple, optional
+            Start and stop value on the stored drift time coordinate,
+            by default None.
+
+        Returns
+        -------
+        Dataset
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_zarr("IMS_data.zarr")
+        >>> print(ds)
+        Dataset: IMS_data, 58 Spectra
+        """
+        import zarr
+
+        root = zarr.open_group(path, mode="r")
+        attrs = root.attrs.asdict()
+        ret_times = root["ret_time"][:]
+        drift_times = root["drift_time"][:]
+        times = np.array(attrs["times"], dtype="datetime64[s]").tolist()
+
+        data = []
+        for i, name in enumerate(attrs["names"]):
+            rows = Spectrum._window(ret_times[i], rt_range)
+            cols = Spectrum._window(drift_times[i], dt_range)
+            values = _cast(root["values"][i, rows, cols])
+            spectrum = Spectrum(
+                name, values, ret_times[i][rows], drift_times[i][cols], times[i]
+            )
+            spectrum._drift_time_label = attrs["drift_time_labels"][i]
+            data.append(spectrum)
+
+        dataset = cls(
+            data, attrs["name"], attrs["files"], attrs["samples"], attrs["labels"]
+        )
+        dataset.preprocessing = attrs["preprocessing"]
+        return dataset
+
+    def metadata_to_parquet(self, path):
+        """
+        Exports file names, samples, labels, spectrum names, timestamps
+        and shapes as Parquet table, one row per spectrum.
+        Requires pyarrow or fastparquet.
+
+        Parameters
+        ----------
+        path : str
+            Output file.
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data", subfolders=True)
+        >>> ds.metadata_to_parquet("IMS_data_metadata.parquet")
+        """
+        import pandas as pd
+
+        n = len(self)
+        table = pd.DataFrame(
+            {
+                "file": _as_list(self.files) or [None] * n,
+                "sample": _as_list(self.samples) or [None] * n,
+                "label": _as_list(self.labels) or [None] * n,
+                "name": [spectrum.name for spectrum in self],
+                "time": [spectrum.time for spectrum in self],
+                "n_ret_time": [spectrum.shape[0] for spectrum in self],
+                "n_drift_time": [spectrum.shape[1] for spectrum in self],
+            }
+        )
+        table.to_parquet(path, index=False)
+
+    def peaks_to_parquet(self, path):
+        """
+        Exports the peak tables of all spectra as one Parquet table.
+        Spectra without peak table are skipped.
+        Columns for file name, sample and label are added.
+        Requires pyarrow or fastparquet.
+
+        Parameters
+        ----------
+        path : str
+            Output file.
+
+        Raises
+        ------
+        ValueError
+            If no spectrum has a peak table.
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data", subfolders=True)
+        >>> for spectrum in ds:
+        ...     spectrum.find_peaks()
+        >>> ds.peaks_to_parquet("IMS_data_peaks.parquet")
+        """
+        import pandas as pd
+
+        tables = []
+        for i, spectrum in enumerate(self):
+            if spectrum.peak_table is None:
+                continue
+            table = spectrum.peak_table.reset_index()
+            table.insert(0, "label", self.labels[i] if self.labels else None)
+            table.insert(0, "sample", self.samples[i] if self.samples else None)
+            table.insert(0, "file", self.files[i] if self.files else None)
+            tables.append(table)
+
+        if not tables:
+            raise ValueError("No spectrum has a peak table!")
+        pd.concat(tables, ignore_index=True).to_parquet(path, index=False)
+
+    def share(self, folder=None):
+        """
+        Copies the spectra into a memory mapped file that worker processes
+        share without pickling the arrays. See ims.SharedDataset.
+
+        Parameters
+        ----------
+        folder : str, optional
+            Directory of the temporary file. If None uses /dev/shm
+            if it exists, by default None.
+
+        Returns
+        -------
+        ims.SharedDataset
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data", subfolders=True)
+        >>> with ds.share() as shared:
+        ...     X, y = shared.get_xy()
+        """
+        # imported here because ims.shared builds on this module
+        from ims.shared import SharedDataset
+
+        return SharedDataset(self, folder)
 
     def select(self, label=None, sample=None):
         """
@@ -638,6 +1133,8 @@ class Dataset:
         -------
         matplotlib.axes._subplots.AxesSubplot
         """
+        import matplotlib.pyplot as plt
+
         ax = self[index].plot(**kwargs)
         plt.title(f"{self[index].name}; {self.labels[index]}")
         return ax
@@ -673,6 +1170,7 @@ class Dataset:
         >>> ds = ims.Dataset.read_mea("IMS_Data")
         >>> X_train, X_test, y_train, y_test = ds.train_test_split()
         """
+        from sklearn.model_selection import ShuffleSplit, StratifiedShuffleSplit
 
         if stratify:
             s = StratifiedShuffleSplit(
@@ -736,6 +1234,8 @@ class Dataset:
         >>>     y_pred = model.predict(X_test)
         >>>     accuracy.append(accuracy_score(y_test, y_pred))
         """
+        from sklearn.model_selection import KFold, StratifiedKFold
+
         if stratify:
             kf = StratifiedKFold(
                 n_splits=n_splits, shuffle=shuffle, random_state=random_state
@@ -787,6 +1287,8 @@ class Dataset:
         >>>     y_pred = model.predict(X_test)
         >>>     accuracy.append(accuracy_score(y_test, y_pred))
         """
+        from sklearn.model_selection import ShuffleSplit
+
         rs = ShuffleSplit(
             n_splits=n_splits, test_size=test_size, random_state=random_state
         )
@@ -834,6 +1336,8 @@ class Dataset:
         >>>     y_pred = model.predict(X_test)
         >>>     accuracy.append(accuracy_score(y_test, y_pred))
         """
+        from sklearn.utils import resample
+
         for _ in range(n_bootstraps):
             train_data, train_labels = resample(
                 self.data, self.labels, n_samples=n_samples, random_state=random_state
@@ -872,6 +1376,8 @@ class Dataset:
         >>>     y_pred = model.predict(X_test, y_test)
         >>>     accuracy.append(accuracy_score(y_test, y_pred))
         """
+        from sklearn.model_selection import LeaveOneOut
+
         loo = LeaveOneOut()
         for train_index, test_index in loo.split(self):
             train_data = self[train_index]
@@ -880,6 +1386,7 @@ class Dataset:
             X_test, y_test = test_data.get_xy()
             yield X_train, X_test, y_train, y_test
 
+    @profiled
     def mean(self):
         """
         Calculates means for each sample, in case of repeat determinations.
@@ -891,34 +1398,182 @@ class Dataset:
         Dataset
             With mean spectra.
         """
-        indices = self.sample_indices
-        u_samples = np.unique(self.samples)
+        self.aggregate("mean")
+        self.preprocessing[-1] = "mean()"
+        return self
 
-        labels = []
-        grouped_data = []
-        for i in u_samples:
-            label = self.labels[indices[i][0]]
-            labels.append(label)
+    @profiled
+    def aggregate(self, method="mean"):
+        """
+        Reduces the spectra of each sample to a single spectrum,
+        in case of repeat determinations.
+        Accumulates each sample into preallocated buffers
+        in a single pass over the spectra.
+        Sample names are used for the resulting spectra
+        and file names are no longer needed.
 
-            data = []
-            index = indices[i]
-            for j in index:
-                data.append(self.data[j])
-            grouped_data.append(data)
+        Parameters
+        ----------
+        method : str, optional
+            "mean", "median", "std", "min" or "max" are valid.
+            The median needs all spectra of a sample at once,
+            the other methods only fixed size buffers per sample,
+            by default "mean".
 
-        means = []
-        for i in grouped_data:
-            means.append(sum(i) / len(i))
+        Returns
+        -------
+        Dataset
+            With one spectrum per sample.
 
-        for i, j in zip(means, u_samples):
-            i.name = j
+        Raises
+        ------
+        ValueError
+            If method is not supported.
 
-        self.data = means
-        self.samples = list(u_samples)
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data", subfolders=True)
+        >>> ds.aggregate("median")
+        """
+        data, samples, labels = Dataset._reduce_groups(
+            self.data, self.samples, self.labels, method
+        )
+        self.data = data
+        self.samples = samples
         self.labels = labels
-        self.preprocessing.append("mean()")
+        self.files = list(samples)
+        self.preprocessing.append(f"aggregate({method})")
         return self
 
+    @classmethod
+    @profiled
+    def read_aggregated(cls, path, method="mean", file_format="mea"):
+        """
+        Streams all files in the given directory and reduces
+        the spectra of each sample to a single spectrum while reading.
+        Only one spectrum per sample is kept in memory.
+        Expects the subfolder structure described in ims.Dataset.read_mea.
+
+        Parameters
+        ----------
+        path : str
+            Absolute or relative file path.
+
+        method : str, optional
+            "mean", "median", "std", "min" or "max" are valid,
+            by default "mean".
+
+        file_format : str, optional
+            "mea", "zip", "csv" or "hdf5" are valid,
+            by default "mea".
+
+        Returns
+        -------
+        Dataset
+            With one spectrum per sample.
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_aggregated("IMS_data", method="mean")
+        """
+        readers = {
+            "mea": Spectrum.read_mea,
+            "zip": Spectrum.read_zip,
+            "csv": Spectrum.read_csv,
+            "hdf5": Spectrum.read_hdf5,
+        }
+        if file_format not in readers:
+            raise ValueError(f"{file_format} is not a supported file format!")
+
+        paths, name, _, samples, labels = Dataset._measurements(path, True)
+        spectra = (readers[file_format](i) for i in paths)
+        data, samples, labels = Dataset._reduce_groups(spectra, samples, labels, method)
+        dataset = cls(data, name, samples, samples, labels)
+        dataset.preprocessing.append(f"aggregate({method})")
+        return dataset
+
+    @staticmethod
+    def _reduce_groups(spectra, samples, labels, method):
+        """
+        Single pass grouped reduction of spectra by sample name.
+        Spectra can be any iterable, for example a generator reading files.
+        Coordinates are always averaged.
+        Returns data, samples and labels sorted by sample name.
+        """
+        if method not in ("mean", "median", "std", "min", "max"):
+            raise ValueError(f"{method} is not a supported method!")
+
+        groups = {}
+        for spectrum, sample, label in zip(spectra, samples, labels):
+            values = spectrum.values
+            if sample not in groups:
+                groups[sample] = {
+                    "n": 0,
+                    "label": label,
+                    "time": spectrum.time,
+                    "drift_time_label": spectrum._drift_time_label,
+                    "ret_time": np.zeros(len(spectrum.ret_time)),
+                    "drift_time": np.zeros(len(spectrum.drift_time)),
+                }
+                grp = groups[sample]
+                if method == "median":
+                    grp["values"] = []
+                elif method in ("min", "max"):
+                    grp["values"] = np.array(values, dtype=np.float64)
+                else:
+                    grp["values"] = np.zeros(values.shape)
+                    grp["m2"] = np.zeros(values.shape) if method == "std" else None
+
+            grp = groups[sample]
+            grp["n"] += 1
+            grp["ret_time"] += spectrum.ret_time
+            grp["drift_time"] += spectrum.drift_time
+
+            if method == "median":
+                grp["values"].append(values)
+            elif method == "min":
+                np.minimum(grp["values"], values, out=grp["values"])
+            elif method == "max":
+                np.maximum(grp["values"], values, out=grp["values"])
+            elif method == "mean":
+                grp["values"] += values
+            else:
+                # Welford's online algorithm for the variance
+                delta = values - grp["values"]
+                grp["values"] += delta / grp["n"]
+                grp["m2"] += delta * (values - grp["values"])
+
+        data = []
+        labels = []
+        u_samples = sorted(groups)
+        for sample in u_samples:
+            grp = groups[sample]
+            n = grp["n"]
+            if method == "median":
+                values = np.median(np.stack(grp["values"]), axis=0)
+            elif method == "mean":
+                values = grp["values"] / n
+            elif method == "std":
+                values = np.sqrt(grp["m2"] / n)
+            else:
+                values = grp["values"]
+
+            spectrum = Spectrum(
+                sample,
+                _cast(values),
+                grp["ret_time"] / n,
+                grp["drift_time"] / n,
+                grp["time"],
+            )
+            spectrum._drift_time_label = grp["drift_time_label"]
+            data.append(spectrum)
+            labels.append(grp["label"])
+
+        return data, list(u_samples), labels
+
+    @profiled
     def asymcorr(self, lam=1e7, p=1e-3, niter=20):
         """
         Retention time baseline correction using asymmetric least squares.
@@ -944,10 +1599,28 @@ class Dataset:
         self.preprocessing.append("asymcorr")
         return self
 
-    def savgol(self, window_length=10, polyorder=2, direction="both"):
+    @profiled
+    def savgol(
+        self,
+        window_length=10,
+        polyorder=2,
+        direction="both",
+        deriv=0,
+        batch_size=16,
+        n_jobs=1,
+    ):
         """
         Applys a Savitzky-Golay filter to intensity values.
         Can be applied in the drift time, retention time or both directions.
+        See ims.Spectrum.savgol.
+
+        The kernels are computed once. Spectra with equal shapes are
+        stacked in batches and the separable filter is applied along
+        the retention and drift time axes of each batch, convolving
+        in blocks of rows that fit into the cache. Sparse spectra and
+        spectra with different shapes are filtered one by one.
+        With n_jobs > 1 batches are filtered in parallel threads
+        because numpy releases the GIL during the convolution.
 
         Parameters
         ----------
@@ -962,35 +1635,88 @@ class Dataset:
             Can be 'drift time', 'retention time' or 'both'.
             By default 'both'
 
+        deriv : int, optional
+            Order of the derivative per data point.
+            Only with direction 'drift_time' or 'ret_time', by default 0
+
+        batch_size : int, optional
+            Number of spectra stacked per batch, by default 16
+
+        n_jobs : int, optional
+            Number of threads. -1 uses all processors, by default 1
+
         Returns
         -------
         Dataset
-        """
-        self.data = [
-            Spectrum.savgol(i, window_length, polyorder, direction) for i in self.data
-        ]
-        self.preprocessing.append("savgol")
+
+        Raises
+        ------
+        ValueError
+            If direction is not valid or deriv is used with 'both'.
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data")
+        >>> ds.savgol(window_length=9, polyorder=2, n_jobs=4)
+        """
+        axes = Spectrum._savgol_axes(direction, deriv)
+        batches = self._batches(batch_size)
+        if batches is None:
+            batches = [[spectrum] for spectrum in self.data]
+        Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(self._savgol_batch)(batch, window_length, polyorder, deriv, axes)
+            for batch in batches
+        )
+        if deriv:
+            self.preprocessing.append(f"savgol(deriv={deriv})")
+        else:
+            self.preprocessing.append("savgol")
         return self
 
-    def tophat(self, size=15):
+    @profiled
+    def tophat(self, size=15, method="disk", factor=4, n_jobs=1):
         """
         Applies white tophat filter on data matrix as a baseline correction.
-        Size parameter is the diameter of the circular structuring element.
-        (Slow with large size values.)
+        Size parameter is the radius of the circular structuring element.
+        See ims.Spectrum.tophat for the available methods.
+        (Slow with large size values and method "disk".)
 
         Parameters
         ----------
         size : int, optional
             Size of structuring element, by default 15.
 
+        method : str, optional
+            "disk", "decomposed", "rectangle" or "downsample",
+            by default "disk".
+
+        factor : int, optional
+            Downsampling factor in both dimensions,
+            only used with method "downsample", by default 4.
+
+        n_jobs : int, optional
+            Number of parallel worker processes.
+            -1 uses all processors, by default 1.
+
         Returns
         -------
         Dataset
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data")
+        >>> ds.tophat(size=30, method="decomposed", n_jobs=-1)
         """
-        self.data = [Spectrum.tophat(i, size) for i in self.data]
-        self.preprocessing.append("tophat")
+        self.data = Parallel(n_jobs=n_jobs)(
+            delayed(_with_dtype)(get_dtype(), Spectrum.tophat, i, size, method, factor)
+            for i in self.data
+        )
+        self.preprocessing.append(f"tophat({size}, {method})")
         return self
 
+    @profiled
     def sub_first_rows(self, n=1):
         """
         Subtracts first row from every row in spectrum.
@@ -1005,45 +1731,153 @@ class Dataset:
         self.preprocessing.append("sub_first_row")
         return self
 
-    def interp_riprel(self):
+    @profiled
+    def sparsify(self, threshold=0):
+        """
+        Stores the intensity matrices as compressed sparse row matrices.
+        Values with an absolute value below the threshold are set
+        to zero and are not stored. Negative values, which are common
+        after baseline correction, are kept unless they are that small.
+        Cuts memory and storage requirements after baseline correction.
+
+        Parameters
+        ----------
+        threshold : int or float, optional
+            Values with an absolute value below threshold are discarded.
+            0 only drops zeros, by default 0.
+
+        Returns
+        -------
+        Dataset
+            With sparse spectra.
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data")
+        >>> ds.tophat().sparsify(threshold=5)
+        >>> ds.to_hdf5()
+        """
+        self.data = [Spectrum.sparsify(i, threshold) for i in self.data]
+        self.preprocessing.append(f"sparsify({threshold})")
+        return self
+
+    def densify(self):
+        """
+        Converts sparse intensity matrices back to numpy arrays.
+
+        Returns
+        -------
+        Dataset
+            With dense spectra.
+        """
+        self.data = [Spectrum.densify(i) for i in self.data]
+        return self
+
+    @profiled
+    def interp_riprel(self, kind="cubic", chunk_size=512):
         """
         Interpolates all spectra to common RIP relative drift time coordinate.
         Alignment along drift time coordinate.
 
+        The RIP positions are determined first, then every spectrum is
+        resampled with a precomputed sparse interpolation weight matrix.
+        Spectra with the same RIP relative drift time coordinate share
+        the weights and are interpolated together. Rows are processed
+        in chunks across these spectra and each spectrum gets its new
+        values as soon as its last row is done, so only few spectra
+        are held twice in memory.
+
+        Cubic interpolation uses the Keys cubic convolution kernel
+        instead of the cubic spline of earlier versions, so the
+        results differ from those of earlier versions, most near
+        sharp peaks such as the RIP.
+
+        Parameters
+        ----------
+        kind : str, optional
+            "linear" or "cubic" interpolation,
+            by default "cubic".
+
+        chunk_size : int, optional
+            Number of retention time rows interpolated at once,
+            taken from consecutive spectra that share the weights,
+            by default 512.
+
         Returns
         -------
         Dataset
             With RIP relative spectra.
         """
         dt_riprel = []
-        interp_fn = []
         for i in self.data:
             dt = i.drift_time
             rip = np.median(np.argmax(i.values, axis=1)).astype("int32")
             rip_ms = np.mean(dt[rip])
-            riprel = dt / rip_ms
-            f = interp1d(riprel, i.values, axis=1, kind="cubic")
-            dt_riprel.append(riprel)
-            interp_fn.append(f)
+            dt_riprel.append(dt / rip_ms)
 
         start = max([i[0] for i in dt_riprel])
         end = min([i[-1] for i in dt_riprel])
         interv = np.median([(i[-1] - i[0]) / len(i) for i in dt_riprel])
         new_dt = np.arange(start, end, interv)
 
-        for i, f in zip(self.data, interp_fn):
-            i.values[:, : len(new_dt)]
-            i.values = f(new_dt)
-            i.drift_time = new_dt
-            i._drift_time_label = "Drift time RIP relative"
+        # spectra with identical axes share the weights
+        groups = {}
+        for i, riprel in zip(self.data, dt_riprel):
+            groups.setdefault(riprel.tobytes(), (riprel, []))[1].append(i)
+
+        for riprel, spectra in groups.values():
+            w = interp_weights(riprel, new_dt, kind)
+            sources = [i._dense_values() for i in spectra]
+            results = {}
+
+            # chunks of rows are taken across the spectra of the group
+            offsets = np.cumsum([0] + [len(values) for values in sources])
+            for start in range(0, offsets[-1], chunk_size):
+                stop = min(start + chunk_size, offsets[-1])
+                first = np.searchsorted(offsets, start, side="right") - 1
+                last = np.searchsorted(offsets, stop, side="left")
+                segments = [
+                    (k, max(start, offsets[k]) - offsets[k],
+                     min(stop, offsets[k + 1]) - offsets[k])
+                    for k in range(first, last)
+                ]
+                block = np.concatenate(
+                    [sources[k][a:b] for k, a, b in segments]
+                ) @ w
+                pos = 0
+                for k, a, b in segments:
+                    if k not in results:
+                        results[k] = np.empty(
+                            (len(sources[k]), len(new_dt)), dtype=get_dtype()
+                        )
+                    results[k][a:b] = block[pos : pos + b - a]
+                    pos += b - a
+
+                    # finished spectra release their input values
+                    if b == len(sources[k]):
+                        spectra[k].values = results.pop(k)
+                        spectra[k].drift_time = new_dt
+                        spectra[k]._drift_time_label = "Drift time RIP relative"
+                        sources[k] = None
 
         self.preprocessing.append("interp_riprel()")
         return self
-    
-    def align_ret_time(self, reference="mean"):
+
+    @profiled
+    def align_ret_time(self, reference="mean", features=None, window=None, n_jobs=1):
         """
         Retention time alignment based on dymanic time warping.
 
+        The distances can be calculated on a reduced representation
+        of the spectra and the warping can be constrained to a
+        Sakoe-Chiba band which makes the alignment much faster
+        and only stores the band of the cost matrices.
+        The warping paths are computed in parallel worker processes
+        if n_jobs is not 1.
+        The fitted ims.RetTimeAlignment is kept in the alignment attribute
+        to align new spectra to the same reference.
+
         Parameters
         ----------
         reference : str, int or Spectrum, optional
@@ -1052,31 +1886,39 @@ class Dataset:
             An integer is used to index the dataset and select a Spectrum.
             If a Spectrum is given, uses this external sample as reference,
             by default "mean".
-        """        
-        if isinstance(reference, str) and reference == "mean":
-            reference_ret_time = np.mean(
-                np.vstack([sample.ret_time for sample in self.data]),
-                axis=0
-                )
-            X, _ = self.get_xy(flatten=False)
-            reference_values = np.mean(X, axis=0)
-            
-        elif isinstance(reference, int):
-            reference_ret_time = self.data[reference].ret_time
-            reference_values = self.data[reference].values
-            
-        elif isinstance(reference, Spectrum):
-            reference_ret_time = reference.ret_time
-            reference_values = reference.values
-
-        for sample in self.data:
-            res = dtw(sample.values, reference_values)
-            warping_path = res.get_warping_path(target="query")
-            sample.values = sample.values[warping_path, :]
-            sample.ret_time = reference_ret_time
-            
+
+        features : str or int, optional
+            "tic" aligns the total ion chromatograms.
+            An integer sums the drift time into this number of windows.
+            If None the full spectra are used,
+            by default None.
+
+        window : int, optional
+            Size of the Sakoe-Chiba band in retention time rows.
+            If None the warping is unconstrained,
+            by default None.
+
+        n_jobs : int, optional
+            Number of parallel worker processes.
+            -1 uses all processors, by default 1.
+
+        Returns
+        -------
+        Dataset
+            With aligned retention time.
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data")
+        >>> ds.align_ret_time(features=10, window=100, n_jobs=-1)
+        """
+        self.alignment = RetTimeAlignment(features, window, n_jobs)
+        self.alignment.fit_transform(self, reference)
+        self.preprocessing.append("align_ret_time")
         return self
 
+    @profiled
     def rip_scaling(self):
         """
         Scales values relative to global maximum.
@@ -1092,6 +1934,7 @@ class Dataset:
         self.preprocessing.append("rip_scaling")
         return self
 
+    @profiled
     def resample(self, n=2):
         """
         Resamples each spectrum by calculating means of every n rows.
@@ -1123,6 +1966,7 @@ class Dataset:
         self.preprocessing.append(f"resample({n})")
         return self
 
+    @profiled
     def binning(self, n=2):
         """
         Downsamples each spectrum by binning the array with factor n.
@@ -1157,11 +2001,26 @@ class Dataset:
         self.preprocessing.append(f"binning({n})")
         return self
     
-    def wavecompr(self, direction="ret_time", wavelet="db3", level=3):
+    @profiled
+    def wavecompr(
+        self,
+        direction="ret_time",
+        wavelet="db3",
+        level=3,
+        details=False,
+        batch_size=16,
+        n_jobs=1,
+    ):
         """
         Data reduction by wavelet compression.
         Can be applied to drift time, retention time or both axis.
 
+        Spectra with equal shapes are stacked in batches and each batch
+        is transformed in one call of ims.utils.wavelet_approximation,
+        which only computes the approximation coefficients.
+        Sparse spectra, spectra with different shapes and details=True
+        use ims.Spectrum.wavecompr one by one.
+
         Parameters
         ----------
         direction : str, optional
@@ -1177,6 +2036,19 @@ class Dataset:
             Decomposition level (must be >= 0),
             by default 3.
 
+        details : bool, optional
+            Keeps the detail coefficients of every spectrum in its
+            wavelet_details attribute, see ims.Spectrum.wavecompr,
+            by default False.
+
+        batch_size : int, optional
+            Number of spectra stacked per batch. Limits the additional
+            memory to about two batches per worker, by default 16.
+
+        n_jobs : int, optional
+            Number of threads transforming batches.
+            -1 uses all processors, by default 1.
+
         Returns
         -------
         Dataset
@@ -1185,11 +2057,167 @@ class Dataset:
         ------
         ValueError
             When direction is neither 'ret_time', 'drift_time' or 'both'.
-        """        
-        self.data = [Spectrum.wavecompr(i, direction, wavelet, level) for i in self.data]
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data")
+        >>> ds.wavecompr("both", level=3, n_jobs=4)
+        """
+        axes = {"ret_time": (0,), "drift_time": (1,), "both": (0, 1)}
+        if direction not in axes:
+            raise ValueError("Direction must be 'ret_time', 'drift_time or 'both'!")
+
+        batches = self._batches(batch_size)
+        if details or batches is None:
+            self.data = [
+                Spectrum.wavecompr(i, direction, wavelet, level, details)
+                for i in self.data
+            ]
+        else:
+            Parallel(n_jobs=n_jobs, prefer="threads")(
+                delayed(self._wavecompr_batch)(batch, axes[direction], wavelet, level)
+                for batch in batches
+            )
         self.preprocessing.append(f"wavecompr")
         return self
 
+    def _batches(self, batch_size):
+        """
+        Splits the spectra into lists of batch_size spectra that can be
+        stacked into one array. None if shapes differ or spectra are sparse.
+        """
+        shapes = set(spectrum.shape for spectrum in self.data)
+        if len(shapes) > 1 or any(spectrum.is_sparse for spectrum in self.data):
+            return None
+        return [
+            self.data[i : i + batch_size] for i in range(0, len(self.data), batch_size)
+        ]
+
+    @staticmethod
+    def _wavecompr_batch(spectra, axes, wavelet, level):
+        """Compresses a list of equally shaped spectra in place."""
+        values = wavelet_approximation(
+            np.stack([spectrum.values for spectrum in spectra]),
+            wavelet,
+            level,
+            tuple(axis + 1 for axis in axes),
+        )
+        values = _cast(values)
+        if 0 in axes:
+            ret_time = wavelet_approximation(
+                np.stack([spectrum.ret_time for spectrum in spectra]),
+                wavelet,
+                level,
+                (1,),
+            )
+        if 1 in axes:
+            drift_time = wavelet_approximation(
+                np.stack([spectrum.drift_time for spectrum in spectra]),
+                wavelet,
+                level,
+                (1,),
+            )
+        for i, spectrum in enumerate(spectra):
+            spectrum.values = values[i]
+            if 0 in axes:
+                spectrum.ret_time = ret_time[i]
+            if 1 in axes:
+                spectrum.drift_time = drift_time[i]
+
+    @profiled
+    def wavelet_denoise(
+        self, wavelet="db3", level=3, threshold="bayes", batch_size=16, n_jobs=1
+    ):
+        """
+        Removes noise by soft thresholding the detail coefficients of a
+        two dimensional multilevel wavelet decomposition and
+        reconstructing the intensity values.
+        The noise level is estimated for every spectrum separately.
+        See ims.utils.wavelet_denoise for the thresholds.
+
+        Spectra with equal shapes are stacked in batches and every batch
+        is decomposed in one call. Sparse spectra and spectra with
+        different shapes are denoised one by one.
+
+        Much faster than the denoising in ims.Spectrum.find_peaks,
+        which runs on every call. Denoise once and use find_peaks
+        with denoise=None.
+
+        Parameters
+        ----------
+        wavelet : str, optional
+            Wavelet object or name string,
+            by default "db3".
+
+        level : int, optional
+            Decomposition level, by default 3.
+
+        threshold : str, optional
+            "bayes" or "universal", by default "bayes".
+
+        batch_size : int, optional
+            Number of spectra stacked per batch, by default 16.
+
+        n_jobs : int, optional
+            Number of threads denoising batches.
+            -1 uses all processors, by default 1.
+
+        Returns
+        -------
+        Dataset
+
+        Raises
+        ------
+        ValueError
+            If threshold is not 'bayes' or 'universal'.
+
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data")
+        >>> ds.wavelet_denoise(threshold="bayes", n_jobs=4)
+        >>> for spectrum in ds:
+        ...     spectrum.find_peaks(denoise=None)
+        """
+        batches = self._batches(batch_size)
+        if batches is None:
+            batches = [[spectrum] for spectrum in self.data]
+        Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(self._wavelet_denoise_batch)(batch, wavelet, level, threshold)
+            for batch in batches
+        )
+        self.preprocessing.append(f"wavelet_denoise({wavelet}, {threshold})")
+        return self
+
+    @staticmethod
+    def _savgol_batch(spectra, window_length, polyorder, deriv, axes):
+        """Filters a list of equally shaped spectra in place."""
+        values = savgol(
+            _cast(np.stack([spectrum._dense_values() for spectrum in spectra])),
+            window_length,
+            polyorder,
+            deriv,
+            tuple(axis + 1 for axis in axes),
+        )
+        values = _cast(values)
+        for i, spectrum in enumerate(spectra):
+            spectrum.values = values[i]
+
+    @staticmethod
+    def _wavelet_denoise_batch(spectra, wavelet, level, threshold):
+        """Denoises a list of equally shaped spectra in place."""
+        values = wavelet_denoise(
+            np.stack([spectrum._dense_values() for spectrum in spectra]),
+            wavelet,
+            level,
+            threshold,
+        )
+        values = _cast(values)
+        for i, spectrum in enumerate(spectra):
+            spectrum.values = values[i]
+
+    @profiled
     def cut_dt(self, start, stop=None):
         """
         Cuts data along drift time coordinate.
@@ -1228,6 +2256,7 @@ class Dataset:
         self.preprocessing.append(f"cut_dt({start}, {stop})")
         return self
 
+    @profiled
     def cut_rt(self, start, stop=None):
         """
         Cuts data along retention time coordinate.
@@ -1295,9 +2324,12 @@ class Dataset:
         for i in self.data:
             i.export_plot(path=folder_name, file_format=file_format, **kwargs)
 
+    @profiled
     def get_xy(self, flatten=True):
         """
         Returns features (X) and labels (y) as numpy arrays.
+        If any spectrum is sparse X is returned as
+        scipy.sparse.csr_matrix with one row per spectrum.
 
         Parameters
         ----------
@@ -1309,14 +2341,27 @@ class Dataset:
         tuple
             (X, y)
 
+        Raises
+        ------
+        ValueError
+            If flatten is False and the dataset contains sparse spectra.
+
         Example
         -------
         >>> import ims
         >>> ds = ims.Dataset.read_mea("IMS_data")
         >>> X, y = ds.get_xy()
         """
+        if any(i.is_sparse for i in self.data):
+            if not flatten:
+                raise ValueError("Sparse spectra can only be returned flattened.")
+            X = [sparse.csr_matrix(i.values).reshape(1, -1) for i in self.data]
+            X = _cast(sparse.vstack(X, format="csr"))
+            y = np.array(self.labels)
+            return (X, y)
+
         X = [i.values for i in self.data]
-        X = np.stack(X)
+        X = _cast(np.stack(X))
         y = np.array(self.labels)
 
         if flatten:
@@ -1325,9 +2370,14 @@ class Dataset:
 
         return (X, y)
 
+    @profiled
     def scaling(self, method="pareto", mean_centering=True):
         """
         Scales and mean centeres features according to selected method.
+        Means and variances are computed in a single streaming pass
+        and the spectra are scaled one by one.
+        The fitted ims.Scaler is kept in the scaler attribute
+        to apply the same weights to test data.
 
         Parameters
         ----------
@@ -1347,31 +2397,18 @@ class Dataset:
         ------
         ValueError
             If scaling method is not supported.
-        """
-        X = [i.values for i in self.data]
-        X = np.stack(X)
-        a, b, c = X.shape
-        X = X.reshape(a, b * c)
-
-        if method == "auto":
-            weights = 1 / np.std(X, 0)
-        elif method == "pareto":
-            weights = 1 / np.sqrt(np.std(X, 0))
-        elif method == "var":
-            weights = 1 / np.var(X, 0)
-        else:
-            raise ValueError(f"{method} is not a supported method!")
-
-        weights = np.nan_to_num(weights, posinf=0, neginf=0)
-
-        if mean_centering:
-            X = (X - np.mean(X, 0)) * weights
-        else:
-            X = X * weights
-
-        for i, j in enumerate(self.data):
-            j.values = X[i, :].reshape(b, c)
 
-        self.weights = weights
+        Example
+        -------
+        >>> import ims
+        >>> ds = ims.Dataset.read_mea("IMS_data")
+        >>> train, test = ds[:40], ds[40:]
+        >>> train.scaling("auto")
+        >>> train.scaler.transform(test)
+        """
+        self.scaler = Scaler(method, mean_centering)
+        self.scaler.fit_transform(self)
+        self.weights = self.scaler.weights
         self.preprocessing.append(f"scaling({method})")
         return self
+
@@ -2,22 +2,25 @@ import os
 import re
 import json
 import h5py
-import pywt
-from array import array
 from copy import deepcopy
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.ticker import AutoMinorLocator
 from datetime import datetime
 from time import ctime
-from skimage.morphology import white_tophat, disk
 from zipfile import ZipFile
-from ims.utils import asymcorr
-from findpeaks import findpeaks
-from scipy.signal import savgol_filter
-from scipy import ndimage as ndi
-from skimage.segmentation import watershed
+from ims.utils import (
+    asymcorr,
+    get_dtype,
+    nearest_index,
+    savgol,
+    wavelet_approximation,
+    wavelet_denoise,
+    _cast,
+)
+from ims.profiling import profiled
+from scipy import sparse
+
+# Plotting, peak detection, morphology, filtering and wavelet dependencies
+# are imported inside the methods that need them to keep `import ims` fast.
 
 
 class Spectrum:
@@ -63,6 +66,7 @@ class Spectrum:
         self.drift_time = drift_time
         self.time = time
         self.peak_table = None
+        self.wavelet_details = None
         self._drift_time_label = "Drift time [ms]"
 
     def __repr__(self):
@@ -84,7 +88,7 @@ class Spectrum:
             raise NotImplementedError()
 
     def __truediv__(self, other):
-        if isinstance(other, int):
+        if isinstance(other, (int, float, np.number)):
             values = self.values / other
             ret_time = self.ret_time / other
             drift_time = self.drift_time / other
@@ -102,6 +106,71 @@ class Spectrum:
         """
         return self.values.shape
 
+    @property
+    def is_sparse(self):
+        """
+        True if the intensity matrix is stored as scipy.sparse matrix.
+        """
+        return sparse.issparse(self.values)
+
+    def _dense_values(self):
+        """Intensity matrix as numpy.ndarray, converts sparse matrices."""
+        if self.is_sparse:
+            return self.values.toarray()
+        return self.values
+
+    @profiled
+    def sparsify(self, threshold=0):
+        """
+        Stores the intensity matrix as compressed sparse row matrix.
+        Values with an absolute value below the threshold are set
+        to zero and are not stored. Negative values, which are common
+        after baseline correction, are kept unless they are that small.
+        Effective after baseline corrections like tophat, asymcorr or
+        sub_first_rows when most of the matrix is close to zero.
+
+        Plotting, peak detection, watershed segmentation, ims.Dataset.get_xy
+        and the hdf5 export accept sparse spectra.
+        Other preprocessing methods require the dense representation,
+        use the densify method before applying them.
+
+        Parameters
+        ----------
+        threshold : int or float, optional
+            Values with an absolute value below threshold are discarded.
+            0 only drops zeros, by default 0.
+
+        Returns
+        -------
+        Spectrum
+            With scipy.sparse.csr_matrix as values.
+
+        Example
+        -------
+        >>> import ims
+        >>> sample = ims.Spectrum.read_mea("sample.mea")
+        >>> sample.tophat().sparsify(threshold=5)
+        >>> print(sample.is_sparse)
+        True
+        """
+        values = self._dense_values()
+        values = np.where(np.abs(values) >= threshold, values, 0)
+        self.values = sparse.csr_matrix(values)
+        return self
+
+    def densify(self):
+        """
+        Converts a sparse intensity matrix back to a numpy.ndarray.
+        Does nothing if the values are already dense.
+
+        Returns
+        -------
+        Spectrum
+            With numpy.ndarray as values.
+        """
+        self.values = self._dense_values()
+        return self
+
     def copy(self):
         """
         Uses deepcopy from the copy module in the standard library.
@@ -122,6 +191,7 @@ class Spectrum:
         return deepcopy(self)
 
     @classmethod
+    @profiled
     def read_zip(cls, path):
         """
         Reads zipped csv and json files from G.A.S Dortmund mea2zip converting tool.
@@ -145,13 +215,15 @@ class Spectrum:
         GC-IMS Spectrum: sample
         """
         with ZipFile(path) as myzip:
-            with myzip.open("csv_data.csv", "r") as mycsv:
-                values = pd.read_csv(mycsv, header=None)
             with myzip.open("meta_attributes.json", "r") as myjson:
                 meta_attr = json.load(myjson)
-
-        values = np.array(values)
-        values = np.delete(values, -1, axis=1)
+            # every row ends with a separator, the empty last column is skipped
+            with myzip.open("csv_data.csv", "r") as mycsv:
+                values = Spectrum._read_csv_values(
+                    mycsv,
+                    meta_attr["Chunks count"],
+                    meta_attr["Chunk sample count"],
+                )
 
         ret_time = (
             np.arange(meta_attr["Chunks count"])
@@ -171,17 +243,32 @@ class Spectrum:
         return cls(name, values, ret_time, drift_time, time)
 
     @classmethod
-    def read_mea(cls, path):
+    @profiled
+    def read_mea(cls, path, rt_range=None, dt_range=None):
         """
         Reads mea files from G.A.S Dortmund instruments.
         Alternative constructor for ims.Spectrum class.
         Much faster than reading csv files and therefore preferred.
 
+        Optionally reads only a retention and drift time window.
+        Only the rows inside the retention time window are read from disk,
+        which saves most of the I/O if models use a small region.
+
         Parameters
         ----------
         path : str
             Absolute or relative file path.
 
+        rt_range : tuple, optional
+            Start and stop value on the retention time coordinate in s.
+            A stop of None reads to the end. If None reads all rows,
+            by default None.
+
+        dt_range : tuple, optional
+            Start and stop value on the drift time coordinate in ms.
+            A stop of None reads to the end. If None reads all columns,
+            by default None.
+
         Returns
         -------
         Spectrum
@@ -192,56 +279,232 @@ class Spectrum:
         >>> sample = ims.Spectrum.read_mea("sample.mea")
         >>> print(sample)
         GC-IMS Spectrum: sample
+        >>> sample = ims.Spectrum.read_mea("sample.mea", rt_range=(80, 500))
+        >>> print(sample.shape)
+        (2857, 3150)
         """
         path = os.path.normpath(path)
         name = os.path.split(path)[1]
         name = name.split(".")[0]
 
         with open(path, "rb") as f:
-            content = f.read()
-            i = content.index(0)
-            meta_attr = content[: i - 1]
-            meta_attr = meta_attr.decode("windows-1252")
-            data = content[i + 1 :]
-            data = array("h", data)
+            content = Spectrum._read_mea_header_bytes(f)
+            meta_attr = Spectrum._parse_mea_header(content[:-1])
+
+            chunks_count = meta_attr["chunks_count"]
+            chunk_sample_count = meta_attr["chunk_sample_count"]
+
+            ret_time, drift_time = Spectrum._mea_axes(meta_attr)
+
+            rows = Spectrum._window(ret_time, rt_range)
+            cols = Spectrum._window(drift_time, dt_range)
+            start, stop, _ = rows.indices(chunks_count)
+            n_rows = max(stop - start, 0)
+
+            # rows are stored contiguously as 16 bit integers after the header
+            f.seek(len(content) + 1 + start * chunk_sample_count * 2)
+            data = np.frombuffer(
+                f.read(n_rows * chunk_sample_count * 2), dtype=np.int16
+            )
+
+        # cast directly from the raw 16 bit integers to the package dtype
+        data = _cast(data.reshape(n_rows, chunk_sample_count)[:, cols])
+
+        timestamp = meta_attr["timestamp"]
+
+        return cls(name, data, ret_time[rows], drift_time[cols], timestamp)
+
+    @staticmethod
+    def _read_csv_values(f, n_rows, n_cols, skiprows=0, index_col=False, chunksize=2048):
+        """
+        Parses the first n_cols columns of a numeric csv file
+        into a preallocated array of the package dtype without type inference.
+        Uses the multithreaded pyarrow csv reader if it is installed and
+        otherwise the pandas C parser chunk by chunk to avoid intermediate
+        copies of the whole matrix. n_rows can be an upper bound.
+        If index_col is True the first column is returned separately
+        as float array.
+        """
+        dtype = get_dtype()
+        offset = 1 if index_col else 0
+
+        try:
+            import pyarrow as pa
+            from pyarrow import csv as pa_csv
+        except ImportError:
+            pa_csv = None
+
+        if pa_csv is not None:
+            names = [f"f{i}" for i in range(n_cols)]
+            # arrow can not parse half precision, values are cast on copy
+            parse_type = pa.float32() if dtype.itemsize <= 4 else pa.float64()
+            column_types = dict.fromkeys(names, parse_type)
+            if index_col:
+                column_types[names[0]] = pa.float64()
+            table = pa_csv.read_csv(
+                f,
+                read_options=pa_csv.ReadOptions(
+                    skip_rows=skiprows, autogenerate_column_names=True
+                ),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=names, column_types=column_types
+                ),
+            )
+            index = table.column(0).to_numpy()
+            values = np.empty((table.num_rows, n_cols - offset), dtype=dtype)
+            for j in range(offset, n_cols):
+                values[:, j - offset] = table.column(j).to_numpy()
+        else:
+            import pandas as pd
+
+            index = np.empty(n_rows, dtype=float)
+            values = np.empty((n_rows, n_cols - offset), dtype=dtype)
+            reader = pd.read_csv(
+                f,
+                header=None,
+                skiprows=skiprows,
+                usecols=range(n_cols),
+                dtype=float if index_col else dtype,
+                chunksize=chunksize,
+            )
+            i = 0
+            for chunk in reader:
+                chunk = chunk.to_numpy()
+                index[i : i + len(chunk)] = chunk[:, 0]
+                values[i : i + len(chunk)] = chunk[:, offset:]
+                i += len(chunk)
+            index = index[:i]
+            values = values[:i]
+
+        if index_col:
+            return index, values
+        return values
+
+    @staticmethod
+    def _mea_axes(meta_attr):
+        """Retention and drift time coordinates from a parsed mea header."""
+        ret_time = (
+            np.arange(meta_attr["chunks_count"])
+            * (meta_attr["chunk_averages"] + 1)
+            * meta_attr["chunk_trigger_repetition"]
+            / 1000
+        )
+        drift_time = (
+            np.arange(meta_attr["chunk_sample_count"]) / meta_attr["chunk_sample_rate"]
+        )
+        return ret_time, drift_time
 
+    @staticmethod
+    def _window(axis, window):
+        """
+        Slice of the sorted axis between the values closest
+        to start and stop of the window.
+        Slices of indices are returned unchanged.
+        """
+        if window is None:
+            return slice(None)
+        if isinstance(window, slice):
+            return window
+        start, stop = window
+        idx_start = 0 if start is None else nearest_index(axis, start)
+        idx_stop = len(axis) if stop is None else nearest_index(axis, stop)
+        return slice(idx_start, idx_stop)
+
+    @staticmethod
+    def _read_mea_header_bytes(f, block_size=4096):
+        """
+        Reads from an open mea file until the zero byte
+        that ends the text header. Returns the header without it.
+        """
+        content = b""
+        while True:
+            block = f.read(block_size)
+            if not block:
+                raise ValueError(f"{f.name} has no mea header!")
+            i = block.find(0)
+            if i >= 0:
+                content += block[:i]
+                return content
+            content += block
+
+    @staticmethod
+    def _parse_mea_header(meta_attr):
+        """
+        Parses the text header of mea files into the attributes
+        needed to construct a Spectrum.
+        """
+        meta_attr = meta_attr.decode("windows-1252")
         meta_attr = meta_attr.split("\n")
 
         key_re = re.compile("^.*?(?==)")
         value_re = re.compile("(?<==)(.*?)(?=\[|$)")
         # unit_re = re.compile("\[(.*?)\]")
 
+        header = {}
         for i in meta_attr:
             key = key_re.search(i).group(0).strip()
             value = value_re.search(i).group(0).strip()
             if "Chunks count" in key:
-                chunks_count = int(value)
+                header["chunks_count"] = int(value)
             elif "Chunk averages" in key:
-                chunk_averages = int(value)
+                header["chunk_averages"] = int(value)
             elif "Chunk sample count" in key:
-                chunk_sample_count = int(value)
+                header["chunk_sample_count"] = int(value)
             elif "Chunk sample rate" in key:
-                chunk_sample_rate = int(value)
+                header["chunk_sample_rate"] = int(value)
             elif "Chunk trigger repetition" in key:
-                chunk_trigger_repetition = int(value)
+                header["chunk_trigger_repetition"] = int(value)
             elif "Timestamp" in key:
-                timestamp = datetime.strptime(value, '"%Y-%m-%dT%H:%M:%S"')
+                header["timestamp"] = datetime.strptime(value, '"%Y-%m-%dT%H:%M:%S"')
 
-        data = np.array(data)
-        data = data.reshape(chunks_count, chunk_sample_count)
+        return header
 
-        ret_time = (
-            np.arange(chunks_count)
-            * (chunk_averages + 1)
-            * chunk_trigger_repetition
-            / 1000
-        )
+    @staticmethod
+    def read_mea_header(path, block_size=4096):
+        """
+        Reads only the text header of a mea file without the intensity values.
+        Much faster than ims.Spectrum.read_mea to catalogue
+        or plan the processing of many files.
+
+        Parameters
+        ----------
+        path : str
+            Absolute or relative file path.
+
+        block_size : int, optional
+            Number of bytes read at once until the end of the header is found,
+            by default 4096.
 
-        drift_time = np.arange(chunk_sample_count) / chunk_sample_rate
+        Returns
+        -------
+        dict
+            Name, timestamp, chunks count, chunk averages, chunk sample count,
+            chunk sample rate, chunk trigger repetition, the byte offset
+            of the intensity values and the file size.
 
-        return cls(name, data, ret_time, drift_time, timestamp)
+        Example
+        -------
+        >>> import ims
+        >>> header = ims.Spectrum.read_mea_header("sample.mea")
+        >>> print(header["chunks_count"], header["chunk_sample_count"])
+        4082 3150
+        """
+        path = os.path.normpath(path)
+        name = os.path.split(path)[1]
+        name = name.split(".")[0]
+
+        with open(path, "rb") as f:
+            content = Spectrum._read_mea_header_bytes(f, block_size)
+
+        i = len(content)
+        header = {"name": name}
+        header.update(Spectrum._parse_mea_header(content[: i - 1]))
+        header["data_offset"] = i + 1
+        header["file_size"] = os.path.getsize(path)
+        return header
 
     @classmethod
+    @profiled
     def read_csv(cls, path):
         """
         Reads generic csv files. The first row must be
@@ -268,17 +531,27 @@ class Spectrum:
         """
         name = os.path.split(path)[1]
         name = name.split(".")[0]
-        df = pd.read_csv(path)
-        values = df.values
-        ret_time = df.index
-        drift_time = df.columns
+
+        with open(path, "rb") as f:
+            header = f.readline().decode().strip().split(",")
+            n_fields = len(f.readline().decode().strip().split(","))
+            f.seek(0)
+            n_rows = sum(block.count(b"\n") for block in iter(lambda: f.read(2**20), b""))
+            f.seek(0)
+            ret_time, values = Spectrum._read_csv_values(
+                f, n_rows, n_fields, skiprows=1, index_col=True
+            )
+
+        # the first header field is empty or a label if the file has one
+        drift_time = np.array(header[len(header) - n_fields + 1 :], dtype=float)
         timestamp = os.path.getctime(path)
         timestamp = ctime(timestamp)
         timestamp = datetime.strptime(timestamp, "%a %b  %d %H:%M:%S %Y")
         return cls(name, values, ret_time, drift_time, timestamp)
 
     @classmethod
-    def read_hdf5(cls, path):
+    @profiled
+    def read_hdf5(cls, path, rt_range=None, dt_range=None):
         """
         Reads hdf5 files exported by the to_hdf5 method.
         Convenient way to store preprocessed spectra.
@@ -286,11 +559,24 @@ class Spectrum:
         requires more time.
         Preferred to csv because of very fast read and write speeds.
 
+        Optionally reads only a retention and drift time window
+        with a hyperslab selection.
+
         Parameters
         ----------
         path : str
             Absolute or relative file path.
 
+        rt_range : tuple, optional
+            Start and stop value on the retention time coordinate.
+            A stop of None reads to the end. If None reads all rows,
+            by default None.
+
+        dt_range : tuple, optional
+            Start and stop value on the stored drift time coordinate.
+            A stop of None reads to the end. If None reads all columns,
+            by default None.
+
         Returns
         -------
         Spectrum
@@ -303,22 +589,95 @@ class Spectrum:
         >>> sample = ims.Spectrum.read_hdf5("sample.hdf5")
         """
         with h5py.File(path, "r") as f:
-            values = np.array(f["values"])
-            ret_time = np.array(f["ret_time"])
-            drift_time = np.array(f["drift_time"])
-            name = str(f.attrs["name"])
-            time = datetime.strptime(f.attrs["time"], "%Y-%m-%dT%H:%M:%S")
-            drift_time_label = str(f.attrs["drift_time_label"])
+            spectrum = cls._from_hdf5_group(f, rt_range, dt_range)
+        return spectrum
+
+    @classmethod
+    def _from_hdf5_group(cls, grp, rt_range=None, dt_range=None, out=None):
+        """
+        Constructs a Spectrum from a hdf5 group written by _to_hdf5_group.
+        Sparse values are stored as subgroup with the csr components.
+        Only the rows and columns inside the windows are read.
+        Dense values are read directly into out if it is given.
+        """
+        ret_time = np.array(grp["ret_time"])
+        drift_time = np.array(grp["drift_time"])
+        rows = cls._window(ret_time, rt_range)
+        cols = cls._window(drift_time, dt_range)
+
+        if isinstance(grp["values"], h5py.Group):
+            n_rows, n_cols = grp["values"].attrs["shape"]
+            start, stop, _ = rows.indices(n_rows)
+            stop = max(start, stop)
+            indptr = np.array(grp["values"]["indptr"][start : stop + 1])
+            values = sparse.csr_matrix(
+                (
+                    np.array(grp["values"]["data"][indptr[0] : indptr[-1]]),
+                    np.array(grp["values"]["indices"][indptr[0] : indptr[-1]]),
+                    indptr - indptr[0],
+                ),
+                shape=(stop - start, n_cols),
+            )
+            if dt_range is not None:
+                values = values[:, cols]
+        elif out is not None:
+            grp["values"].read_direct(out, np.s_[rows, cols])
+            values = out
+        else:
+            values = grp["values"][rows, cols]
+        values = _cast(values)
+        ret_time = ret_time[rows]
+        drift_time = drift_time[cols]
+        name = str(grp.attrs["name"])
+        time = datetime.fromisoformat(grp.attrs["time"])
+        drift_time_label = str(grp.attrs["drift_time_label"])
 
         spectrum = cls(name, values, ret_time, drift_time, time)
         spectrum._drift_time_label = drift_time_label
         return spectrum
 
+    def _to_hdf5_group(self, grp, compression=None, chunk_rows=None, checksum=False):
+        """
+        Writes values, coordinates and attributes to a hdf5 group.
+        Optionally compresses the values with a h5py filter,
+        stores dense values in chunks of chunk_rows rows and adds
+        fletcher32 checksums that are verified on every read.
+        """
+        options = {}
+        if compression is not None:
+            options = {"compression": compression, "shuffle": True}
+        if checksum:
+            options["fletcher32"] = True
+
+        if self.is_sparse:
+            values = grp.create_group("values")
+            values.create_dataset("data", data=self.values.data, **options)
+            values.create_dataset("indices", data=self.values.indices, **options)
+            values.create_dataset(
+                "indptr", data=self.values.indptr, fletcher32=checksum
+            )
+            values.attrs["format"] = "csr"
+            values.attrs["shape"] = self.values.shape
+        else:
+            if chunk_rows is not None and self.values.size > 0:
+                options["chunks"] = (
+                    min(chunk_rows, self.values.shape[0]),
+                    self.values.shape[1],
+                )
+            grp.create_dataset("values", data=self.values, **options)
+        grp.create_dataset("ret_time", data=self.ret_time)
+        grp.create_dataset("drift_time", data=self.drift_time)
+        grp.attrs["name"] = self.name
+        grp.attrs["time"] = datetime.strftime(self.time, "%Y-%m-%dT%H:%M:%S")
+        grp.attrs["drift_time_label"] = self._drift_time_label
+
+    @profiled
     def to_hdf5(self, path=None):
         """
         Exports spectrum as hdf5 file.
         Useful to save preprocessed spectra, especially for larger datasets.
         Preferred to csv format because of very fast read and write speeds.
+        Sparse spectra are stored in compressed sparse row format.
 
         Parameters
         ----------
@@ -337,13 +696,9 @@ class Spectrum:
             path = os.getcwd()
 
         with h5py.File(f"{path}/{self.name}.hdf5", "w-") as f:
-            f.create_dataset("values", data=self.values)
-            f.create_dataset("ret_time", data=self.ret_time)
-            f.create_dataset("drift_time", data=self.drift_time)
-            f.attrs["name"] = self.name
-            f.attrs["time"] = datetime.strftime(self.time, "%Y-%m-%dT%H:%M:%S")
-            f.attrs["drift_time_label"] = self._drift_time_label
+            self._to_hdf5_group(f)
 
+    @profiled
     def find_peaks(self, limit=None, denoise="fastnl", window=30, verbose=0):
         """
         Automated GC-IMS peak detection based on persistent homology.
@@ -387,6 +742,8 @@ class Spectrum:
         ----------
         Taskesen, E. (2020). findpeaks is for the detection of peaks and valleys in a 1D vector and 2D array (image). (Version 2.3.1) [Computer software]. https://erdogant.github.io/findpeaks
         """
+        from findpeaks import findpeaks
+
         if limit is None:
             fp = findpeaks(
                 method="topology",
@@ -396,7 +753,7 @@ class Spectrum:
                 window=window,
                 verbose=verbose,
             )
-            fp.fit(self.values)
+            fp.fit(self._dense_values())
             limit = fp.results["persistence"]["score"].min()
 
         # actual peak detection
@@ -408,7 +765,7 @@ class Spectrum:
             window=window,
             verbose=verbose,
         )
-        fp.fit(self.values)
+        fp.fit(self._dense_values())
 
         # reindex to ensure consistent numbering and start at 1
         df = fp.results["persistence"].reset_index(drop=True)
@@ -457,6 +814,8 @@ class Spectrum:
         -------
         matplotlib.pyplot.axes
         """
+        import matplotlib.pyplot as plt
+
         if self.peak_table is None:
             raise ValueError("Call 'find_peaks' method first.")
         
@@ -485,7 +844,8 @@ class Spectrum:
 
         return ax
 
-    def watershed_segmentation(self, threshold):
+    @profiled
+    def watershed_segmentation(self, threshold, sparse_labels=False):
         """
         Finds boundaries for overlapping peaks using watershed segmentation.
         Requires peak_table for starting coordinates.
@@ -495,16 +855,28 @@ class Spectrum:
         threshold : int
             Threshold is used to binarize the intensity values to calculate the distances.
 
+        sparse_labels : bool, optional
+            Returns the labels as scipy.sparse.csr_matrix
+            because most of the label map is background,
+            by default False.
+
         Returns
         -------
-        numpy.ndarray
+        numpy.ndarray or scipy.sparse.csr_matrix
             Labels array with same shape as intensity values.
         """
+        from scipy import ndimage as ndi
+        from skimage.segmentation import watershed
+
         if self.peak_table is None:
             raise ValueError("Call 'find_peaks' method first.")
-        
+
         # Binarize intensity values
-        image = np.copy(self.values) >= threshold
+        if self.is_sparse and threshold > 0:
+            # implicit zeros are always below a positive threshold
+            image = (self.values >= threshold).toarray()
+        else:
+            image = self._dense_values() >= threshold
 
         # Generate the markers as local maxima of the distance to the background
         distance = ndi.distance_transform_edt(image)
@@ -517,8 +889,11 @@ class Spectrum:
         mask[tuple(coords.T)] = True
         markers, _ = ndi.label(mask)
         labels = watershed(-distance, markers, mask=image)
+        if sparse_labels:
+            labels = sparse.csr_matrix(labels)
         return labels
 
+    @profiled
     def asymcorr(self, lam=1e7, p=1e-3, niter=20):
         """
         Retention time baseline correction using asymmetric least squares.
@@ -540,16 +915,20 @@ class Spectrum:
         -------
         Spectrum
         """
+        self.values = self.values.astype(get_dtype())
         for i in range(self.values.shape[1]):
             y = self.values[:, i]
             self.values[:, i] = asymcorr(y, lam=lam, p=p, niter=niter)
 
         return self
 
-    def savgol(self, window_length=10, polyorder=2, direction="both"):
+    @profiled
+    def savgol(self, window_length=10, polyorder=2, direction="both", deriv=0):
         """
         Applys a Savitzky-Golay filter to intensity values.
         Can be applied in the drift time, retention time or both directions.
+        The filter kernels are cached and applied as separable
+        convolutions, see ims.utils.savgol.
 
         Parameters
         ----------
@@ -564,43 +943,135 @@ class Spectrum:
             Can be 'drift time', 'retention time' or 'both'.
             By default 'both'
 
+        deriv : int, optional
+            Order of the derivative per data point, for example 2
+            to enhance peaks for peak detection. Only with direction
+            'drift_time' or 'ret_time', by default 0
+
         Returns
         -------
         Spectrum
+
+        Raises
+        ------
+        ValueError
+            If direction is not valid or deriv is used with 'both'.
+
+        Example
+        -------
+        >>> import ims
+        >>> sample = ims.Spectrum.read_mea("sample.mea")
+        >>> sample.savgol(window_length=9, polyorder=2, direction="drift_time", deriv=2)
         """
-        if direction == "drift_time":
-            axis = 1
-        elif direction == "ret_time":
-            axis = 0
-        elif direction == "both":
-            self.values = savgol_filter(self.values, window_length, polyorder, axis=0)
-            axis = 1
-        else:
+        self.values = _cast(
+            savgol(
+                _cast(self._dense_values()),
+                window_length,
+                polyorder,
+                deriv,
+                self._savgol_axes(direction, deriv),
+            )
+        )
+        return self
+
+    @staticmethod
+    def _savgol_axes(direction, deriv=0):
+        """Axes of the intensity matrix that savgol filters in direction."""
+        axes = {"drift_time": (1,), "ret_time": (0,), "both": (0, 1)}
+        if direction not in axes:
             raise ValueError(
                 "Only 'drift_time', 'ret_time' or 'both' are valid options!"
             )
+        if deriv and direction == "both":
+            raise ValueError("Derivatives require direction 'drift_time' or 'ret_time'!")
+        return axes[direction]
 
-        self.values = savgol_filter(self.values, window_length, polyorder, axis=axis)
-        return self
-
-    def tophat(self, size=15):
+    @profiled
+    def tophat(self, size=15, method="disk", factor=4):
         """
         Applies white tophat filter on data matrix as a baseline correction.
-        Size parameter is the diameter of the circular structuring element.
-        (Slow with large size values.)
+        Size parameter is the radius of the circular structuring element.
+
+        The exact disk is slow with large size values.
+        Faster approximations are available with the method parameter:
+
+        * "disk": exact circular structuring element.
+        * "decomposed": disk decomposed into a sequence of small
+          structuring elements. The shape is approximated, results
+          deviate from the exact disk by up to about 10 % of the
+          maximum with small sizes and a few percent with larger ones.
+        * "rectangle": square structuring element with side length
+          2 * size + 1, applied as separable one dimensional filters.
+        * "downsample": computes the opening with a disk on the
+          minimum of factor x factor blocks and upsamples the baseline.
+          Taking the block minimum keeps narrow peaks out of the baseline.
+
+        The baseline never exceeds the original values,
+        so the results are not negative.
 
         Parameters
         ----------
         size : int, optional
-            Size of structuring element, by default 15
+            Size of structuring element, by default 15.
+
+        method : str, optional
+            "disk", "decomposed", "rectangle" or "downsample",
+            by default "disk".
+
+        factor : int, optional
+            Downsampling factor in both dimensions,
+            only used with method "downsample", by default 4.
 
         Returns
         -------
         Spectrum
+
+        Raises
+        ------
+        ValueError
+            If method is not supported.
+
+        Example
+        -------
+        >>> import ims
+        >>> sample = ims.Spectrum.read_mea("sample.mea")
+        >>> sample.tophat(size=30, method="decomposed")
         """
-        self.values = white_tophat(self.values, disk(size))
+        from scipy import ndimage as ndi
+        from skimage.morphology import white_tophat, opening, disk
+
+        if method == "disk":
+            values = white_tophat(self.values, disk(size))
+        elif method == "decomposed":
+            # the opening with the approximated disk can exceed the values
+            baseline = opening(self.values, disk(size, decomposition="sequence"))
+            values = self.values - np.minimum(baseline, self.values)
+        elif method == "rectangle":
+            values = ndi.white_tophat(self.values, size=(2 * size + 1, 2 * size + 1))
+        elif method == "downsample":
+            a, b = self.values.shape
+            padded = np.pad(
+                self.values, ((0, -a % factor), (0, -b % factor)), mode="edge"
+            )
+            small = padded.reshape(
+                padded.shape[0] // factor, factor, padded.shape[1] // factor, factor
+            ).min(axis=(1, 3))
+            baseline = ndi.grey_opening(
+                small, footprint=disk(max(size // factor, 1))
+            )
+            baseline = np.repeat(np.repeat(baseline, factor, axis=0), factor, axis=1)
+            # the baseline must not exceed the original values
+            baseline = np.minimum(baseline[:a, :b], self.values)
+            values = self.values - baseline
+        else:
+            raise ValueError(
+                "Only 'disk', 'decomposed', 'rectangle' or 'downsample' are valid methods!"
+            )
+
+        self.values = _cast(values)
         return self
 
+    @profiled
     def sub_first_rows(self, n=1):
         """
         Subtracts first n rows from every row in spectrum.
@@ -612,9 +1083,10 @@ class Spectrum:
         Spectrum
         """
         fl = self.values[0 : n - 1, :].mean(axis=0)
-        self.values = self.values - fl
+        self.values = _cast(self.values - fl)
         return self
 
+    @profiled
     def riprel(self):
         """
         Replaces drift time coordinate with RIP relative values.
@@ -636,6 +1108,7 @@ class Spectrum:
         self._drift_time_label = "Drift time RIP relative"
         return self
 
+    @profiled
     def rip_scaling(self):
         """
         Scales values relative to global maximum.
@@ -648,9 +1121,10 @@ class Spectrum:
             With scaled values.
         """
         m = np.max(self.values)
-        self.values = self.values / m
+        self.values = _cast(self.values / m)
         return self
 
+    @profiled
     def resample(self, n=2):
         """
         Resamples spectrum by calculating means of every n rows.
@@ -684,10 +1158,11 @@ class Spectrum:
             self.values = self.values[: a - rest, :]
             self.ret_time = self.ret_time[: a - rest]
 
-        self.values = (self.values[0::n, :] + self.values[1::n, :]) / n
+        self.values = _cast((self.values[0::n, :] + self.values[1::n, :]) / n)
         self.ret_time = self.ret_time[::n]
         return self
 
+    @profiled
     def binning(self, n=2):
         """
         Downsamples spectrum by binning the array with factor n.
@@ -733,15 +1208,18 @@ class Spectrum:
 
         shape = (new_dims[0], a // new_dims[0], new_dims[1], b // new_dims[1])
 
-        self.values = self.values.reshape(shape).mean(axis=(-1, 1))
+        self.values = _cast(self.values.reshape(shape).mean(axis=(-1, 1)))
         self.ret_time = self.ret_time[::n]
         self.drift_time = self.drift_time[::n]
         return self
     
-    def wavecompr(self, direction="ret_time", wavelet="db3", level=3):
+    @profiled
+    def wavecompr(self, direction="ret_time", wavelet="db3", level=3, details=False):
         """
         Data reduction by wavelet compression.
         Can be applied to drift time, retention time or both axis.
+        Only the approximation coefficients are computed, see
+        ims.utils.wavelet_approximation, unless details is True.
 
         Parameters
         ----------
@@ -758,6 +1236,14 @@ class Spectrum:
             Decomposition level (must be >= 0),
             by default 3.
 
+        details : bool, optional
+            Computes the full decomposition with pywt and keeps the
+            detail coefficients in the wavelet_details attribute,
+            ordered from the coarsest to the finest level like
+            pywt.wavedec and pywt.wavedec2 return them.
+            Together with the values they reconstruct the spectrum
+            with pywt.waverec or pywt.waverec2, by default False.
+
         Returns
         -------
         Spectrum
@@ -766,53 +1252,89 @@ class Spectrum:
         ------
         ValueError
             When direction is neither 'ret_time', 'drift_time' or 'both'.
+
+        Example
+        -------
+        >>> import ims
+        >>> import pywt
+        >>> sample = ims.Spectrum.read_mea("sample.mea")
+        >>> sample.wavecompr("both", details=True)
+        >>> original = pywt.waverec2(
+        ...     [sample.values, *sample.wavelet_details], "db3"
+        ... )
         """
-        coef_ret_time = pywt.wavedec(
-                self.ret_time,
-                wavelet=wavelet,
-                level=level,
-            )
-        coef_drift_time = pywt.wavedec(
-                self.drift_time,
-                wavelet=wavelet,
-                level=level,
-            )
-        
-        if direction == "ret_time":
-            coef_values = pywt.wavedec(
-                self.values,
-                wavelet=wavelet,
-                level=level,
-                axis=0
-                )
-            self.values = coef_values[0]
-            self.ret_time = coef_ret_time[0]
-
-        elif direction == "drift_time":
-            coef_values = pywt.wavedec(
-                self.values,
-                wavelet=wavelet,
-                level=level,
-                axis=1
+        axes = {"ret_time": (0,), "drift_time": (1,), "both": (0, 1)}
+        if direction not in axes:
+            raise ValueError("Direction must be 'ret_time', 'drift_time or 'both'!")
+        axes = axes[direction]
+
+        if details:
+            import pywt
+
+            if direction == "both":
+                coef_values = pywt.wavedec2(self.values, wavelet=wavelet, level=level)
+            else:
+                coef_values = pywt.wavedec(
+                    self.values, wavelet=wavelet, level=level, axis=axes[0]
                 )
             self.values = coef_values[0]
-            self.drift_time = coef_drift_time[0]
+            self.wavelet_details = coef_values[1:]
+        else:
+            self.values = wavelet_approximation(self.values, wavelet, level, axes)
 
-        elif direction == "both":
-            coef_values = pywt.wavedec2(
-                self.values,
-                wavelet=wavelet,
-                level=level,
-            )
-            self.values = coef_values[0]
-            self.ret_time = coef_ret_time[0]
-            self.drift_time = coef_drift_time[0]
+        if 0 in axes:
+            self.ret_time = wavelet_approximation(self.ret_time, wavelet, level)
+        if 1 in axes:
+            self.drift_time = wavelet_approximation(self.drift_time, wavelet, level)
 
-        else:
-            raise ValueError("Direction must be 'ret_time', 'drift_time or 'both'!")
+        self.values = _cast(self.values)
+        return self
+
+    @profiled
+    def wavelet_denoise(self, wavelet="db3", level=3, threshold="bayes"):
+        """
+        Removes noise by soft thresholding the detail coefficients of a
+        two dimensional multilevel wavelet decomposition and
+        reconstructing the intensity values.
+        See ims.utils.wavelet_denoise for the thresholds.
+
+        Much faster than the denoising in find_peaks, which runs
+        on every call. Denoise once and use find_peaks with denoise=None.
 
+        Parameters
+        ----------
+        wavelet : str, optional
+            Wavelet object or name string,
+            by default "db3".
+
+        level : int, optional
+            Decomposition level, by default 3.
+
+        threshold : str, optional
+            "bayes" or "universal", by default "bayes".
+
+        Returns
+        -------
+        Spectrum
+
+        Raises
+        ------
+        ValueError
+            If threshold is not 'bayes' or 'universal'.
+
+        Example
+        -------
+        >>> import ims
+        >>> sample = ims.Spectrum.read_mea("sample.mea")
+        >>> sample.wavelet_denoise(threshold="bayes")
+        >>> sample.find_peaks(denoise=None)
+        """
+        self.values = _cast(
+            wavelet_denoise(self._dense_values(), wavelet, level, threshold)
+        )
         return self
 
+    @profiled
     def cut_dt(self, start, stop=None):
         """
         Cuts data along drift time coordinate.
@@ -850,12 +1372,13 @@ class Spectrum:
         if stop is None:
             stop = len(self.drift_time)
 
-        idx_start = np.abs(self.drift_time - start).argmin()
-        idx_stop = np.abs(self.drift_time - stop).argmin()
+        idx_start = nearest_index(self.drift_time, start)
+        idx_stop = nearest_index(self.drift_time, stop)
         self.drift_time = self.drift_time[idx_start:idx_stop]
         self.values = self.values[:, idx_start:idx_stop]
         return self
 
+    @profiled
     def cut_rt(self, start, stop=None):
         """
         Cuts data along retention time coordinate.
@@ -890,8 +1413,8 @@ class Spectrum:
         if stop is None:
             stop = len(self.ret_time)
 
-        idx_start = np.abs(self.ret_time - start).argmin()
-        idx_stop = np.abs(self.ret_time - stop).argmin()
+        idx_start = nearest_index(self.ret_time, start)
+        idx_stop = nearest_index(self.ret_time, stop)
         self.ret_time = self.ret_time[idx_start:idx_stop]
         self.values = self.values[idx_start:idx_stop, :]
         return self
@@ -928,10 +1451,13 @@ class Spectrum:
         >>> sample = ims.Spectrum.read_mea("sample.mea")
         >>> fig, ax = sample.plot()
         """
+        import matplotlib.pyplot as plt
+        from matplotlib.ticker import AutoMinorLocator
+
         fig, ax = plt.subplots(figsize=(width, height))
 
         plt.imshow(
-            self.values,
+            self._dense_values(),
             origin="lower",
             aspect="auto",
             cmap="RdBu_r",
@@ -2,6 +2,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.cluster import AgglomerativeClustering
 from scipy.cluster.hierarchy import dendrogram
+from ims.profiling import profiled
 
 
 class HCA:
@@ -62,6 +63,7 @@ class HCA:
             distance_threshold=0, n_clusters=None, affinity=affinity, linkage=linkage
         )
 
+    @profiled
     def fit(self, X):
         """
         Fit the model from features.
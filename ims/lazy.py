@@ -0,0 +1,655 @@
+import os
+import h5py
+import numpy as np
+import dask.array as da
+from dask import delayed
+from datetime import datetime
+from ims.gcims import Spectrum
+from ims.dataset import Dataset
+from ims.utils import get_dtype, nearest_index, _as_list
+
+
+class LazyDataset:
+    """
+    Dataset backed by a chunked dask array for studies that do not fit
+    into memory. Methods build a lazy task graph with one chunk per spectrum
+    and nothing is read or computed until compute, get_xy(...).compute()
+    or to_zarr are called.
+
+    The graph runs on any dask scheduler: threads (default), processes
+    or a distributed cluster if a dask.distributed.Client is active,
+    so the same pipeline scales from a laptop to a cluster.
+    Requires the optional dask package.
+
+    All spectra must have the same shape. Retention and drift time
+    windows are located on the coordinates of the first spectrum.
+
+    Parameters
+    ----------
+    values : dask.array.Array of shape (n_spectra, n_ret_time, n_drift_time)
+        Intensity values with one chunk per spectrum.
+
+    ret_time : numpy.ndarray of shape (n_spectra, n_ret_time)
+        Retention time coordinates.
+
+    drift_time : numpy.ndarray of shape (n_spectra, n_drift_time)
+        Drift time coordinates.
+
+    name : str, optional
+        Name of the dataset, by default None.
+
+    files : list, optional
+        File names, by default None.
+
+    samples : list, optional
+        Sample names, by default None.
+
+    labels : list, optional
+        Labels, by default None.
+
+    names : list, optional
+        Spectrum names, by default None.
+
+    times : list, optional
+        Timestamps of the spectra, by default None.
+
+    Attributes
+    ----------
+    preprocessing : list
+        Preprocessing steps added to the task graph.
+
+    drift_time_label : str
+        Axis label of the drift time coordinate.
+
+    weights : dask.array.Array
+        Scaling weights after the scaling method was applied.
+
+    Example
+    -------
+    >>> import ims
+    >>> from ims.lazy import LazyDataset
+    >>> ds = LazyDataset.read_zarr("IMS_data.zarr")
+    >>> ds.cut_dt(1.05, 2).binning(2).savgol().scaling("pareto")
+    >>> X, y = ds.get_xy()
+    >>> X = X.compute(scheduler="processes")
+    """
+
+    def __init__(
+        self,
+        values,
+        ret_time,
+        drift_time,
+        name=None,
+        files=None,
+        samples=None,
+        labels=None,
+        names=None,
+        times=None,
+    ):
+        self.values = values
+        self.ret_time = ret_time
+        self.drift_time = drift_time
+        self.name = name
+        self.files = files
+        self.samples = samples
+        self.labels = labels
+        self.names = names
+        self.times = times
+        self.preprocessing = []
+        self.drift_time_label = "Drift time [ms]"
+
+    def __repr__(self):
+        return f"Lazy Dataset: {self.name}, {len(self)} Spectra"
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    @property
+    def shape(self):
+        """Shape of the intensity array (n_spectra, n_ret_time, n_drift_time)."""
+        return self.values.shape
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        """
+        Wraps the spectra of an ims.Dataset in a dask array.
+
+        Parameters
+        ----------
+        dataset : ims.Dataset
+            Spectra with equal shapes.
+
+        Returns
+        -------
+        LazyDataset
+
+        Raises
+        ------
+        ValueError
+            If the spectra do not all have the same shape.
+        """
+        if len(set(spectrum.shape for spectrum in dataset)) > 1:
+            raise ValueError("All spectra must have the same shape!")
+
+        values = da.stack(
+            [
+                da.from_array(spectrum._dense_values(), chunks=spectrum.shape)
+                for spectrum in dataset
+            ]
+        )
+        lazy = cls(
+            values,
+            np.stack([spectrum.ret_time for spectrum in dataset]),
+            np.stack([spectrum.drift_time for spectrum in dataset]),
+            dataset.name,
+            dataset.files,
+            dataset.samples,
+            dataset.labels,
+            [spectrum.name for spectrum in dataset],
+            [spectrum.time for spectrum in dataset],
+        )
+        lazy.preprocessing = list(dataset.preprocessing)
+        if len(dataset) > 0:
+            lazy.drift_time_label = dataset[0]._drift_time_label
+        return lazy
+
+    @classmethod
+    def read_mea(cls, path, subfolders=False, rt_range=None, dt_range=None):
+        """
+        Lazily reads all mea files in the directory.
+        Only the headers are read immediately, the intensity values
+        are read by the tasks that need them.
+
+        Parameters
+        ----------
+        path : str
+            Directory. See ims.Dataset.read_mea for the folder structure.
+
+        subfolders : bool, optional
+            Uses subdirectory names as labels, by default False.
+
+        rt_range : tuple, optional
+            Start and stop value on the retention time coordinate.
+            Only this window is read, by default None.
+
+        dt_range : tuple, optional
+            Start and stop value on the drift time coordinate in ms,
+            by default None.
+
+        Returns
+        -------
+        LazyDataset
+
+        Raises
+        ------
+        ValueError
+            If the files do not all have the same shape.
+        """
+        paths, name, files, samples, labels = Dataset._measurements(path, subfolders)
+        headers = [Spectrum.read_mea_header(i) for i in paths]
+        if len(set((i["chunks_count"], i["chunk_sample_count"]) for i in headers)) > 1:
+            raise ValueError("All spectra must have the same shape!")
+
+        axes = [Spectrum._mea_axes(header) for header in headers]
+        ret_time = np.stack([i[0] for i in axes])
+        drift_time = np.stack([i[1] for i in axes])
+        rows, cols, ret_time, drift_time = _windows(ret_time, drift_time, rt_range, dt_range)
+
+        dtype = get_dtype()
+        shape = (ret_time.shape[1], drift_time.shape[1])
+        values = _stack(
+            [delayed(_read_mea)(i, rows, cols, dtype) for i in paths], shape, dtype
+        )
+        return cls(
+            values,
+            ret_time,
+            drift_time,
+            name,
+            files,
+            samples,
+            labels,
+            [header["name"] for header in headers],
+            [header["timestamp"] for header in headers],
+        )
+
+    @classmethod
+    def read_hdf5(cls, path, rt_range=None, dt_range=None):
+        """
+        Lazily reads hdf5 files exported by ims.Dataset.to_hdf5 or
+        created with ims.store. Every task opens the file itself,
+        so the graph also runs on processes and distributed workers.
+
+        Parameters
+        ----------
+        path : str
+            hdf5 file.
+
+        rt_range : tuple, optional
+            Start and stop value on the retention time coordinate,
+            by default None.
+
+        dt_range : tuple, optional
+            Start and stop value on the stored drift time coordinate,
+            by default None.
+
+        Returns
+        -------
+        LazyDataset
+
+        Raises
+        ------
+        ValueError
+            If the spectra do not all have the same shape.
+        """
+        with h5py.File(path, "r") as f:
+            grp = f["dataset"]
+            labels = [i.decode() for i in grp["labels"]]
+            samples = [i.decode() for i in grp["samples"]]
+            files = [i.decode() for i in grp["files"]]
+            preprocessing = [i.decode() for i in grp["preprocessing"]]
+            keys = Dataset._hdf5_keys(f)
+
+            ret_time = [np.array(f[key]["ret_time"]) for key in keys]
+            drift_time = [np.array(f[key]["drift_time"]) for key in keys]
+            if len(set((len(i), len(j)) for i, j in zip(ret_time, drift_time))) > 1:
+                raise ValueError("All spectra must have the same shape!")
+            names = [str(f[key].attrs["name"]) for key in keys]
+            drift_time_label = (
+                str(f[keys[0]].attrs["drift_time_label"]) if keys else "Drift time [ms]"
+            )
+            times = [datetime.fromisoformat(f[key].attrs["time"]) for key in keys]
+
+        rows, cols, ret_time, drift_time = _windows(
+            np.stack(ret_time), np.stack(drift_time), rt_range, dt_range
+        )
+
+        dtype = get_dtype()
+        shape = (ret_time.shape[1], drift_time.shape[1])
+        values = _stack(
+            [delayed(_read_hdf5)(path, key, rows, cols, dtype) for key in keys],
+            shape,
+            dtype,
+        )
+        name = os.path.split(path)[1]
+        name = name.split(".")[0]
+
+        dataset = cls(
+            values, ret_time, drift_time, name, files, samples, labels, names, times
+        )
+        dataset.preprocessing = preprocessing
+        dataset.drift_time_label = drift_time_label
+        return dataset
+
+    @classmethod
+    def read_zarr(cls, path, rt_range=None, dt_range=None):
+        """
+        Lazily reads zarr stores exported by ims.Dataset.to_zarr
+        or LazyDataset.to_zarr.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the zarr store.
+
+        rt_range : tuple, optional
+            Start and stop value on the retention time coordinate,
+            by default None.
+
+        dt_range : tuple, optional
+            Start and stop value on the stored drift time coordinate,
+            by default None.
+
+        Returns
+        -------
+        LazyDataset
+        """
+        import zarr
+
+        root = zarr.open_group(path, mode="r")
+        attrs = root.attrs.asdict()
+        rows, cols, ret_time, drift_time = _windows(
+            root["ret_time"][:], root["drift_time"][:], rt_range, dt_range
+        )
+        values = da.from_zarr(root["values"])[:, rows, cols]
+        values = values.rechunk((1, -1, -1)).astype(get_dtype())
+
+        dataset = cls(
+            values,
+            ret_time,
+            drift_time,
+            attrs["name"],
+            attrs["files"],
+            attrs["samples"],
+            attrs["labels"],
+            attrs["names"],
+            np.array(attrs["times"], dtype="datetime64[s]").tolist(),
+        )
+        dataset.preprocessing = attrs["preprocessing"]
+        if attrs["drift_time_labels"]:
+            dataset.drift_time_label = attrs["drift_time_labels"][0]
+        return dataset
+
+    def _map_spectra(self, method, shape, **kwargs):
+        """
+        Adds an ims.Spectrum method to the graph that is applied
+        to every spectrum chunk and returns values of the given shape.
+        """
+        dtype = get_dtype()
+
+        def func(block):
+            spectrum = Spectrum(
+                None, block[0], np.arange(block.shape[1]), np.arange(block.shape[2]), None
+            )
+            getattr(spectrum, method)(**kwargs)
+            return spectrum.values.astype(dtype, copy=False)[None]
+
+        self.values = self.values.map_blocks(
+            func,
+            chunks=((1,) * len(self), (shape[0],), (shape[1],)),
+            dtype=dtype,
+        )
+
+    def binning(self, n=2):
+        """
+        Downsamples all spectra by binning with factor n.
+        See ims.Spectrum.binning.
+
+        Parameters
+        ----------
+        n : int, optional
+            Binning factor, by default 2.
+
+        Returns
+        -------
+        LazyDataset
+        """
+        _, a, b = self.shape
+        self._map_spectra("binning", (a // n, b // n), n=n)
+        self.ret_time = self.ret_time[:, : a - a % n : n]
+        self.drift_time = self.drift_time[:, : b - b % n : n]
+        self.preprocessing.append(f"binning({n})")
+        return self
+
+    def cut_dt(self, start, stop=None):
+        """
+        Cuts data along drift time coordinate.
+        See ims.Spectrum.cut_dt.
+
+        Parameters
+        ----------
+        start : int or float
+            Start value on drift time coordinate.
+
+        stop : int or float, optional
+            Stop value on drift time coordinate.
+            If None uses the end of the array,
+            by default None.
+
+        Returns
+        -------
+        LazyDataset
+        """
+        axis = self.drift_time[0]
+        idx_start = nearest_index(axis, start)
+        idx_stop = nearest_index(axis, len(axis) if stop is None else stop)
+        self.values = self.values[:, :, idx_start:idx_stop]
+        self.drift_time = self.drift_time[:, idx_start:idx_stop]
+        self.preprocessing.append(f"cut_dt({start}, {stop})")
+        return self
+
+    def cut_rt(self, start, stop=None):
+        """
+        Cuts data along retention time coordinate.
+        See ims.Spectrum.cut_rt.
+
+        Parameters
+        ----------
+        start : int or float
+            Start value on retention time coordinate.
+
+        stop : int or float, optional
+            Stop value on retention time coordinate.
+            If None uses the end of the array,
+            by default None.
+
+        Returns
+        -------
+        LazyDataset
+        """
+        axis = self.ret_time[0]
+        idx_start = nearest_index(axis, start)
+        idx_stop = nearest_index(axis, len(axis) if stop is None else stop)
+        self.values = self.values[:, idx_start:idx_stop, :]
+        self.ret_time = self.ret_time[:, idx_start:idx_stop]
+        self.preprocessing.append(f"cut_rt({start}, {stop})")
+        return self
+
+    def savgol(self, window_length=10, polyorder=2, direction="both", deriv=0):
+        """
+        Applies a Savitzky-Golay filter to all spectra.
+        See ims.Spectrum.savgol.
+
+        Parameters
+        ----------
+        window_length : int, optional
+            Length of the filter window, by default 10.
+
+        polyorder : int, optional
+            Order of the polynomial, by default 2.
+
+        direction : str, optional
+            "drift_time", "ret_time" or "both", by default "both".
+
+        deriv : int, optional
+            Order of the derivative, only with direction "drift_time"
+            or "ret_time", by default 0.
+
+        Returns
+        -------
+        LazyDataset
+        """
+        if direction not in ("drift_time", "ret_time", "both"):
+            raise ValueError(
+                "Only 'drift_time', 'ret_time' or 'both' are valid options!"
+            )
+        if deriv and direction == "both":
+            raise ValueError("Derivatives require direction 'drift_time' or 'ret_time'!")
+        self._map_spectra(
+            "savgol",
+            self.shape[1:],
+            window_length=window_length,
+            polyorder=polyorder,
+            direction=direction,
+            deriv=deriv,
+        )
+        if deriv:
+            self.preprocessing.append(f"savgol(deriv={deriv})")
+        else:
+            self.preprocessing.append("savgol")
+        return self
+
+    def rip_scaling(self):
+        """
+        Scales every spectrum to its maximum value.
+        See ims.Spectrum.rip_scaling.
+
+        Returns
+        -------
+        LazyDataset
+        """
+        self._map_spectra("rip_scaling", self.shape[1:])
+        self.preprocessing.append("rip_scaling")
+        return self
+
+    def scaling(self, method="pareto", mean_centering=True):
+        """
+        Scales and mean centers features with weights estimated
+        from all spectra in one pass over the data.
+        Equivalent to ims.Dataset.scaling.
+
+        Parameters
+        ----------
+        method : str, optional
+            "pareto", "auto" or "var" are valid,
+            by default "pareto".
+
+        mean_centering : bool, optional
+            If true center the data before scaling,
+            by default True.
+
+        Returns
+        -------
+        LazyDataset
+
+        Raises
+        ------
+        ValueError
+            If scaling method is not supported.
+        """
+        if method not in ("pareto", "auto", "var"):
+            raise ValueError(f"{method} is not a supported method!")
+
+        x = self.values.astype(float)
+        mean = x.mean(axis=0)
+        var = x.var(axis=0)
+        safe = da.where(var > 0, var, 1)
+        if method == "auto":
+            weights = 1 / da.sqrt(safe)
+        elif method == "pareto":
+            weights = 1 / da.sqrt(da.sqrt(safe))
+        else:
+            weights = 1 / safe
+        self.weights = da.where(var > 0, weights, 0)
+
+        if mean_centering:
+            x = x - mean
+        self.values = (x * self.weights).astype(get_dtype())
+        self.preprocessing.append(f"scaling({method})")
+        return self
+
+    def get_xy(self, flatten=True):
+        """
+        Returns features (X) and labels (y).
+        X is a lazy dask array with one chunk per spectrum
+        that can be computed or passed to dask-ml estimators.
+
+        Parameters
+        ----------
+        flatten : bool, optional
+            Flattens 3D datasets to 2D, by default True.
+
+        Returns
+        -------
+        tuple
+            (X, y)
+        """
+        X = self.values
+        if flatten:
+            X = X.reshape(len(self), -1)
+        return (X, np.array(self.labels))
+
+    def compute(self, **kwargs):
+        """
+        Executes the task graph and returns an ims.Dataset.
+        The result must fit into memory.
+
+        Parameters
+        ----------
+        **kwargs : optional
+            Passed to dask compute, for example scheduler="processes".
+
+        Returns
+        -------
+        ims.Dataset
+        """
+        values = self.values.compute(**kwargs)
+        data = []
+        for i, (name, time) in enumerate(zip(self.names, self.times)):
+            spectrum = Spectrum(name, values[i], self.ret_time[i], self.drift_time[i], time)
+            spectrum._drift_time_label = self.drift_time_label
+            data.append(spectrum)
+        dataset = Dataset(data, self.name, self.files, self.samples, self.labels)
+        dataset.preprocessing = list(self.preprocessing)
+        return dataset
+
+    def to_zarr(self, path, chunk_rows=256, cname="zstd", clevel=5, **kwargs):
+        """
+        Executes the task graph and writes the result as zarr store
+        in the layout of ims.Dataset.to_zarr without collecting it in memory.
+        Requires the optional zarr package.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the zarr store. Overwritten if it exists.
+
+        chunk_rows : int, optional
+            Number of retention time rows per chunk, by default 256.
+
+        cname : str, optional
+            Blosc compressor, by default "zstd".
+
+        clevel : int, optional
+            Compression level from 0 to 9, by default 5.
+
+        **kwargs : optional
+            Passed to dask compute, for example scheduler="processes".
+        """
+        import zarr
+        from zarr.codecs import BloscCodec
+
+        n, n_ret_time, n_drift_time = self.shape
+        chunks = (1, max(min(chunk_rows, n_ret_time), 1), max(n_drift_time, 1))
+
+        root = zarr.open_group(path, mode="w")
+        compressors = BloscCodec(cname=cname, clevel=clevel, shuffle="shuffle")
+        values = root.create_array(
+            "values",
+            shape=self.shape,
+            dtype=self.values.dtype,
+            chunks=chunks,
+            compressors=compressors,
+        )
+        root.create_array("ret_time", data=self.ret_time, compressors=compressors)
+        root.create_array("drift_time", data=self.drift_time, compressors=compressors)
+        root.attrs.update(
+            {
+                "name": self.name,
+                "files": _as_list(self.files),
+                "samples": _as_list(self.samples),
+                "labels": _as_list(self.labels),
+                "preprocessing": list(self.preprocessing),
+                "names": list(self.names),
+                "times": [
+                    datetime.strftime(time, "%Y-%m-%dT%H:%M:%S") for time in self.times
+                ],
+                "drift_time_labels": [self.drift_time_label] * n,
+            }
+        )
+
+        # dask chunks aligned to zarr chunks can be written concurrently
+        da.store(self.values.rechunk(chunks), values, lock=False, **kwargs)
+
+
+def _windows(ret_time, drift_time, rt_range, dt_range):
+    """Index windows located on the first spectrum and the cut coordinates."""
+    rows = Spectrum._window(ret_time[0], rt_range)
+    cols = Spectrum._window(drift_time[0], dt_range)
+    return rows, cols, ret_time[:, rows], drift_time[:, cols]
+
+
+def _stack(tasks, shape, dtype):
+    """Stacks delayed spectrum reads to one array with a chunk per spectrum."""
+    if not tasks:
+        return da.zeros((0,) + shape, dtype=dtype)
+    return da.stack([da.from_delayed(task, shape, dtype=dtype) for task in tasks])
+
+
+def _read_mea(path, rows, cols, dtype):
+    return Spectrum.read_mea(path, rows, cols).values.astype(dtype, copy=False)
+
+
+def _read_hdf5(path, key, rows, cols, dtype):
+    with h5py.File(path, "r") as f:
+        spectrum = Spectrum._from_hdf5_group(f[key], rows, cols)
+    return spectrum._dense_values().astype(dtype, copy=False)
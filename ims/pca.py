@@ -5,6 +5,7 @@ import seaborn as sns
 from matplotlib.ticker import MaxNLocator, AutoMinorLocator
 from sklearn.decomposition import PCA
 from scipy.stats import f
+from ims.profiling import profiled
 
 
 class PCA_Model:
@@ -73,6 +74,7 @@ class PCA_Model:
         self.svd_solver = svd_solver
         self._sk_pca = PCA(n_components, svd_solver=svd_solver, **kwargs)
 
+    @profiled
     def fit(self, X_train):
         """
         Fit the PCA model with training data.
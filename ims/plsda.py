@@ -7,6 +7,7 @@ import seaborn as sns
 from sklearn.cross_decomposition import PLSRegression
 from sklearn.preprocessing import LabelBinarizer
 from sklearn.metrics import accuracy_score
+from ims.profiling import profiled
 
 
 class PLS_DA:
@@ -78,6 +79,7 @@ class PLS_DA:
         self._fitted = False
         self._validated = False
 
+    @profiled
     def fit(self, X_train, y_train):
         """
         Fits the model with training data.
@@ -112,6 +114,7 @@ class PLS_DA:
         self._fitted = True
         return self
 
+    @profiled
     def predict(self, X_test):
         """
         Predicts class labels for test data. Converts back from binary
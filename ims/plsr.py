@@ -7,6 +7,7 @@ from matplotlib.colors import CenteredNorm
 from sklearn.cross_decomposition import PLSRegression
 from sklearn.metrics import mean_squared_error, r2_score
 from ims.utils import vip_scores
+from ims.profiling import profiled
 
 
 class PLSR:
@@ -77,6 +78,7 @@ class PLSR:
         self._fitted = False
         self._validated = False
 
+    @profiled
     def fit(self, X_train, y_train):
         """
         Fits the model with training data.
@@ -110,6 +112,7 @@ class PLSR:
         self._fitted = True
         return self
 
+    @profiled
     def predict(self, X_test, y_test=None):
         """
         Predicts responses for features of the test data.
@@ -0,0 +1,250 @@
+"""
+Opt-in profiling of I/O, preprocessing and model calls.
+
+When enabled, every instrumented call records wall time, CPU time,
+peak memory allocated during the call and the array shapes before
+and after. Records are collected in ims.profiling.records and, for
+ims.Dataset methods, also in the profile attribute of the dataset
+next to the preprocessing step they belong to.
+Only the outermost instrumented call is recorded, for example
+ims.Dataset.tophat but not the ims.Spectrum.tophat calls inside it.
+Nesting is tracked for the whole process, so calls in worker threads,
+for example of n_jobs, count as part of the running call.
+When disabled the instrumentation costs one flag check per call.
+
+Example
+-------
+>>> import ims
+>>> with ims.profiling.profile():
+>>>     ds = ims.Dataset.read_mea("IMS_data")
+>>>     ds.tophat().binning(2)
+>>> ims.profiling.to_dataframe()
+>>> ims.profiling.to_chrome_trace("trace.json")
+"""
+import os
+import json
+import time
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+
+
+records = []
+
+_enabled = False
+_memory = True
+_started_tracing = False
+_depth = 0
+_lock = threading.Lock()
+_t0 = time.perf_counter()
+
+
+def enable(memory=True):
+    """
+    Starts recording instrumented calls.
+
+    Parameters
+    ----------
+    memory : bool, optional
+        Tracks peak memory with tracemalloc. Slows down
+        allocation heavy code, by default True.
+    """
+    global _enabled, _memory, _started_tracing
+    _enabled = True
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+
+
+def disable():
+    """
+    Stops recording instrumented calls.
+    tracemalloc is only stopped if enable started it.
+    """
+    global _enabled, _started_tracing
+    _enabled = False
+    if _started_tracing and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _started_tracing = False
+
+
+def clear():
+    """Removes all collected records."""
+    records.clear()
+
+
+def is_enabled():
+    """True if instrumented calls are recorded."""
+    return _enabled
+
+
+@contextmanager
+def profile(memory=True):
+    """
+    Context manager that records instrumented calls inside the block.
+
+    Parameters
+    ----------
+    memory : bool, optional
+        Tracks peak memory with tracemalloc, by default True.
+    """
+    enable(memory)
+    try:
+        yield records
+    finally:
+        disable()
+
+
+def _shape(obj):
+    """Shape of arrays, spectra or datasets for the records."""
+    if hasattr(obj, "data") and isinstance(obj.data, list):
+        if len(obj.data) == 0:
+            return (0,)
+        return (len(obj.data),) + tuple(obj.data[0].values.shape)
+    if hasattr(obj, "values") and hasattr(obj.values, "shape"):
+        return tuple(obj.values.shape)
+    if hasattr(obj, "shape"):
+        return tuple(obj.shape)
+    if isinstance(obj, tuple):
+        return tuple(_shape(i) for i in obj)
+    return None
+
+
+def profiled(func):
+    """
+    Decorator for functions and methods that are recorded
+    while profiling is enabled.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _depth
+        if not _enabled:
+            return func(*args, **kwargs)
+
+        # peak memory is process wide, so is the nesting
+        with _lock:
+            nested = _depth > 0
+            _depth += 1
+        try:
+            if nested:
+                return func(*args, **kwargs)
+            return _record(func, args, kwargs)
+        finally:
+            with _lock:
+                _depth -= 1
+
+    return wrapper
+
+
+def _record(func, args, kwargs):
+    """Calls func and records time, memory and shapes of the call."""
+    obj = args[0] if args else None
+    steps_before = len(getattr(obj, "preprocessing", []) or [])
+    shape_in = _shape(obj) if not isinstance(obj, type) else None
+
+    if _memory and tracemalloc.is_tracing():
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        mem_before = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = func(*args, **kwargs)
+    wall_time = time.perf_counter() - start
+    cpu_time = time.process_time() - cpu_start
+
+    peak_memory = None
+    if _memory and tracemalloc.is_tracing():
+        peak_memory = tracemalloc.get_traced_memory()[1] - mem_before
+
+    # readers return new datasets, methods mostly return self
+    target = result if hasattr(result, "preprocessing") else obj
+    preprocessing = getattr(target, "preprocessing", None)
+
+    record = {
+        "name": func.__qualname__,
+        "step": None,
+        "start": start - _t0,
+        "wall_time": wall_time,
+        "cpu_time": cpu_time,
+        "peak_memory": peak_memory,
+        "shape_in": shape_in,
+        "shape_out": _shape(result),
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+    }
+
+    if isinstance(preprocessing, list):
+        if preprocessing and (target is not obj or len(preprocessing) > steps_before):
+            record["step"] = preprocessing[-1]
+        if hasattr(target, "profile"):
+            target.profile.append(record)
+
+    records.append(record)
+    return result
+
+
+def to_dataframe(records=None):
+    """
+    Table of the recorded calls.
+
+    Parameters
+    ----------
+    records : list, optional
+        Records to convert, for example the profile attribute
+        of an ims.Dataset. If None uses all collected records,
+        by default None.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per call.
+    """
+    import pandas as pd
+
+    if records is None:
+        records = globals()["records"]
+    return pd.DataFrame(records)
+
+
+def to_chrome_trace(path, records=None):
+    """
+    Exports the recorded calls in the Chrome trace event format.
+    Open the file in chrome://tracing or https://ui.perfetto.dev.
+
+    Parameters
+    ----------
+    path : str
+        Output json file.
+
+    records : list, optional
+        Records to export. If None uses all collected records,
+        by default None.
+    """
+    if records is None:
+        records = globals()["records"]
+
+    events = []
+    for record in records:
+        args = {
+            key: value
+            for key, value in record.items()
+            if key not in ("name", "start", "wall_time", "pid", "tid")
+        }
+        events.append(
+            {
+                "name": record["name"],
+                "ph": "X",
+                "ts": record["start"] * 1e6,
+                "dur": record["wall_time"] * 1e6,
+                "pid": record["pid"],
+                "tid": record["tid"],
+                "args": json.loads(json.dumps(args, default=str)),
+            }
+        )
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events}, f)
@@ -0,0 +1,203 @@
+import h5py
+import numpy as np
+from ims.gcims import Spectrum
+from ims.utils import get_dtype
+from ims.profiling import profiled
+
+
+class Scaler:
+    """
+    Scales and mean centers GC-IMS spectra with weights
+    estimated from training data.
+
+    Means and variances are accumulated spectrum by spectrum
+    with Welford's algorithm, so fitting and transforming never
+    hold more than one spectrum and the accumulators in memory.
+    The fitted scaler transforms test sets and single spectra
+    with the training weights and can be saved to hdf5 files.
+
+    Parameters
+    ----------
+    method : str, optional
+        "pareto", "auto" or "var" are valid,
+        by default "pareto".
+
+    mean_centering : bool, optional
+        If true center the data before scaling,
+        by default True.
+
+    Attributes
+    ----------
+    mean : numpy.ndarray of shape (n_features,)
+        Per feature mean estimated from training data.
+
+    weights : numpy.ndarray of shape (n_features,)
+        Per feature scaling weights estimated from training data.
+
+    n_samples_seen : int
+        Number of spectra used to fit the scaler.
+
+    Example
+    -------
+    >>> import ims
+    >>> ds = ims.Dataset.read_mea("IMS_data")
+    >>> train, test = ds[:40], ds[40:]
+    >>> scaler = ims.Scaler("auto").fit(train)
+    >>> scaler.transform(train)
+    >>> scaler.transform(test)
+    """
+
+    def __init__(self, method="pareto", mean_centering=True):
+        if method not in ("pareto", "auto", "var"):
+            raise ValueError(f"{method} is not a supported method!")
+        self.method = method
+        self.mean_centering = mean_centering
+        self.n_samples_seen = 0
+
+    def partial_fit(self, data):
+        """
+        Updates means and variances with more spectra.
+        Can be called repeatedly, for example with spectra read
+        one by one from disk.
+
+        Parameters
+        ----------
+        data : ims.Spectrum, ims.Dataset or iterable of ims.Spectrum
+            Training spectra.
+
+        Returns
+        -------
+        Scaler
+        """
+        spectra = [data] if isinstance(data, Spectrum) else data
+        for spectrum in spectra:
+            x = np.ravel(spectrum.values)
+            if self.n_samples_seen == 0:
+                self._shape = spectrum.values.shape
+                self.mean = np.zeros(x.shape)
+                self._m2 = np.zeros(x.shape)
+            elif spectrum.values.shape != self._shape:
+                raise ValueError(
+                    f"Expected shape {self._shape} but got {spectrum.values.shape}!"
+                )
+
+            self.n_samples_seen += 1
+            delta = x - self.mean
+            self.mean += delta / self.n_samples_seen
+            self._m2 += delta * (x - self.mean)
+
+        self._update_weights()
+        return self
+
+    @profiled
+    def fit(self, data):
+        """
+        Estimates means and weights from training spectra.
+
+        Parameters
+        ----------
+        data : ims.Dataset or iterable of ims.Spectrum
+            Training spectra.
+
+        Returns
+        -------
+        Scaler
+        """
+        self.n_samples_seen = 0
+        return self.partial_fit(data)
+
+    def _update_weights(self):
+        var = self._m2 / self.n_samples_seen
+        with np.errstate(divide="ignore"):
+            if self.method == "auto":
+                weights = 1 / np.sqrt(var)
+            elif self.method == "pareto":
+                weights = 1 / np.sqrt(np.sqrt(var))
+            else:
+                weights = 1 / var
+        self.weights = np.nan_to_num(weights, posinf=0, neginf=0)
+
+    @profiled
+    def transform(self, data):
+        """
+        Scales spectra inplace with the fitted weights.
+
+        Parameters
+        ----------
+        data : ims.Spectrum or ims.Dataset
+            Spectra to scale. Must have the same shape as the training data.
+
+        Returns
+        -------
+        ims.Spectrum or ims.Dataset
+            With scaled values.
+        """
+        spectra = [data] if isinstance(data, Spectrum) else data
+        dtype = get_dtype()
+        mean = self.mean.astype(dtype)
+        weights = self.weights.astype(dtype)
+        for spectrum in spectra:
+            shape = spectrum.values.shape
+            x = np.ravel(spectrum.values).astype(dtype)
+            if self.mean_centering:
+                x -= mean
+            x *= weights
+            spectrum.values = x.reshape(shape)
+        return data
+
+    def fit_transform(self, data):
+        """
+        Fits the scaler and scales the training spectra.
+
+        Parameters
+        ----------
+        data : ims.Dataset
+            Training spectra.
+
+        Returns
+        -------
+        ims.Dataset
+            With scaled values.
+        """
+        return self.fit(data).transform(data)
+
+    def save(self, path):
+        """
+        Saves the fitted scaler as hdf5 file.
+
+        Parameters
+        ----------
+        path : str
+            Absolute or relative file path.
+        """
+        with h5py.File(path, "w") as f:
+            f.create_dataset("mean", data=self.mean)
+            f.create_dataset("m2", data=self._m2)
+            f.attrs["shape"] = self._shape
+            f.attrs["method"] = self.method
+            f.attrs["mean_centering"] = self.mean_centering
+            f.attrs["n_samples_seen"] = self.n_samples_seen
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a scaler saved with the save method.
+
+        Parameters
+        ----------
+        path : str
+            Absolute or relative file path.
+
+        Returns
+        -------
+        Scaler
+            Fitted scaler.
+        """
+        with h5py.File(path, "r") as f:
+            scaler = cls(str(f.attrs["method"]), bool(f.attrs["mean_centering"]))
+            scaler.mean = np.array(f["mean"])
+            scaler._m2 = np.array(f["m2"])
+            scaler._shape = tuple(f.attrs["shape"])
+            scaler.n_samples_seen = int(f.attrs["n_samples_seen"])
+        scaler._update_weights()
+        return scaler
@@ -0,0 +1,240 @@
+import os
+import weakref
+import tempfile
+import numpy as np
+from ims.gcims import Spectrum
+from ims.dataset import Dataset
+from ims.utils import get_dtype, _as_list
+
+
+class SharedDataset:
+    """
+    Read-only dataset in a memory mapped file that worker processes share.
+
+    The intensity values of all spectra are stored as one array of shape
+    (n_spectra, n_ret_time, n_drift_time) next to the coordinates in a
+    temporary file, by default in /dev/shm if available so it stays in memory.
+    Pickling a SharedDataset only transfers the file name and the
+    metadata, workers map the same memory instead of receiving copies.
+    This makes it cheap to pass the data to joblib, multiprocessing
+    or concurrent.futures workers.
+
+    The process that creates the shared dataset owns the file and
+    removes it when close is called or the object is garbage collected.
+    Handles in workers stay valid until they are closed.
+
+    Parameters
+    ----------
+    dataset : ims.Dataset
+        Spectra with equal shapes.
+
+    folder : str, optional
+        Directory of the temporary file. If None uses /dev/shm
+        if it exists and the default temporary directory otherwise,
+        by default None.
+
+    Attributes
+    ----------
+    values : numpy.memmap of shape (n_spectra, n_ret_time, n_drift_time)
+        Intensity values of all spectra.
+
+    ret_time : numpy.memmap of shape (n_spectra, n_ret_time)
+        Retention time coordinates.
+
+    drift_time : numpy.memmap of shape (n_spectra, n_drift_time)
+        Drift time coordinates.
+
+    Example
+    -------
+    >>> import ims
+    >>> from joblib import Parallel, delayed
+    >>> ds = ims.Dataset.read_mea("IMS_data", subfolders=True)
+    >>> shared = ds.share()
+    >>> def total_intensity(shared, i):
+    ...     return shared[i].values.sum()
+    >>> Parallel(n_jobs=32)(
+    ...     delayed(total_intensity)(shared, i) for i in range(len(shared))
+    ... )
+    >>> shared.close()
+    """
+
+    def __init__(self, dataset, folder=None):
+        shapes = set(spectrum.shape for spectrum in dataset)
+        if len(shapes) > 1:
+            raise ValueError("All spectra must have the same shape!")
+        n_ret_time, n_drift_time = shapes.pop() if shapes else (0, 0)
+
+        self.filename = _temp_file(folder)
+
+        self.shape = (len(dataset), n_ret_time, n_drift_time)
+        self.dtype = np.dtype(get_dtype())
+        self.name = dataset.name
+        self.files = _as_list(dataset.files)
+        self.samples = _as_list(dataset.samples)
+        self.labels = _as_list(dataset.labels)
+        self.preprocessing = list(dataset.preprocessing)
+        self.names = [spectrum.name for spectrum in dataset]
+        self.times = [spectrum.time for spectrum in dataset]
+        self.drift_time_labels = [spectrum._drift_time_label for spectrum in dataset]
+
+        size = self._offsets()[-1]
+        with open(self.filename, "wb") as f:
+            f.truncate(size)
+        self._map("r+")
+        for i, spectrum in enumerate(dataset):
+            self.values[i] = spectrum._dense_values()
+            self.ret_time[i] = spectrum.ret_time
+            self.drift_time[i] = spectrum.drift_time
+        self._flush()
+        self._map("r")
+
+        # only the creating process removes the file
+        self._finalizer = weakref.finalize(self, _remove, self.filename)
+
+    def __repr__(self):
+        return f"Shared Dataset: {self.name}, {len(self)} Spectra"
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        """
+        Spectrum with read-only views of the shared values and coordinates.
+        Preprocessing methods that assign new values work as usual.
+        """
+        spectrum = Spectrum(
+            self.names[key],
+            self.values[key],
+            self.ret_time[key],
+            self.drift_time[key],
+            self.times[key],
+        )
+        spectrum._drift_time_label = self.drift_time_labels[key]
+        return spectrum
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("values", "ret_time", "drift_time", "_finalizer"):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._map("r")
+
+    def _offsets(self):
+        """Byte offsets of values, retention and drift time in the file."""
+        n, n_ret_time, n_drift_time = self.shape
+        values = n * n_ret_time * n_drift_time * self.dtype.itemsize
+        ret_time = values + n * n_ret_time * 8
+        drift_time = ret_time + n * n_drift_time * 8
+        return 0, values, ret_time, drift_time
+
+    def _map(self, mode):
+        """Maps the arrays of the file."""
+        n, n_ret_time, n_drift_time = self.shape
+        start, ret_time, drift_time, end = self._offsets()
+        if end == 0:
+            self.values = np.empty(self.shape, dtype=self.dtype)
+            self.ret_time = np.empty((n, n_ret_time))
+            self.drift_time = np.empty((n, n_drift_time))
+            return
+        self.values = np.memmap(
+            self.filename, self.dtype, mode, start, self.shape
+        )
+        self.ret_time = np.memmap(
+            self.filename, float, mode, ret_time, (n, n_ret_time)
+        )
+        self.drift_time = np.memmap(
+            self.filename, float, mode, drift_time, (n, n_drift_time)
+        )
+
+    def _flush(self):
+        for array in (self.values, self.ret_time, self.drift_time):
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def close(self):
+        """
+        Releases the memory map. In the creating process also removes
+        the file, handles in other processes must not be used afterwards.
+        """
+        self.values = self.ret_time = self.drift_time = None
+        finalizer = getattr(self, "_finalizer", None)
+        if finalizer is not None:
+            finalizer()
+
+    def get_xy(self, flatten=True):
+        """
+        Returns features (X) and labels (y) as numpy arrays.
+        X is a view of the shared values and is not copied.
+
+        Parameters
+        ----------
+        flatten : bool, optional
+            Flattens 3D datasets to 2D, by default True.
+
+        Returns
+        -------
+        tuple
+            (X, y)
+        """
+        X = self.values
+        if flatten:
+            X = X.reshape(self.shape[0], -1)
+        return X, np.array(self.labels)
+
+    def to_dataset(self, copy=True):
+        """
+        Constructs an ims.Dataset from the shared spectra.
+
+        Parameters
+        ----------
+        copy : bool, optional
+            Copies the values into memory of this process. If False the
+            spectra are read-only views of the shared file,
+            by default True.
+
+        Returns
+        -------
+        ims.Dataset
+        """
+        data = []
+        for spectrum in self:
+            if copy:
+                spectrum.values = np.array(spectrum.values)
+                spectrum.ret_time = np.array(spectrum.ret_time)
+                spectrum.drift_time = np.array(spectrum.drift_time)
+            data.append(spectrum)
+
+        dataset = Dataset(
+            data, self.name, list(self.files), list(self.samples), list(self.labels)
+        )
+        dataset.preprocessing = list(self.preprocessing)
+        return dataset
+
+
+def _temp_file(folder=None):
+    """
+    Creates an empty temporary file for memory maps,
+    in /dev/shm if available so it stays in memory.
+    """
+    if folder is None and os.path.isdir("/dev/shm"):
+        folder = "/dev/shm"
+    fd, filename = tempfile.mkstemp(prefix="ims_", suffix=".shared", dir=folder)
+    os.close(fd)
+    return filename
+
+
+def _remove(filename):
+    if os.path.exists(filename):
+        os.remove(filename)
@@ -0,0 +1,459 @@
+"""
+Chunked and compressed hdf5 stores for large datasets.
+
+Stores use the layout of ims.Dataset.to_hdf5 and can be read with
+ims.Dataset.read_hdf5: one group per spectrum and a "dataset" group with
+labels, samples, file names, preprocessing steps, the spectrum group
+names in order and, for converted files, the paths relative to the
+converted directory. All metadata datasets are resizable so spectra
+can be appended, relabeled or replaced without rewriting the file.
+Values carry fletcher32 checksums that are verified on every read.
+
+Example
+-------
+>>> import ims
+>>> ims.store.convert("IMS_data", "IMS_data.hdf5", subfolders=True, n_jobs=8)
+>>> new = ims.Dataset.read_mea("IMS_data_today", subfolders=True)
+>>> ims.store.append("IMS_data.hdf5", new)
+>>> ims.store.update("IMS_data.hdf5", "sample_a.mea", label="Group B")
+>>> ims.store.verify("IMS_data.hdf5")
+[]
+>>> ds = ims.Dataset.read_hdf5("IMS_data.hdf5")
+"""
+import os
+import hashlib
+import h5py
+import numpy as np
+from joblib import Parallel, delayed
+from ims.gcims import Spectrum
+from ims.dataset import Dataset
+from ims.utils import get_dtype, _as_list, _with_dtype
+
+
+READERS = {
+    "mea": Spectrum.read_mea,
+    "zip": Spectrum.read_zip,
+    "csv": Spectrum.read_csv,
+}
+
+METADATA = ("labels", "samples", "files", "preprocessing", "keys", "paths")
+
+
+def _create_metadata(f):
+    """Creates the dataset group with empty resizable string datasets."""
+    grp = f.create_group("dataset")
+    for key in METADATA:
+        grp.create_dataset(
+            key, shape=(0,), maxshape=(None,), dtype=h5py.string_dtype(), chunks=True
+        )
+    return grp
+
+
+def _open_metadata(f):
+    """
+    Returns the dataset group of a store and creates it if needed.
+    Converts fixed size datasets written by ims.Dataset.to_hdf5
+    into resizable ones, which only rewrites the small metadata.
+    Raises ValueError if the order of the spectra in older files
+    can not be determined, nothing is written in that case.
+    """
+    if "dataset" not in f:
+        return _create_metadata(f)
+
+    grp = f["dataset"]
+    keys = Dataset._hdf5_keys(f)
+
+    for key in METADATA:
+        if key == "keys":
+            values = keys
+        elif key in grp:
+            values = [i.decode() for i in grp[key]]
+        else:
+            values = []
+
+        if key in grp and grp[key].maxshape[0] is None:
+            continue
+        if key != "preprocessing" and len(values) != len(keys):
+            # datasets without labels or samples store empty lists
+            values = values + [""] * (len(keys) - len(values))
+        if key in grp:
+            del grp[key]
+        grp.create_dataset(
+            key, data=values, maxshape=(None,), dtype=h5py.string_dtype(), chunks=True
+        )
+    return grp
+
+
+def _index(grp, key):
+    """
+    Position of a spectrum in the store by index, relative path,
+    group name or file name. File names must be unique because
+    equally named files from different folders can be stored.
+    """
+    if isinstance(key, (int, np.integer)):
+        if not -len(grp["keys"]) <= key < len(grp["keys"]):
+            raise ValueError(f"Index {key} is out of range!")
+        return int(key) % len(grp["keys"])
+
+    for column in ("paths", "keys"):
+        values = [i.decode() for i in grp[column]]
+        if key in values:
+            return values.index(key)
+
+    files = [i.decode() for i in grp["files"]]
+    matches = [i for i, file in enumerate(files) if file == key]
+    if not matches:
+        raise ValueError(f"{key} is not in the store!")
+    if len(matches) > 1:
+        raise ValueError(
+            f"{key} is in the store {len(matches)} times, "
+            "use the relative path or the group name!"
+        )
+    return matches[0]
+
+
+def _group_name(f, name, path):
+    """
+    Name of a new spectrum group. Spectra with the same name from
+    different folders get a suffix derived from their relative path.
+    """
+    if name not in f:
+        return name
+    return f"{name}-{hashlib.sha1(path.encode()).hexdigest()[:8]}"
+
+
+def _append_metadata(grp, **columns):
+    """Appends equally long lists of strings to the metadata datasets."""
+    for key, values in columns.items():
+        n = grp[key].shape[0]
+        grp[key].resize((n + len(values),))
+        grp[key][n:] = values
+
+
+def convert(
+    source,
+    path,
+    subfolders=False,
+    file_format="mea",
+    n_jobs=8,
+    batch_size=32,
+    compression="gzip",
+    chunk_rows=32,
+):
+    """
+    Converts a folder of measurements into a hdf5 store
+    without holding the dataset in memory.
+    Files are read in parallel in batches and every spectrum is written
+    to the store as soon as its batch is read.
+
+    The conversion can be resumed: files already in the store are skipped
+    and spectra of an interrupted batch are written again. Files are
+    identified by their path relative to source, so equally named files
+    in different folders are converted separately.
+
+    Parameters
+    ----------
+    source : str
+        Directory with the measurements. See ims.Dataset.read_mea
+        for the expected folder structure if subfolders is True.
+
+    path : str
+        hdf5 store. Created if it does not exist.
+
+    subfolders : bool, optional
+        Uses subdirectory names as labels and sample names,
+        by default False.
+
+    file_format : str, optional
+        "mea", "zip" or "csv", by default "mea".
+
+    n_jobs : int, optional
+        Number of worker processes reading files, by default 8.
+
+    batch_size : int, optional
+        Number of files read before they are written.
+        Limits the memory use to about batch_size spectra,
+        by default 32.
+
+    compression : str, optional
+        h5py compression filter, for example "gzip" or "lzf".
+        None stores the values uncompressed, by default "gzip".
+
+    chunk_rows : int, optional
+        Number of retention time rows per chunk. Small chunks make reading
+        retention time windows faster, by default 32.
+
+    Returns
+    -------
+    int
+        Number of converted files.
+
+    Raises
+    ------
+    ValueError
+        If file_format is not supported.
+
+    Example
+    -------
+    >>> import ims
+    >>> ims.store.convert("IMS_data", "IMS_data.hdf5", subfolders=True)
+    >>> ds = ims.Dataset.read_hdf5("IMS_data.hdf5")
+    """
+    if file_format not in READERS:
+        raise ValueError(f"{file_format} is not a supported file format!")
+    reader = READERS[file_format]
+
+    paths, _, files, samples, labels = Dataset._measurements(source, subfolders)
+    if not subfolders:
+        samples = [""] * len(paths)
+        labels = [""] * len(paths)
+
+    with h5py.File(path, "a") as f:
+        grp = _open_metadata(f)
+
+        # groups that are not listed were written by an interrupted run
+        keys = set(i.decode() for i in grp["keys"])
+        for key in list(f.keys()):
+            if key != "dataset" and key not in keys:
+                del f[key]
+
+        done = set()
+        legacy = set()
+        for file, relpath in zip(grp["files"], grp["paths"]):
+            if relpath:
+                done.add(relpath.decode())
+            else:
+                # stores converted before paths were recorded
+                legacy.add(file.decode())
+
+        tasks = []
+        for filepath, file, sample, label in zip(paths, files, samples, labels):
+            relpath = os.path.relpath(filepath, source).replace(os.sep, "/")
+            if relpath not in done and file not in legacy:
+                tasks.append((filepath, file, sample, label, relpath))
+
+        for i in range(0, len(tasks), batch_size):
+            batch = tasks[i : i + batch_size]
+            spectra = Parallel(n_jobs=n_jobs)(
+                delayed(_with_dtype)(get_dtype(), reader, task[0]) for task in batch
+            )
+            keys = []
+            for spectrum, task in zip(spectra, batch):
+                key = _group_name(f, spectrum.name, task[4])
+                spectrum._to_hdf5_group(
+                    f.create_group(key), compression, chunk_rows, True
+                )
+                keys.append(key)
+            _append_metadata(
+                grp,
+                files=[task[1] for task in batch],
+                samples=[task[2] for task in batch],
+                labels=[task[3] for task in batch],
+                keys=keys,
+                paths=[task[4] for task in batch],
+            )
+            f.flush()
+
+    return len(tasks)
+
+
+def append(path, dataset, compression="gzip", chunk_rows=32):
+    """
+    Appends the spectra of a dataset to a store.
+    Only the new spectra are written, existing ones are not touched.
+    Stores written by ims.Dataset.to_hdf5 are converted
+    to resizable metadata on the first append.
+
+    Parameters
+    ----------
+    path : str
+        hdf5 store. Created if it does not exist.
+
+    dataset : ims.Dataset
+        Spectra with file names, samples and labels.
+
+    compression : str, optional
+        h5py compression filter or None, by default "gzip".
+
+    chunk_rows : int, optional
+        Number of retention time rows per chunk, by default 32.
+
+    Raises
+    ------
+    ValueError
+        If a spectrum with the same name is already in the store or
+        the preprocessing steps differ from the stored spectra.
+
+    Example
+    -------
+    >>> import ims
+    >>> new = ims.Dataset.read_mea("IMS_data_today", subfolders=True)
+    >>> ims.store.append("IMS_data.hdf5", new)
+    """
+    n = len(dataset)
+    files = _as_list(dataset.files) or [""] * n
+    samples = _as_list(dataset.samples) or [""] * n
+    labels = _as_list(dataset.labels) or [""] * n
+
+    with h5py.File(path, "a") as f:
+        grp = _open_metadata(f)
+
+        preprocessing = [i.decode() for i in grp["preprocessing"]]
+        if len(grp["keys"]) == 0:
+            _append_metadata(grp, preprocessing=list(dataset.preprocessing))
+        elif preprocessing != list(dataset.preprocessing):
+            raise ValueError("Preprocessing of dataset and store do not match!")
+
+        for spectrum in dataset:
+            if spectrum.name in f:
+                raise ValueError(f"{spectrum.name} is already in the store!")
+
+        for spectrum in dataset:
+            spectrum._to_hdf5_group(
+                f.create_group(spectrum.name), compression, chunk_rows, True
+            )
+        _append_metadata(
+            grp,
+            files=files,
+            samples=samples,
+            labels=labels,
+            keys=[spectrum.name for spectrum in dataset],
+            paths=[""] * n,
+        )
+
+
+def update(
+    path, key, label=None, sample=None, spectrum=None, compression="gzip", chunk_rows=32
+):
+    """
+    Changes the label, sample name or values of one spectrum in a store.
+    Replaced values are written to a new group. The space of the old
+    values is only reclaimed by copying the file, for example with h5repack.
+
+    Parameters
+    ----------
+    path : str
+        hdf5 store.
+
+    key : int or str
+        Index, relative path in the source folder, group name
+        or file name of the spectrum. File names must be unique.
+
+    label : str, optional
+        New label, by default None.
+
+    sample : str, optional
+        New sample name, by default None.
+
+    spectrum : ims.Spectrum, optional
+        Replaces values, coordinates and timestamp, by default None.
+
+    compression : str, optional
+        h5py compression filter for new values or None, by default "gzip".
+
+    chunk_rows : int, optional
+        Number of retention time rows per chunk, by default 32.
+
+    Raises
+    ------
+    ValueError
+        If the key is not in the store or the file name
+        is not unique.
+
+    Example
+    -------
+    >>> import ims
+    >>> ims.store.update("IMS_data.hdf5", "sample_a.mea", label="Group B")
+    >>> sample = ims.Spectrum.read_mea("sample_a.mea").tophat()
+    >>> ims.store.update("IMS_data.hdf5", "sample_a.mea", spectrum=sample)
+    """
+    with h5py.File(path, "a") as f:
+        grp = _open_metadata(f)
+        i = _index(grp, key)
+
+        if label is not None:
+            grp["labels"][i] = label
+        if sample is not None:
+            grp["samples"][i] = sample
+
+        if spectrum is not None:
+            old = grp["keys"][i].decode()
+            if spectrum.name != old and spectrum.name in f:
+                raise ValueError(f"{spectrum.name} is already in the store!")
+            del f[old]
+            spectrum._to_hdf5_group(
+                f.create_group(spectrum.name), compression, chunk_rows, True
+            )
+            grp["keys"][i] = spectrum.name
+
+
+def verify(path, checksums=False):
+    """
+    Checks the integrity of a store.
+    Metadata must have one entry per spectrum, every listed spectrum
+    must have a complete group and no unlisted groups may exist.
+
+    Parameters
+    ----------
+    path : str
+        hdf5 store.
+
+    checksums : bool, optional
+        Reads all values to verify the fletcher32 checksums.
+        Slow for large stores, by default False.
+
+    Returns
+    -------
+    list of str
+        Found problems. Empty if the store is intact.
+    """
+    problems = []
+    with h5py.File(path, "r") as f:
+        if "dataset" not in f:
+            return ["dataset group is missing"]
+        grp = f["dataset"]
+        try:
+            keys = Dataset._hdf5_keys(f)
+        except ValueError as e:
+            return [str(e)]
+
+        for column in ("files", "samples", "labels"):
+            if column not in grp:
+                problems.append(f"{column} are missing")
+            elif len(grp[column]) not in (0, len(keys)):
+                problems.append(
+                    f"{len(grp[column])} {column} but {len(keys)} spectra"
+                )
+
+        for key in f.keys():
+            if key != "dataset" and key not in keys:
+                problems.append(f"{key} is not listed")
+
+        for key in keys:
+            if key not in f:
+                problems.append(f"{key} is missing")
+                continue
+            spectrum = f[key]
+            missing = [i for i in ("values", "ret_time", "drift_time") if i not in spectrum]
+            if missing:
+                problems.append(f"{key} has no {', '.join(missing)}")
+                continue
+
+            values = spectrum["values"]
+            if isinstance(values, h5py.Group):
+                shape = tuple(values.attrs["shape"])
+                datasets = [values[i] for i in ("data", "indices", "indptr")]
+            else:
+                shape = values.shape
+                datasets = [values]
+            if shape != (len(spectrum["ret_time"]), len(spectrum["drift_time"])):
+                problems.append(f"{key} values do not match the coordinates")
+
+            if checksums:
+                for dataset in datasets:
+                    try:
+                        dataset[()]
+                    except OSError:
+                        problems.append(f"{key} {dataset.name} checksum failed")
+
+    return problems
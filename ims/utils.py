@@ -1,7 +1,78 @@
+from functools import lru_cache
 import numpy as np
 from scipy import sparse
-from scipy.sparse.linalg import spsolve
-from scipy.spatial import ConvexHull
+
+
+_dtype = np.dtype("float64")
+
+
+def set_dtype(dtype):
+    """
+    Sets the floating point type of intensity values for the whole package.
+    Readers, preprocessing steps, ims.Dataset.get_xy and scaling
+    return arrays of this type.
+    float32 halves the memory of large datasets compared to the default.
+    Worker processes started with n_jobs use the same type.
+
+    Parameters
+    ----------
+    dtype : str or numpy.dtype
+        "float16", "float32" or "float64" are valid.
+
+    Raises
+    ------
+    ValueError
+        If dtype is not a floating point type.
+
+    Example
+    -------
+    >>> import ims
+    >>> ims.set_dtype("float32")
+    >>> sample = ims.Spectrum.read_mea("sample.mea")
+    >>> print(sample.values.dtype)
+    float32
+    """
+    global _dtype
+    dtype = np.dtype(dtype)
+    if not np.issubdtype(dtype, np.floating):
+        raise ValueError(f"{dtype} is not a floating point type!")
+    _dtype = dtype
+
+
+def get_dtype():
+    """
+    Returns the floating point type set with ims.set_dtype.
+
+    Returns
+    -------
+    numpy.dtype
+        By default float64.
+    """
+    return _dtype
+
+
+def _with_dtype(dtype, func, *args):
+    """
+    Calls func with the dtype policy of the calling process.
+    joblib worker processes do not inherit ims.set_dtype.
+    """
+    set_dtype(dtype)
+    return func(*args)
+
+
+def _cast(values):
+    """Casts values to the package dtype, avoids a copy if it already matches."""
+    return values.astype(_dtype, copy=False)
+
+
+def _as_list(values):
+    """
+    Labels, samples or file names as list of Python objects.
+    Accepts lists and numpy arrays, None becomes an empty list.
+    """
+    if values is None:
+        return []
+    return [i.item() if isinstance(i, np.generic) else i for i in values]
 
 
 def vip_scores(W, T, Q):
@@ -103,6 +174,8 @@ def asymcorr(y, lam=1e7, p=1e-3, niter=20):
     numpy.ndarray of shape (1,)
         Copy of input y with baseline subtracted.
     """
+    from scipy.sparse.linalg import spsolve
+
     L = len(y)
     D = sparse.diags([1, -2, 1], [0, -1, -2], shape=(L, L - 2))
     w = np.ones(L)
@@ -114,3 +187,438 @@ def asymcorr(y, lam=1e7, p=1e-3, niter=20):
         w = p * (y > z) + (1 - p) * (y < z)
 
     return y - z
+
+
+def interp_weights(x, x_new, kind="cubic"):
+    """
+    Sparse weight matrix that interpolates data sampled at x
+    onto x_new by matrix multiplication.
+    Precomputing the weights once makes it possible to resample
+    many spectra on the same coordinate without creating
+    an interpolation function per spectrum.
+
+    Parameters
+    ----------
+    x : numpy.ndarray of shape (n,)
+        Sorted original coordinate.
+
+    x_new : numpy.ndarray of shape (m,)
+        Coordinate to interpolate to.
+        Values outside of x are extrapolated from the closest points.
+
+    kind : str, optional
+        "linear" or "cubic" are valid. Cubic uses the
+        Keys cubic convolution kernel with four points per new value,
+        by default "cubic".
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix of shape (n, m)
+        Weights. values @ weights interpolates the last axis of values.
+
+    Raises
+    ------
+    ValueError
+        If kind is not supported.
+    """
+    n = len(x)
+    m = len(x_new)
+    i = np.clip(np.searchsorted(x, x_new, side="right") - 1, 0, n - 2)
+    t = (x_new - x[i]) / (x[i + 1] - x[i])
+
+    if kind == "linear":
+        rows = np.concatenate([i, i + 1])
+        weights = np.concatenate([1 - t, t])
+        cols = np.tile(np.arange(m), 2)
+
+    elif kind == "cubic":
+        a = -0.5
+        s = np.stack([1 + t, t, 1 - t, 2 - t])
+        s = np.abs(s)
+        weights = np.where(
+            s <= 1,
+            (a + 2) * s**3 - (a + 3) * s**2 + 1,
+            a * s**3 - 5 * a * s**2 + 8 * a * s - 4 * a,
+        )
+        # neighbours outside of the axis are replaced by the edge values
+        rows = np.clip(np.stack([i - 1, i, i + 1, i + 2]), 0, n - 1)
+        rows = rows.ravel()
+        weights = weights.ravel()
+        cols = np.tile(np.arange(m), 4)
+
+    else:
+        raise ValueError("Only 'linear' or 'cubic' are valid options!")
+
+    return sparse.csr_matrix((weights, (rows, cols)), shape=(n, m))
+
+
+def nearest_index(axis, value):
+    """
+    Index of the coordinate value closest to value.
+    Binary search on the sorted axis, equivalent to
+    np.abs(axis - value).argmin() without scanning the whole axis.
+
+    Parameters
+    ----------
+    axis : numpy.ndarray of shape (n,)
+        Sorted coordinate.
+
+    value : int or float
+        Coordinate value to look up.
+
+    Returns
+    -------
+    int
+        Index of the closest value. The lower index on ties.
+    """
+    n = len(axis)
+    if n < 2:
+        return 0
+    i = min(max(int(np.searchsorted(axis, value)), 1), n - 1)
+    if value - axis[i - 1] <= axis[i] - value:
+        return i - 1
+    return i
+
+
+@lru_cache(maxsize=32)
+def _decomposition_lowpass(wavelet):
+    """Decomposition lowpass filter of a wavelet, cached by name."""
+    import pywt
+
+    dec_lo = np.array(pywt.Wavelet(wavelet).dec_lo)
+    dec_lo.setflags(write=False)
+    return dec_lo
+
+
+def wavelet_approximation(values, wavelet="db3", level=3, axes=(0,)):
+    """
+    Approximation coefficients of a multilevel discrete wavelet transform.
+    Only the lowpass filter and downsampling are applied per level,
+    detail coefficients are never computed.
+    Results are identical to the first element of pywt.wavedec
+    (one axis) or pywt.wavedecn (several axes) with symmetric
+    signal extension.
+
+    Works on arrays of any dimension, stacked spectra of shape
+    (n_spectra, n_ret_time, n_drift_time) are transformed in one call.
+    Filters are cached per wavelet and the computation stays in the
+    floating point type of values.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Input array.
+
+    wavelet : str or pywt.Wavelet, optional
+        Wavelet object or name string, by default "db3".
+
+    level : int, optional
+        Decomposition level (must be >= 0), by default 3.
+
+    axes : tuple of int, optional
+        Axes to transform, by default (0,).
+
+    Returns
+    -------
+    numpy.ndarray
+        Approximation coefficients.
+
+    Raises
+    ------
+    ValueError
+        If level is negative.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from ims.utils import wavelet_approximation
+    >>> X = np.random.rand(8, 4082, 3150)
+    >>> wavelet_approximation(X, "db3", 3, axes=(1, 2)).shape
+    (8, 515, 398)
+    """
+    if level < 0:
+        raise ValueError("Level must be >= 0!")
+
+    if isinstance(wavelet, str):
+        dec_lo = _decomposition_lowpass(wavelet)
+    else:
+        dec_lo = np.array(wavelet.dec_lo)
+
+    values = np.asarray(values)
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(float)
+    dec_lo = dec_lo.astype(values.dtype)
+
+    for _ in range(level):
+        for axis in axes:
+            values = _lowpass_downsample(values, dec_lo, axis)
+    return values
+
+
+def _lowpass_downsample(values, dec_lo, axis):
+    """
+    One decomposition step along axis: cA[k] = sum_j h[j] * x[2k + 1 - j]
+    with symmetric extension, accumulated tap by tap from strided views
+    of the padded array to avoid a full convolution.
+    """
+    n_taps = len(dec_lo)
+    n_out = (values.shape[axis] + n_taps - 1) // 2
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (n_taps - 1, n_taps - 1)
+    extended = np.pad(values, pad, mode="symmetric")
+
+    def tap(j):
+        index = [slice(None)] * values.ndim
+        index[axis] = slice(n_taps - j, n_taps - j + 2 * n_out - 1, 2)
+        return extended[tuple(index)]
+
+    out = np.multiply(tap(0), dec_lo[0])
+    buffer = np.empty_like(out)
+    for j in range(1, n_taps):
+        np.multiply(tap(j), dec_lo[j], out=buffer)
+        out += buffer
+    return out
+
+
+def wavelet_denoise(values, wavelet="db3", level=3, threshold="bayes", axes=(-2, -1)):
+    """
+    Denoises images by soft thresholding the detail coefficients
+    of a multilevel two dimensional wavelet decomposition.
+    The noise level is estimated per image from the median absolute
+    diagonal detail coefficient of the finest level.
+
+    Works on stacked arrays: with values of shape
+    (n_spectra, n_ret_time, n_drift_time) and the default axes every
+    spectrum is denoised with its own noise estimate in one call.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Input array with at least two dimensions.
+
+    wavelet : str or pywt.Wavelet, optional
+        Wavelet object or name string, by default "db3".
+
+    level : int, optional
+        Decomposition level, by default 3.
+
+    threshold : str, optional
+        "bayes" uses an adaptive BayesShrink threshold per subband,
+        "universal" the VisuShrink threshold sigma * sqrt(2 * log(N))
+        for all subbands, by default "bayes".
+
+    axes : tuple of int, optional
+        The two image axes, by default (-2, -1).
+
+    Returns
+    -------
+    numpy.ndarray
+        Denoised values with the shape of the input.
+
+    Raises
+    ------
+    ValueError
+        If threshold is not 'bayes' or 'universal'.
+
+    References
+    ----------
+    Donoho, D. L., and Johnstone, I. M. (1994)
+    Ideal spatial adaptation by wavelet shrinkage.
+    Biometrika, 81(3), 425-455. doi: 10.1093/biomet/81.3.425
+
+    Chang, S. G., Yu, B., and Vetterli, M. (2000)
+    Adaptive wavelet thresholding for image denoising and compression.
+    IEEE Trans. Image Process., 9(9), 1532-1546. doi: 10.1109/83.862633
+    """
+    import pywt
+
+    if threshold not in ("bayes", "universal"):
+        raise ValueError("Threshold must be 'bayes' or 'universal'!")
+
+    values = np.asarray(values)
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(float)
+    axes = tuple(axis % values.ndim for axis in axes)
+    shape = values.shape
+
+    coefs = pywt.wavedec2(values, wavelet, level=level, axes=axes)
+    finest = coefs[-1][2]
+    sigma = np.median(np.abs(finest), axis=axes, keepdims=True) / 0.6745
+
+    if threshold == "universal":
+        n = shape[axes[0]] * shape[axes[1]]
+        value = sigma * np.sqrt(2 * np.log(n))
+
+    for details in coefs[1:]:
+        for detail in details:
+            if threshold == "bayes":
+                # signal standard deviation of the subband,
+                # subbands that contain only noise are removed completely
+                signal = np.sqrt(
+                    np.maximum(
+                        np.mean(detail**2, axis=axes, keepdims=True) - sigma**2, 0
+                    )
+                )
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    value = np.where(
+                        signal > 0,
+                        sigma**2 / signal,
+                        np.max(np.abs(detail), axis=axes, keepdims=True),
+                    )
+            _soft_threshold(detail, value)
+
+    denoised = pywt.waverec2(coefs, wavelet, axes=axes)
+    # reconstruction adds a row or column to odd lengths
+    index = [slice(None)] * values.ndim
+    for axis in axes:
+        index[axis] = slice(0, shape[axis])
+    return denoised[tuple(index)]
+
+
+def _soft_threshold(values, value):
+    """Shrinks values towards zero by value, in place."""
+    magnitude = np.abs(values)
+    magnitude -= value.astype(values.dtype, copy=False)
+    np.maximum(magnitude, 0, out=magnitude)
+    np.copysign(magnitude, values, out=values)
+
+
+@lru_cache(maxsize=32)
+def _savgol_kernels(window_length, polyorder, deriv):
+    """
+    Convolution kernel and edge weights of a Savitzky-Golay filter.
+    Row i of the edge weights evaluates the polynomial fitted to
+    one window at position i, like the 'interp' mode of
+    scipy.signal.savgol_filter.
+    """
+    from scipy.signal import savgol_coeffs
+
+    kernel = savgol_coeffs(window_length, polyorder, deriv, use="conv")
+    edges = np.stack(
+        [
+            savgol_coeffs(window_length, polyorder, deriv, pos=i, use="dot")
+            for i in range(window_length)
+        ]
+    )
+    kernel.setflags(write=False)
+    edges.setflags(write=False)
+    return kernel, edges
+
+
+def savgol(values, window_length=10, polyorder=2, deriv=0, axes=(0,)):
+    """
+    Separable Savitzky-Golay filter along one or more axes.
+    Kernels are computed once per window length, polynomial order and
+    derivative and applied as one dimensional convolutions.
+    Edges are fitted like the 'interp' mode of scipy.signal.savgol_filter,
+    which gives the same results. The computation stays in the
+    floating point type of values and works on arrays of any dimension,
+    for example stacked spectra of shape (n_spectra, n_ret_time, n_drift_time).
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Input array.
+
+    window_length : int, optional
+        The length of the filter window, by default 10.
+
+    polyorder : int, optional
+        The order of the polynomial used to fit the samples, by default 2.
+
+    deriv : int, optional
+        Order of the derivative per sample step. 0 smoothes without
+        differentiating, by default 0.
+
+    axes : tuple of int, optional
+        Axes to filter, one after the other, by default (0,).
+
+    Returns
+    -------
+    numpy.ndarray
+        Filtered values.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from ims.utils import savgol
+    >>> X = np.random.rand(4082, 3150).astype("float32")
+    >>> savgol(X, 9, 2, axes=(0, 1)).dtype
+    dtype('float32')
+    """
+    values = np.asarray(values)
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(float)
+
+    for axis in axes:
+        if values.shape[axis] < window_length:
+            # scipy validates the arguments and raises the errors
+            from scipy.signal import savgol_filter
+
+            values = savgol_filter(
+                values, window_length, polyorder, deriv, axis=axis
+            ).astype(values.dtype, copy=False)
+            continue
+
+        kernel, edges = _savgol_kernels(window_length, polyorder, deriv)
+        values = np.ascontiguousarray(values)
+        filtered = np.empty_like(values)
+        _convolve_interior(values, filtered, kernel.astype(values.dtype), axis)
+
+        n = values.shape[axis]
+        half = window_length // 2
+        x = np.moveaxis(values, axis, 0)
+        y = np.moveaxis(filtered, axis, 0)
+        y[:half] = np.tensordot(edges[:half], x[:window_length], axes=1)
+        y[n - half :] = np.tensordot(
+            edges[window_length - half :], x[n - window_length :], axes=1
+        )
+        values = filtered
+    return values
+
+
+def _convolve_interior(values, out, kernel, axis, block_bytes=2**18):
+    """
+    Convolves the contiguous array values with kernel along axis
+    where the kernel fits completely, out[i] = sum_j kernel[j] * values[i + h - j]
+    like scipy.ndimage.convolve1d. Taps are accumulated from shifted
+    views in blocks of rows that fit into the cache, which is faster
+    than convolve1d along strided axes.
+    """
+    n_taps = len(kernel)
+    h = n_taps // 2
+    n = values.shape[axis]
+    outer = int(np.prod(values.shape[:axis]))
+    inner = int(np.prod(values.shape[axis + 1 :]))
+    x = values.reshape(outer, n, inner)
+    y = out.reshape(outer, n, inner)
+
+    if inner == 1:
+        # last axis: blocks of rows, taps are shifted column views
+        x = x[..., 0]
+        y = y[..., 0]
+        m = n - 2 * h
+        rows = max(1, block_bytes // (n * values.itemsize))
+        buffer = np.empty((rows, m), values.dtype)
+        for start in range(0, outer, rows):
+            stop = min(start + rows, outer)
+            block = y[start:stop, h : n - h]
+            tmp = buffer[: stop - start]
+            np.multiply(x[start:stop, 2 * h : 2 * h + m], kernel[0], out=block)
+            for j in range(1, n_taps):
+                np.multiply(x[start:stop, 2 * h - j : 2 * h - j + m], kernel[j], out=tmp)
+                block += tmp
+        return
+
+    # other axes: blocks along the axis, taps are shifted row views
+    rows = max(1, block_bytes // (inner * values.itemsize))
+    buffer = np.empty((rows, inner), values.dtype)
+    for i in range(outer):
+        for start in range(h, n - h, rows):
+            stop = min(start + rows, n - h)
+            block = y[i, start:stop]
+            tmp = buffer[: stop - start]
+            np.multiply(x[i, start + h : stop + h], kernel[0], out=block)
+            for j in range(1, n_taps):
+                np.multiply(x[i, start + h - j : stop + h - j], kernel[j], out=tmp)
+                block += tmp
@@ -0,0 +1,49 @@
+from datetime import datetime
+import numpy as np
+import pytest
+import ims
+from benchmarks.synthetic import synthetic_values, write_dataset
+
+
+@pytest.fixture
+def spectrum():
+    """Small synthetic spectrum with a RIP and analyte peaks."""
+    values = synthetic_values(n_ret_time=120, n_drift_time=90, n_peaks=8).astype(float)
+    return ims.Spectrum(
+        "sample",
+        values,
+        np.arange(120) * 0.5,
+        np.linspace(5, 12, 90),
+        datetime(2021, 1, 1, 12),
+    )
+
+
+@pytest.fixture
+def dataset():
+    """Random spectra of three samples with two or three replicates."""
+    rng = np.random.default_rng(0)
+    samples = ["b", "a", "b", "c", "a", "c", "c"]
+    data = [
+        ims.Spectrum(
+            f"file{i}",
+            rng.random((40, 30)),
+            np.arange(40) + rng.random(),
+            np.arange(30) + rng.random(),
+            datetime(2021, 1, 1, 12, i),
+        )
+        for i in range(len(samples))
+    ]
+    files = [f"file{i}.mea" for i in range(len(samples))]
+    labels = [f"label_{sample}" for sample in samples]
+    return ims.Dataset(data, "test", files, samples, labels)
+
+
+@pytest.fixture
+def mea_folder(tmp_path):
+    """Folder of mea files with label and sample subfolders."""
+    root = tmp_path / "IMS_data"
+    write_dataset(
+        str(root), n_labels=2, n_samples=2, n_replicates=2,
+        n_ret_time=60, n_drift_time=40, n_peaks=5,
+    )
+    return str(root)
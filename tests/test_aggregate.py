@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+
+def _groups(dataset):
+    groups = {}
+    for spectrum, sample, label in zip(dataset, dataset.samples, dataset.labels):
+        groups.setdefault(sample, (label, []))[1].append(spectrum)
+    return groups
+
+
+@pytest.mark.parametrize(
+    "method, reduce",
+    [
+        ("mean", np.mean),
+        ("median", np.median),
+        ("std", np.std),
+        ("min", np.min),
+        ("max", np.max),
+    ],
+)
+def test_grouped_reduction(dataset, method, reduce):
+    groups = _groups(dataset)
+    result = dataset.copy().aggregate(method)
+
+    assert result.samples == sorted(groups)
+    assert result.labels == [groups[sample][0] for sample in sorted(groups)]
+    for spectrum, sample in zip(result, result.samples):
+        spectra = groups[sample][1]
+        values = np.stack([i.values for i in spectra])
+        np.testing.assert_allclose(spectrum.values, reduce(values, axis=0), atol=1e-12)
+        np.testing.assert_allclose(
+            spectrum.ret_time, np.mean([i.ret_time for i in spectra], axis=0)
+        )
+
+
+def test_welford_std_is_stable(dataset):
+    # a large offset cancels catastrophically in the naive sum of squares
+    for spectrum in dataset:
+        spectrum.values = spectrum.values + 1e8
+    expected = {
+        sample: np.std(np.stack([i.values for i in spectra]), axis=0)
+        for sample, (_, spectra) in _groups(dataset).items()
+    }
+    result = dataset.aggregate("std")
+    for spectrum, sample in zip(result, result.samples):
+        np.testing.assert_allclose(spectrum.values, expected[sample], atol=1e-6)
+
+
+def test_mean_does_not_share_metadata_lists(dataset):
+    dataset.mean()
+    assert dataset.files == dataset.samples
+    assert dataset.files is not dataset.samples
+    assert dataset.preprocessing[-1] == "mean()"
+
+
+def test_invalid_method(dataset):
+    with pytest.raises(ValueError):
+        dataset.aggregate("sum")
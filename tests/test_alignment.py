@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from dtwalign import dtw
+from ims.alignment import alignment_features, warping_path, RetTimeAlignment
+
+
+def _signals(seed, n_query, n_reference, n_features, rounded):
+    rng = np.random.default_rng(seed)
+    n = max(n_query, n_reference)
+    base = np.cumsum(rng.normal(size=(n, n_features)), axis=0)
+    query = base[:n_query] + rng.normal(0, 0.3, (n_query, n_features))
+    reference = base[:n_reference]
+    if rounded:
+        # rounding produces ties in the cumulative cost matrix
+        query, reference = np.round(query), np.round(reference)
+    if n_features == 1:
+        query, reference = query[:, 0], reference[:, 0]
+    return query, reference
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("n_features", [1, 3])
+@pytest.mark.parametrize("rounded", [False, True])
+def test_banded_path_matches_dtwalign(seed, n_features, rounded):
+    query, reference = _signals(seed, 150 + seed, 148, n_features, rounded)
+    window = 10 + 3 * seed
+    expected = dtw(
+        query, reference, window_type="sakoechiba", window_size=window
+    ).get_warping_path(target="query")
+    np.testing.assert_array_equal(warping_path(query, reference, window), expected)
+
+
+def test_unconstrained_path_matches_dtwalign():
+    query, reference = _signals(0, 80, 80, 1, False)
+    expected = dtw(query, reference).get_warping_path(target="query")
+    np.testing.assert_array_equal(warping_path(query, reference), expected)
+
+
+def test_window_shorter_than_length_difference():
+    with pytest.raises(ValueError):
+        warping_path(np.ones(50), np.ones(60), window=5)
+
+
+def test_alignment_features():
+    values = np.arange(24.0).reshape(4, 6)
+    np.testing.assert_array_equal(alignment_features(values, "tic"), values.sum(axis=1))
+    np.testing.assert_array_equal(
+        alignment_features(values, np.int64(2)),
+        np.stack([values[:, :3].sum(axis=1), values[:, 3:].sum(axis=1)], axis=1),
+    )
+    with pytest.raises(ValueError):
+        alignment_features(values, "sum")
+
+
+def test_save_and_load(dataset, tmp_path):
+    alignment = RetTimeAlignment(features=np.int64(3), window=np.int32(5)).fit(dataset)
+    path = str(tmp_path / "alignment.hdf5")
+    alignment.save(path)
+    loaded = RetTimeAlignment.load(path)
+    assert loaded.features == 3 and loaded.window == 5
+    np.testing.assert_array_equal(loaded.reference_features, alignment.reference_features)
+    np.testing.assert_array_equal(
+        loaded.transform(dataset[0].copy()).values,
+        alignment.transform(dataset[0].copy()).values,
+    )
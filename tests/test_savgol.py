@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from scipy.signal import savgol_filter
+from ims.utils import savgol
+
+
+@pytest.mark.parametrize("window_length, polyorder", [(5, 2), (9, 3), (10, 2)])
+@pytest.mark.parametrize("deriv", [0, 1, 2])
+@pytest.mark.parametrize("axis", [0, 1])
+def test_matches_scipy(window_length, polyorder, deriv, axis):
+    values = np.random.default_rng(0).random((60, 45))
+    expected = savgol_filter(values, window_length, polyorder, deriv, axis=axis)
+    result = savgol(values, window_length, polyorder, deriv, axes=(axis,))
+    np.testing.assert_allclose(result, expected, atol=1e-10)
+
+
+def test_both_axes_and_dtype():
+    values = np.random.default_rng(0).random((60, 45)).astype("float32")
+    expected = savgol_filter(savgol_filter(values, 9, 2, axis=0), 9, 2, axis=1)
+    result = savgol(values, 9, 2, axes=(0, 1))
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, expected, atol=1e-5)
+
+
+def test_short_axis_falls_back_to_scipy():
+    values = np.random.default_rng(0).random((4, 45))
+    with pytest.raises(ValueError):
+        savgol(values, 9, 2, axes=(0,))
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{}, {"direction": "drift_time", "deriv": 2}, {"direction": "ret_time", "deriv": 1}],
+)
+def test_dataset_batches_match_spectra(dataset, kwargs):
+    expected = [spectrum.copy().savgol(9, 2, **kwargs).values for spectrum in dataset]
+    result = dataset.savgol(9, 2, batch_size=3, n_jobs=2, **kwargs)
+    for spectrum, values in zip(result, expected):
+        np.testing.assert_array_equal(spectrum.values, values)
+
+
+def test_dataset_with_sparse_spectra(dataset):
+    dataset[1].values = sparse.csr_matrix(dataset[1].values)
+    expected = [spectrum.copy().savgol(7, 2).values for spectrum in dataset]
+    for spectrum, values in zip(dataset.savgol(7, 2), expected):
+        np.testing.assert_array_equal(spectrum.values, values)
+
+
+def test_derivatives_need_one_direction(spectrum, dataset):
+    with pytest.raises(ValueError):
+        spectrum.savgol(deriv=1)
+    with pytest.raises(ValueError):
+        dataset.savgol(deriv=1)
+    with pytest.raises(ValueError):
+        dataset.savgol(direction="diagonal")
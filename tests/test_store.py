@@ -0,0 +1,148 @@
+import os
+import shutil
+import h5py
+import numpy as np
+import pytest
+import ims
+from ims import store
+
+
+def _assert_same_spectra(result, expected):
+    assert len(result) == len(expected)
+    for a, b in zip(result, expected):
+        np.testing.assert_array_equal(a.values, b.values)
+        np.testing.assert_array_equal(a.ret_time, b.ret_time)
+        np.testing.assert_array_equal(a.drift_time, b.drift_time)
+        assert a.time == b.time
+
+
+def test_convert_round_trip(mea_folder, tmp_path):
+    path = str(tmp_path / "store.hdf5")
+    n = store.convert(mea_folder, path, subfolders=True, n_jobs=1, batch_size=3)
+
+    expected = ims.Dataset.read_mea(mea_folder, subfolders=True)
+    result = ims.Dataset.read_hdf5(path)
+    assert n == len(expected)
+    assert result.files == expected.files
+    assert result.samples == expected.samples
+    assert result.labels == expected.labels
+    _assert_same_spectra(result, expected)
+    assert store.verify(path, checksums=True) == []
+
+
+def test_convert_resumes_by_relative_path(mea_folder, tmp_path):
+    path = str(tmp_path / "store.hdf5")
+    # equally named files in different folders are both converted
+    sample = os.path.join(mea_folder, "label0", "sample0_0")
+    other = os.path.join(mea_folder, "label1", "sample1_0")
+    shutil.copy(os.path.join(sample, "sample0_0_0.mea"), other)
+
+    first = store.convert(mea_folder, path, subfolders=True, n_jobs=1)
+    again = store.convert(mea_folder, path, subfolders=True, n_jobs=1)
+    assert first == 9
+    assert again == 0
+    with h5py.File(path, "r") as f:
+        keys = [i.decode() for i in f["dataset"]["keys"]]
+    assert len(set(keys)) == 9
+    assert store.verify(path) == []
+
+
+def test_convert_in_parallel_keeps_dtype(mea_folder, tmp_path):
+    path = str(tmp_path / "store.hdf5")
+    ims.set_dtype("float32")
+    try:
+        store.convert(mea_folder, path, subfolders=True, n_jobs=2)
+    finally:
+        ims.set_dtype("float64")
+    with h5py.File(path, "r") as f:
+        keys = [i.decode() for i in f["dataset"]["keys"]]
+        assert all(f[key]["values"].dtype == np.float32 for key in keys)
+
+
+def test_read_hdf5_keeps_order_without_keys(dataset, tmp_path):
+    # h5py lists the groups alphabetically, the reverse of this order
+    for i, spectrum in enumerate(dataset):
+        spectrum.name = f"file{len(dataset) - i}"
+    dataset.files = [f"{spectrum.name}.mea" for spectrum in dataset]
+    dataset.to_hdf5("old", str(tmp_path))
+    path = str(tmp_path / "old.hdf5")
+    # files written before the keys were stored
+    with h5py.File(path, "a") as f:
+        del f["dataset"]["keys"]
+    result = ims.Dataset.read_hdf5(path)
+    assert [spectrum.name for spectrum in result] == [
+        spectrum.name for spectrum in dataset
+    ]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_read_hdf5_in_parallel(mea_folder, tmp_path, n_jobs):
+    path = str(tmp_path / "store.hdf5")
+    store.convert(mea_folder, path, subfolders=True, n_jobs=1)
+    expected = ims.Dataset.read_hdf5(path)
+    result = ims.Dataset.read_hdf5(path, n_jobs=n_jobs)
+    _assert_same_spectra(result, expected)
+
+
+def test_append_update_and_verify(dataset, tmp_path):
+    path = str(tmp_path / "store.hdf5")
+    first = dataset.copy()
+    first.data, first.files = first.data[:4], first.files[:4]
+    first.samples, first.labels = first.samples[:4], first.labels[:4]
+    store.append(path, first, compression=None)
+
+    second = dataset.copy()
+    second.data = second.data[4:]
+    # datasets without file names and with numpy metadata
+    second.files = None
+    second.samples = np.array(second.samples[4:])
+    second.labels = np.array(second.labels[4:])
+    store.append(path, second)
+
+    result = ims.Dataset.read_hdf5(path)
+    _assert_same_spectra(result, dataset)
+    assert result.samples == dataset.samples
+    assert result.files == dataset.files[:4] + [""] * 3
+    assert store.verify(path, checksums=True) == []
+
+    with pytest.raises(ValueError):
+        store.append(path, first)
+
+    replacement = dataset[0].copy().tophat(3)
+    store.update(path, "file0.mea", label="new", spectrum=replacement)
+    store.update(path, -1, sample="last")
+    result = ims.Dataset.read_hdf5(path)
+    np.testing.assert_array_equal(result[0].values, replacement.values)
+    assert result.labels[0] == "new"
+    assert result.samples[-1] == "last"
+    assert store.verify(path) == []
+
+
+def test_update_requires_unique_file_names(mea_folder, tmp_path):
+    path = str(tmp_path / "store.hdf5")
+    sample = os.path.join(mea_folder, "label0", "sample0_0")
+    other = os.path.join(mea_folder, "label1", "sample1_0")
+    shutil.copy(os.path.join(sample, "sample0_0_0.mea"), other)
+    store.convert(mea_folder, path, subfolders=True, n_jobs=1)
+
+    with pytest.raises(ValueError):
+        store.update(path, "sample0_0_0.mea", label="new")
+    store.update(path, "label1/sample1_0/sample0_0_0.mea", label="new")
+    with h5py.File(path, "r") as f:
+        paths = [i.decode() for i in f["dataset"]["paths"]]
+        labels = [i.decode() for i in f["dataset"]["labels"]]
+    assert labels[paths.index("label1/sample1_0/sample0_0_0.mea")] == "new"
+    assert labels[paths.index("label0/sample0_0/sample0_0_0.mea")] == "label0"
+
+
+def test_verify_finds_problems(dataset, tmp_path):
+    path = str(tmp_path / "store.hdf5")
+    store.append(path, dataset)
+    with h5py.File(path, "a") as f:
+        del f["file1"]["drift_time"]
+        del f["file2"]
+        f.create_group("stray")
+    problems = store.verify(path)
+    assert "file1 has no drift_time" in problems
+    assert "file2 is missing" in problems
+    assert "stray is not listed" in problems
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import ims
+from scipy import ndimage as ndi
+from skimage.morphology import white_tophat, disk
+
+
+def test_disk_matches_skimage(spectrum):
+    expected = white_tophat(spectrum.values, disk(5))
+    result = spectrum.copy().tophat(5, method="disk").values
+    np.testing.assert_allclose(result, expected)
+
+
+def test_rectangle_matches_square_footprint(spectrum):
+    expected = ndi.white_tophat(spectrum.values, footprint=np.ones((11, 11)))
+    result = spectrum.copy().tophat(5, method="rectangle").values
+    np.testing.assert_allclose(result, expected)
+
+
+@pytest.mark.parametrize("method", ["decomposed", "downsample", "rectangle"])
+def test_approximations_stay_below_values(spectrum, method):
+    result = spectrum.copy().tophat(8, method=method).values
+    assert result.min() >= 0
+    assert np.all(result <= spectrum.values - spectrum.values.min() + 1e-9)
+
+
+@pytest.mark.parametrize("method", ["decomposed", "downsample"])
+def test_approximations_close_to_disk(method):
+    rng = np.random.default_rng(0)
+    rt, dt = np.mgrid[:200, :160]
+    baseline = 5 + 0.02 * rt + 0.01 * dt
+    peaks = sum(
+        height * np.exp(-((rt - y) ** 2 / 18 + (dt - x) ** 2 / 8))
+        for height, y, x in rng.uniform([20, 20, 20], [100, 180, 140], (8, 3))
+    )
+    values = baseline + peaks
+    spectrum = ims.Spectrum("a", values, np.arange(200.0), np.arange(160.0), None)
+
+    expected = white_tophat(values, disk(10))
+    result = spectrum.tophat(10, method=method).values
+    assert np.abs(result - expected).max() < 0.02 * expected.max()
+
+
+def test_invalid_method(spectrum):
+    with pytest.raises(ValueError):
+        spectrum.tophat(method="ellipse")